@@ -0,0 +1,80 @@
+"""add lookup indexes
+
+Revision ID: 5b7e2c91d4a3
+Revises: db401de28097
+Create Date: 2026-10-18 09:12:40.118204
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '5b7e2c91d4a3'
+down_revision: Union[str, None] = 'db401de28097'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+# Each route's first row per (path, method), which its duplicates are folded into
+ROUTE_KEEPERS = ("SELECT id, first_value(id) OVER (PARTITION BY path, method ORDER BY created_at, id) AS keep_id "
+                 "FROM routes")
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Terminals own transactions and secrets, so duplicates have to be resolved by hand
+    op.execute("DO $$ BEGIN "
+               "IF EXISTS (SELECT 1 FROM terminals WHERE device_id IS NOT NULL "
+               "GROUP BY device_id HAVING count(*) > 1) THEN "
+               "RAISE EXCEPTION 'Several terminals share a device_id, resolve them before upgrading: %', "
+               "(SELECT string_agg(device_id, ', ') FROM (SELECT device_id FROM terminals "
+               "WHERE device_id IS NOT NULL GROUP BY device_id HAVING count(*) > 1) AS duplicates); "
+               "END IF; "
+               "END $$")
+    # Tax rates are synced from MRA, keep the most recently synced row of each rate
+    op.execute("DELETE FROM tax_rates WHERE id IN ("
+               "SELECT id FROM (SELECT id, row_number() OVER (PARTITION BY rate_id "
+               "ORDER BY updated_at DESC NULLS LAST, id) AS n FROM tax_rates) AS ranked WHERE n > 1)")
+    # Routes are seeded, fold duplicates into one row and keep their role grants
+    op.execute("INSERT INTO role_route_association (role_id, route_id) "
+               "SELECT DISTINCT association.role_id, keepers.keep_id FROM role_route_association AS association "
+               f"JOIN ({ROUTE_KEEPERS}) AS keepers ON keepers.id = association.route_id "
+               "WHERE keepers.id <> keepers.keep_id "
+               "ON CONFLICT DO NOTHING")
+    op.execute("DELETE FROM role_route_association WHERE route_id IN ("
+               f"SELECT id FROM ({ROUTE_KEEPERS}) AS keepers WHERE keepers.id <> keepers.keep_id)")
+    op.execute("DELETE FROM routes WHERE id IN ("
+               f"SELECT id FROM ({ROUTE_KEEPERS}) AS keepers WHERE keepers.id <> keepers.keep_id)")
+
+    op.create_index(op.f('ix_terminals_device_id'), 'terminals', ['device_id'], unique=True)
+    op.create_index('ix_products_site_id_code', 'products', ['site_id', 'code'], unique=False)
+    op.create_index(op.f('ix_tax_rates_rate_id'), 'tax_rates', ['rate_id'], unique=True)
+    op.create_index(
+        'ix_offline_transactions_terminal_id_created_at',
+        'offline_transactions',
+        ['terminal_id', 'created_at'],
+        unique=False
+    )
+    op.create_index(
+        'ix_offline_transactions_pending',
+        'offline_transactions',
+        ['created_at', 'id'],
+        unique=False,
+        postgresql_where=sa.text('submitted_at IS NULL'),
+        sqlite_where=sa.text('submitted_at IS NULL'),
+    )
+    op.drop_index(op.f('ix_routes_path'), table_name='routes')
+    op.create_index('ix_routes_path_method', 'routes', ['path', 'method'], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_routes_path_method', table_name='routes')
+    op.create_index(op.f('ix_routes_path'), 'routes', ['path'], unique=False)
+    op.drop_index('ix_offline_transactions_pending', table_name='offline_transactions')
+    op.drop_index('ix_offline_transactions_terminal_id_created_at', table_name='offline_transactions')
+    op.drop_index(op.f('ix_tax_rates_rate_id'), table_name='tax_rates')
+    op.drop_index('ix_products_site_id_code', table_name='products')
+    op.drop_index(op.f('ix_terminals_device_id'), table_name='terminals')
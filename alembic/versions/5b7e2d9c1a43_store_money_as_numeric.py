@@ -0,0 +1,38 @@
+"""store money as numeric
+
+Revision ID: 5b7e2d9c1a43
+Revises: 3f9a6d2c8e14
+Create Date: 2026-10-18 16:02:13.514870
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '5b7e2d9c1a43'
+down_revision: Union[str, None] = '3f9a6d2c8e14'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+COLUMNS = [
+    ('products', 'unit_price', sa.Numeric(18, 2), False),
+    ('packages', 'price', sa.Numeric(18, 2), False),
+    ('terminals', 'offline_limit_amount', sa.Numeric(18, 2), True),
+    ('tax_rates', 'rate', sa.Numeric(5, 2), False),
+]
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    for table, column, type_, nullable in COLUMNS:
+        op.alter_column(table, column, existing_type=sa.Float(), type_=type_, existing_nullable=nullable,
+                        postgresql_using=f'round({column}::numeric, {type_.scale})')
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    for table, column, type_, nullable in COLUMNS:
+        op.alter_column(table, column, existing_type=type_, type_=sa.Float(), existing_nullable=nullable,
+                        postgresql_using=f'{column}::double precision')
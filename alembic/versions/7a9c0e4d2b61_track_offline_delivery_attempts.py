@@ -0,0 +1,32 @@
+"""track offline delivery attempts
+
+Revision ID: 7a9c0e4d2b61
+Revises: e1f5b3a8c290
+Create Date: 2026-10-18 19:03:52.118406
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = '7a9c0e4d2b61'
+down_revision: Union[str, None] = 'e1f5b3a8c290'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('offline_transactions',
+                  sa.Column('attempt_count', sa.Integer(), nullable=False, server_default='0'))
+    op.add_column('offline_transactions', sa.Column('next_attempt_at', sa.DateTime(), nullable=True))
+    op.add_column('offline_transactions', sa.Column('last_error', sa.Text(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('offline_transactions', 'last_error')
+    op.drop_column('offline_transactions', 'next_attempt_at')
+    op.drop_column('offline_transactions', 'attempt_count')
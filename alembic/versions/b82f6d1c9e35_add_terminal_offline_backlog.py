@@ -0,0 +1,42 @@
+"""add terminal offline backlog
+
+Revision ID: b82f6d1c9e35
+Revises: 7a9c0e4d2b61
+Create Date: 2026-10-18 19:47:26.903517
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = 'b82f6d1c9e35'
+down_revision: Union[str, None] = '7a9c0e4d2b61'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('offline_transactions', sa.Column('amount', sa.Numeric(18, 2), nullable=True))
+    op.add_column('terminals',
+                  sa.Column('offline_pending_amount', sa.Numeric(18, 2), nullable=False, server_default='0'))
+    op.add_column('terminals', sa.Column('offline_oldest_pending_at', sa.DateTime(), nullable=True))
+
+    op.execute("UPDATE offline_transactions "
+               "SET amount = round((details->'invoiceSummary'->>'invoiceTotal')::numeric, 2) "
+               "WHERE details->'invoiceSummary'->>'invoiceTotal' IS NOT NULL")
+    op.execute("UPDATE terminals "
+               "SET offline_pending_amount = backlog.amount, offline_oldest_pending_at = backlog.oldest "
+               "FROM (SELECT terminal_id, coalesce(sum(amount), 0) AS amount, min(created_at) AS oldest "
+               "FROM offline_transactions WHERE submitted_at IS NULL AND status <> 'dead_letter' "
+               "GROUP BY terminal_id) AS backlog "
+               "WHERE backlog.terminal_id = terminals.id")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('terminals', 'offline_oldest_pending_at')
+    op.drop_column('terminals', 'offline_pending_amount')
+    op.drop_column('offline_transactions', 'amount')
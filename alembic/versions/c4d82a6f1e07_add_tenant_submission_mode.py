@@ -0,0 +1,30 @@
+"""add tenant submission mode
+
+Revision ID: c4d82a6f1e07
+Revises: 5b7e2d9c1a43
+Create Date: 2026-10-18 17:24:41.208113
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = 'c4d82a6f1e07'
+down_revision: Union[str, None] = '5b7e2d9c1a43'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('tenants', sa.Column('submission_mode', sa.String(), nullable=False, server_default='inline'))
+    op.execute("UPDATE offline_transactions "
+               "SET status = CASE WHEN submitted_at IS NULL THEN 'pending' ELSE 'submitted' END "
+               "WHERE status IS NULL")
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('tenants', 'submission_mode')
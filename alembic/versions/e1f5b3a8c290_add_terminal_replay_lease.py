@@ -0,0 +1,29 @@
+"""add terminal replay lease
+
+Revision ID: e1f5b3a8c290
+Revises: c4d82a6f1e07
+Create Date: 2026-10-18 18:11:07.652390
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = 'e1f5b3a8c290'
+down_revision: Union[str, None] = 'c4d82a6f1e07'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.add_column('terminals', sa.Column('replay_leased_by', sa.String(), nullable=True))
+    op.add_column('terminals', sa.Column('replay_lease_expires_at', sa.DateTime(), nullable=True))
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_column('terminals', 'replay_lease_expires_at')
+    op.drop_column('terminals', 'replay_leased_by')
@@ -0,0 +1,40 @@
+"""unique offline invoice numbers
+
+Revision ID: f3a1c7e9d508
+Revises: b82f6d1c9e35
+Create Date: 2026-10-18 21:06:13.540271
+
+"""
+from typing import Sequence, Union
+
+import sqlalchemy as sa
+from alembic import op
+
+# revision identifiers, used by Alembic.
+revision: str = 'f3a1c7e9d508'
+down_revision: Union[str, None] = 'b82f6d1c9e35'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    # Keep one row per invoice, the delivered one if there is one, otherwise the first stored
+    op.execute("DELETE FROM offline_transactions WHERE id IN ("
+               "SELECT id FROM (SELECT id, row_number() OVER (PARTITION BY terminal_id, transaction_id "
+               "ORDER BY submitted_at IS NULL, created_at, id) AS n FROM offline_transactions) AS ranked "
+               "WHERE n > 1)")
+    # The deleted copies were counted in their terminal's backlog
+    op.execute("UPDATE terminals "
+               "SET offline_pending_amount = coalesce(backlog.amount, 0), offline_oldest_pending_at = backlog.oldest "
+               "FROM terminals AS t LEFT JOIN (SELECT terminal_id, sum(amount) AS amount, min(created_at) AS oldest "
+               "FROM offline_transactions WHERE submitted_at IS NULL AND status <> 'dead_letter' "
+               "GROUP BY terminal_id) AS backlog ON backlog.terminal_id = t.id "
+               "WHERE t.id = terminals.id")
+    op.create_index('ix_offline_transactions_terminal_id_transaction_id', 'offline_transactions',
+                    ['terminal_id', 'transaction_id'], unique=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.drop_index('ix_offline_transactions_terminal_id_transaction_id', table_name='offline_transactions')
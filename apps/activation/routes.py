@@ -10,6 +10,7 @@ from core.auth import get_tenant
 from core.database import get_db
 from core.models import Tenant, Terminal
 from core.services.activation import activate_terminal, confirm_terminal_activation
+from core.services.terminal_context import invalidate_terminal
 
 router = APIRouter(
     prefix="/activation",
@@ -46,4 +47,5 @@ async def confirm_activation(
     terminal.confirmed_at = func.now()
     db.commit()
     db.refresh(terminal)
+    invalidate_terminal(terminal.device_id)
     return terminal
@@ -3,20 +3,22 @@ from datetime import timedelta, datetime
 from fastapi import APIRouter, Depends, HTTPException, Request
 from fastapi.security import OAuth2PasswordRequestForm
 from pydantic import BaseModel
-from slowapi import Limiter
-from slowapi.util import get_remote_address
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from starlette import status
+from starlette.concurrency import run_in_threadpool
 
 from apps.config.schema import TerminalRead
 from core.auth import create_access_token, verify_password, create_refresh_token, SECRET_KEY, ALGORITHM
-from core.database import get_db
+from core.database import get_db, get_async_db
 from core.enums import Scope, StatusEnum
 from core.models import User, Dictionary, Terminal
 from core.settings import settings
+from core.utils.rate_limit import LazyLimiter
 
 router = APIRouter(prefix="/auth", tags=["Auth"])
-limiter = Limiter(key_func=get_remote_address)
+limiter = LazyLimiter()
 
 
 class AuthToken(BaseModel):
@@ -29,16 +31,18 @@ class AuthToken(BaseModel):
 
 @router.post("/login", response_model=AuthToken)
 @limiter.limit("5/minute")
-async def login(request: Request, db: Session = Depends(get_db), form_data: OAuth2PasswordRequestForm = Depends()):
-    user = db.query(User).filter(User.email == form_data.username).first()
-    if not user or not verify_password(form_data.password, user.hashed_password):
+async def login(request: Request, db: AsyncSession = Depends(get_async_db),
+                form_data: OAuth2PasswordRequestForm = Depends()):
+    user = await db.scalar(select(User).where(User.email == form_data.username))
+    # bcrypt is deliberately slow, keep it off the event loop
+    if not user or not await run_in_threadpool(verify_password, form_data.password, user.hashed_password):
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
 
     if user.status is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Account not in active state")
 
     if user.status != StatusEnum.ACTIVE:
-        dictionary = db.query(Dictionary).filter(Dictionary.term == user.status).first()
+        dictionary = await db.scalar(select(Dictionary).where(Dictionary.term == user.status))
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=f"Login failed: {dictionary.definition}")
 
     token_data = {
@@ -47,31 +51,28 @@ async def login(request: Request, db: Session = Depends(get_db), form_data: OAut
         "is_global": user.scope == Scope.GLOBAL
     }
 
-    if user.scope == Scope.TENANT:
-        terminals = db.query(Terminal).filter(Terminal.tenant_id == user.tenant_id).all()
-
     delta = timedelta(minutes=float(settings.ACCESS_TOKEN_EXPIRE_MINUTES))
     expiry = datetime.now() + delta
     access_token = create_access_token(token_data, delta)
     refresher = create_refresh_token(user_id=user.id, token_version=user.refresh_token_version)
 
     user.last_login = datetime.now()
-    db.commit()
+    await db.commit()
 
     return {
         "access_token": access_token,
         "refresh_token": refresher,
         "token_type": "bearer",
         "user": user,
-        "terminals": get_tenant_terminals(db, user),
+        "terminals": await get_tenant_terminals(db, user),
         "expiry": expiry.isoformat()
     }
 
 
-def get_tenant_terminals(db: Session, user):
+async def get_tenant_terminals(db: AsyncSession, user):
     if user.scope == Scope.GLOBAL:
         return []
-    return db.query(Terminal).filter(Terminal.tenant_id == user.tenant_id).all()
+    return (await db.scalars(select(Terminal).where(Terminal.tenant_id == user.tenant_id))).all()
 
 
 class RefreshTokenResponse(BaseModel):
@@ -2,14 +2,16 @@ from typing import Any
 from uuid import UUID
 
 from fastapi import APIRouter, Depends, HTTPException, Header
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from apps.config.schema import ConfigResponse
-from core.auth import get_current_user
-from core.database import get_db
-from core.models import User, TaxRate, Terminal
+from core.auth import get_current_user, Principal
+from core.database import get_async_db
+from core.models import TaxRate, Terminal, Tenant
 from core.services.activation import sync_global_config, sync_terminal_config
 from core.services.config import get_configuration, save_tax_payer_config
+from core.services.terminal_context import resolve_terminal
 
 router = APIRouter(
     prefix="/config",
@@ -20,23 +22,25 @@ router = APIRouter(
 
 @router.get("/", response_model=ConfigResponse)
 async def get_config(
-        user: User = Depends(get_current_user),
+        user: Principal = Depends(get_current_user),
         x_device_id: str = Header(...),
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_async_db)
 ):
-    tenant = user.tenant
+    tenant = await db.get(Tenant, user.tenant_id) if user.tenant_id else None
     if not tenant:
         raise HTTPException(status_code=400, detail="Tenant not found")
 
-    terminal = db.query(Terminal).filter(Terminal.device_id == x_device_id).first()
+    terminal = await resolve_terminal(db, x_device_id)
     if not terminal:
         raise HTTPException(status_code=400, detail="Terminal not found")
 
     config = await get_configuration(terminal, db)
 
-    tax_rates = sync_global_config(db, config["data"]["globalConfiguration"])
-    profile = save_tax_payer_config(db, tenant, config["data"]["taxpayerConfiguration"])
-    terminal = sync_terminal_config(db, config["data"]["terminalConfiguration"], tenant, terminal.terminal_id)
+    # The config writers are shared with the sync activation path
+    tax_rates = await db.run_sync(sync_global_config, config["data"]["globalConfiguration"])
+    profile = await db.run_sync(save_tax_payer_config, tenant, config["data"]["taxpayerConfiguration"])
+    terminal = await db.run_sync(sync_terminal_config, config["data"]["terminalConfiguration"], tenant,
+                                 terminal.terminal_id)
 
     response = {
         "tax_rates": tax_rates,
@@ -58,7 +62,7 @@ def save_tax_rates(db: Session, tax_rates: list[dict[str, Any]], config_id: UUID
                 'charge_mode': rate_data.get('chargeMode', 'G'),
                 'global_config_id': config_id
             }
-            existing_rate = db.query(TaxRate).filter(TaxRate.name == rate_data["name"]).first()
+            existing_rate = db.query(TaxRate).filter(TaxRate.rate_id == rate_data["id"]).first()
             if existing_rate:
                 for key, value in rate_dict.items():
                     setattr(existing_rate, key, value)
@@ -1,9 +1,13 @@
+from contextlib import asynccontextmanager
+
 from fastapi import FastAPI
+from starlette.concurrency import run_in_threadpool
 
 from apps.activation.routes import router as activation_router
 from apps.auth.routes import router as auth_router
 from apps.config.routes import router as config_router
 from apps.dictionary.routes import router as dictionary_router
+from apps.metrics.routes import router as metrics_router
 from apps.products.routes import router as products_router
 from apps.profiles.routes import router as profiles_router
 from apps.roles.routes import router as roles_router
@@ -13,13 +17,33 @@ from apps.subscriptions.routes import router as subscriptions_router
 from apps.tenants.routes import router as tenant_router
 from apps.terminals.routes import router as terminals_router
 from apps.users.routes import router as users_router
+from core.database import dispose_engines, create_schema
+from core.services.mra_client import close_client
+from core.services.outbox import outbox_dispatcher
 from core.settings import settings
+from core.utils.api_logger import api_log_sink
+
+
+@asynccontextmanager
+async def lifespan(_: FastAPI):
+    if settings.DB_CREATE_SCHEMA_ON_STARTUP:
+        await run_in_threadpool(create_schema)
+    api_log_sink.start()
+    if settings.OUTBOX_DISPATCHER_ENABLED:
+        outbox_dispatcher.start()
+    yield
+    await outbox_dispatcher.stop()
+    await close_client()
+    api_log_sink.stop()
+    await dispose_engines()
+
 
 app = FastAPI(
     title="Receipt Rocket API",
     description="Receipt Rocket API",
     version="1.0.0",
     openapi_url=f"{settings.API_V1_STR}/openapi.json",
+    lifespan=lifespan,
 )
 
 app.include_router(tenant_router, prefix=settings.API_V1_STR)
@@ -43,6 +67,8 @@ app.include_router(routes_router, prefix=settings.API_V1_STR)
 app.include_router(users_router, prefix=settings.API_V1_STR)
 app.include_router(dictionary_router, prefix=settings.API_V1_STR)
 
+app.include_router(metrics_router)
+
 
 if __name__ == "__main__":
     import uvicorn
@@ -0,0 +1,16 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from core.database import engine_pools
+from core.services.mra_client import mra_breaker
+from core.utils.circuit_breaker import render_breaker_metrics
+from core.utils.pool import render_pool_metrics
+
+router = APIRouter(tags=["Metrics"])
+
+
+@router.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+async def get_metrics():
+    """Prometheus scrape endpoint for the state of this worker's database pools and MRA circuit breaker."""
+    return PlainTextResponse(render_pool_metrics(engine_pools()) + render_breaker_metrics({"mra": mra_breaker}),
+                             media_type="text/plain; version=0.0.4")
@@ -4,16 +4,18 @@ from typing import Annotated
 
 import httpx
 from fastapi import APIRouter, Header, Depends, HTTPException
-from sqlalchemy import func
+from sqlalchemy import func, select
 from sqlalchemy.exc import SQLAlchemyError
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from starlette import status
 
 from apps.products.schema import ProductRead
 from core.auth import get_current_user
-from core.database import get_db
+from core.database import get_async_db
 from core.models import Terminal, Product, Tenant
 from core.services.activation import write_api_log
+from core.services.mra_client import hedged_post
+from core.services.terminal_context import resolve_terminal, TerminalSnapshot
 from core.settings import settings
 
 logger = logging.getLogger(__name__)
@@ -26,7 +28,7 @@ router = APIRouter(
 )
 
 
-async def fetch_products_from_api(db: Session, terminal: Terminal | type[Terminal]) -> list[dict]:
+async def fetch_products_from_api(db: AsyncSession, terminal: TerminalSnapshot) -> list[dict]:
     """Fetch products from the external API.
 
     Args:
@@ -44,25 +46,25 @@ async def fetch_products_from_api(db: Session, terminal: Terminal | type[Termina
         "Content-Type": "application/json",
         "Authorization": f"Bearer {terminal.token}"
     }
+    url = f"{settings.MRA_EIS_URL}/utilities/get-terminal-site-products"
     try:
-        async with httpx.AsyncClient(timeout=30.0, verify=False) as client:
-            url = f"{settings.MRA_EIS_URL}/utilities/get-terminal-site-products"
-            response = await client.post(
-                url,
-                json=payload,
-                headers=headers,
+        response = await hedged_post(
+            url,
+            json=payload,
+            headers=headers,
+            timeout=30.0,
+        )
+        write_api_log(payload, response, url, headers)
+        response.raise_for_status()
+
+        data = response.json()
+        if int(data.get("statusCode", 0)) < -1:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=data.get("remark", "Failed to fetch products")
             )
-            await write_api_log(db, payload, response, url, headers)
-            response.raise_for_status()
-
-            data = response.json()
-            if int(data.get("statusCode", 0)) < -1:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail=data.get("remark", "Failed to fetch products")
-                )
 
-            return data.get("data", [])
+        return data.get("data", [])
 
     except httpx.HTTPStatusError as e:
         logger.error(f"HTTP error fetching products: {str(e)}")
@@ -78,7 +80,7 @@ async def fetch_products_from_api(db: Session, terminal: Terminal | type[Termina
         )
 
 
-async def sync_products_with_db(db: Session, products_data: list[dict], tenant_id: Tenant.id,
+async def sync_products_with_db(db: AsyncSession, products_data: list[dict], tenant_id: Tenant.id,
                                 site_id: Terminal.site_id) -> None:
     """Synchronize products in the database with the fetched data.
 
@@ -90,8 +92,8 @@ async def sync_products_with_db(db: Session, products_data: list[dict], tenant_i
     """
     try:
         existing_codes = {p['productCode'] for p in products_data if 'productCode' in p}
-        existing_products = {p.code: p for p in db.query(Product).filter(Product.code.in_(existing_codes),
-                                                                         Product.site_id == site_id).all()}
+        existing_products = {p.code: p for p in await db.scalars(select(Product).where(Product.code.in_(existing_codes),
+                                                                                      Product.site_id == site_id))}
 
         for product_data in products_data:
             if not product_data.get('productCode'):
@@ -121,10 +123,10 @@ async def sync_products_with_db(db: Session, products_data: list[dict], tenant_i
                 # Add new product
                 db.add(Product(**product_dict))
 
-        db.commit()
+        await db.commit()
 
     except SQLAlchemyError as e:
-        db.rollback()
+        await db.rollback()
         logger.error(f"Database error syncing products: {str(e)}")
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -135,7 +137,7 @@ async def sync_products_with_db(db: Session, products_data: list[dict], tenant_i
 @router.get("/", response_model=list[ProductRead], summary="Get products for terminal")
 async def get_products(
         x_device_id: Annotated[str, Header(..., description="Device ID of the terminal")],
-        db: Session = Depends(get_db)
+        db: AsyncSession = Depends(get_async_db)
 ):
     """
     Retrieve products for a specific terminal.
@@ -150,7 +152,7 @@ async def get_products(
     Returns:
         List of Product objects
     """
-    terminal = db.query(Terminal).filter(Terminal.device_id == x_device_id).first()
+    terminal = await resolve_terminal(db, x_device_id)
     if not terminal:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -180,10 +182,10 @@ async def get_products(
             )
 
         # Return products for the terminal's site
-        return db.query(Product).filter(
+        return (await db.scalars(select(Product).where(
             Product.site_id == terminal.site_id,
             Product.tenant_id == terminal.tenant_id
-        ).all()
+        ))).all()
 
     except HTTPException:
         raise
@@ -199,25 +201,25 @@ async def get_products(
 async def search_products(
         name: str,
         x_device_id: Annotated[str, Header(..., description="Device ID of the terminal")],
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_async_db),
 ):
-    terminal = db.query(Terminal).filter(Terminal.device_id == x_device_id).first()
+    terminal = await resolve_terminal(db, x_device_id)
     if not terminal:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Terminal not found"
         )
-    return db.query(Product).filter(
+    return (await db.scalars(select(Product).where(
         func.lower(Product.name).contains(name.lower()),
         Product.site_id == terminal.site_id
-    ).all()
+    ))).all()
 
 
 @router.get("/{code}", summary="Get product by code", response_model=ProductRead)
 async def get_product(
         code: str,
         x_device_id: Annotated[str, Header(..., description="Device ID of the terminal")],
-        db: Session = Depends(get_db)):
+        db: AsyncSession = Depends(get_async_db)):
     """
     Get product by bar code
 
@@ -229,13 +231,13 @@ async def get_product(
     Returns:
         The product
     """
-    terminal = db.query(Terminal).filter(Terminal.device_id == x_device_id).first()
+    terminal = await resolve_terminal(db, x_device_id)
     if not terminal:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Terminal not found"
         )
-    product = db.query(Product).filter(Product.code == code, Product.site_id == terminal.site_id).first()
+    product = await db.scalar(select(Product).where(Product.code == code, Product.site_id == terminal.site_id))
     if not product:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
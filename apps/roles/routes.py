@@ -10,6 +10,7 @@ from apps.routes.schema import RoleWithRoutesRead
 from core.auth import is_global_admin, get_current_user, has_permission
 from core.database import get_db
 from core.models import Role, Route
+from core.services.permissions import permissions_changed
 
 router = APIRouter(prefix="/roles", tags=["Roles"], dependencies=[Depends(get_current_user), Depends(has_permission)])
 
@@ -59,6 +60,7 @@ async def assign_routes_to_role(role_id: UUID, route_ids: list[UUID], db: Sessio
     role.routes.extend(new_routes)
 
     db.commit()
+    permissions_changed(db)
     db.refresh(role)  # Refresh to load the updated relationships
 
     return role
@@ -83,6 +85,7 @@ async def remove_route_from_role(role_id: UUID, route_id: UUID, db: Session = De
 
     role.routes.remove(route)
     db.commit()
+    permissions_changed(db)
     return
 
 
@@ -112,6 +115,7 @@ async def delete_role(role_id: UUID, db: Session = Depends(get_db)):
 
     db.delete(role)
     db.commit()
+    permissions_changed(db)
     return
 
 
@@ -7,6 +7,7 @@ from apps.routes.schema import RouteCreate, RouteRead
 from core.auth import is_global_admin
 from core.database import get_db
 from core.models import Route
+from core.services.permissions import permissions_changed
 
 router = APIRouter(prefix="/routes", tags=["Routes"])
 
@@ -21,6 +22,7 @@ def create_route(route: RouteCreate, db: Session = Depends(get_db)):
     db_route = Route(**route.model_dump(), name=f"{route.method}:{route.path}")
     db.add(db_route)
     db.commit()
+    permissions_changed(db)
     db.refresh(db_route)
     return db_route
 
@@ -51,6 +53,7 @@ def update_route(route_id: UUID, route: RouteCreate, db: Session = Depends(get_d
 
     db_route.name = f"{db_route.method}:{db_route.path}"
     db.commit()
+    permissions_changed(db)
     db.refresh(db_route)
     return db_route
 
@@ -63,4 +66,5 @@ def delete_route(route_id: UUID, db: Session = Depends(get_db)):
 
     db.delete(db_route)
     db.commit()
+    permissions_changed(db)
     return
@@ -1,18 +1,37 @@
+import asyncio
+import logging
+from dataclasses import dataclass
 from datetime import datetime
-from typing import Annotated
+from typing import Annotated, Any, Awaitable, Callable
+from uuid import UUID
 
-from fastapi import APIRouter, Depends, Header, HTTPException
+from fastapi import APIRouter, Depends, Header, HTTPException, Request
 from pydantic import constr
-from sqlalchemy.orm import Session
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from starlette import status
 
-from apps.sales.schema import TransactionRequest, TransactionResponse
-from core.auth import get_current_user
-from core.database import get_db
+from apps.sales.schema import TransactionRequest, TransactionResponse, InvoiceNumberReservationRequest, \
+    InvoiceNumberReservationResponse, BatchTransactionRequest, BatchTransactionResponse, Invoice
+from core.auth import get_current_user, is_global_admin
+from core.database import get_async_db, get_async_session_factory
+from core.enums import SubmissionMode
 from core.models import Terminal, GlobalConfig, Product, TaxRate
 from core.services.blocking import get_blocking_message
-from core.services.sales import submit_transaction, run_submission_job
-from core.utils.helpers import calculate_taxable_amount
+from core.services.counters import allocate_transaction_numbers
+from core.services.idempotency import sale_submissions, request_fingerprint
+from core.services.invoice_numbers import next_invoice_number, reserve_invoice_numbers
+from core.services.offline_uploads import OfflineUpload
+from core.services.outbox import outbox_dispatcher
+from core.services.pricing import price_invoice, LineItems
+from core.services.replay import run_submission_job, requeue_dead_letters
+from core.services.sales import submit_transaction, queue_transaction
+from core.services.terminal_context import resolve_terminal, invalidate_terminal, TerminalSnapshot
+from core.settings import settings
+from core.utils.deadline import Deadline, get_request_deadline
+from core.utils.streaming import NDJSONResponse
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(
     prefix="/sales",
@@ -25,18 +44,149 @@ router = APIRouter(
 async def submit_a_transaction(
         request: TransactionRequest,
         x_device_id: Annotated[constr(pattern="^\w{16}$"), Header(..., description="Device ID of the terminal")],
-        db: Session = Depends(get_db)):
+        db: AsyncSession = Depends(get_async_db),
+        deadline: Deadline | None = Depends(get_request_deadline)):
     if request.is_relief_supply and not request.vat5_certificate_details:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="VAT5 certificate details is required")
 
-    global_config = db.query(GlobalConfig).first()
-    if not global_config:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Config is not saved")
+    terminal = await resolve_terminal(db, x_device_id)
+    if not terminal:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Device ID is not recognized")
+
+    request, count_sale = await assign_invoice_number(request, terminal)
+
+    async def process() -> dict[str, Any]:
+        context = await load_sale_context(db, terminal, {item.product_code for item in request.invoice_line_items})
+        return await process_sale(db, request, terminal, context, count_sale=count_sale, deadline=deadline)
 
-    terminal = db.query(Terminal).filter(Terminal.device_id == x_device_id).first()
+    return await submit_sale(db, request, terminal, process)
+
+
+@router.post("/batch", dependencies=[Depends(get_current_user)], response_model=BatchTransactionResponse)
+async def submit_transactions(
+        request: BatchTransactionRequest,
+        x_device_id: Annotated[constr(pattern="^\w{16}$"), Header(..., description="Device ID of the terminal")],
+        db: AsyncSession = Depends(get_async_db),
+        session_factory: Callable[[], AsyncSession] = Depends(get_async_session_factory),
+        deadline: Deadline | None = Depends(get_request_deadline)):
+    """Submit several sales of one terminal, reporting the outcome of each.
+
+    The terminal, global config and products are looked up once for the whole batch. Sales
+    go to MRA concurrently, at most ``SALE_BATCH_CONCURRENCY`` at a time, each in a session
+    of its own. A sale MRA does not answer in time is saved offline like a single sale.
+    """
+    terminal = await resolve_terminal(db, x_device_id)
     if not terminal:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Device ID is not recognized")
 
+    context = await load_sale_context(db, terminal, {item.product_code
+                                                     for sale in request.transactions
+                                                     for item in sale.invoice_line_items})
+    fan_out = asyncio.Semaphore(settings.SALE_BATCH_CONCURRENCY)
+
+    async def submit(sale: TransactionRequest) -> dict[str, Any]:
+        async with fan_out:
+            try:
+                if sale.is_relief_supply and not sale.vat5_certificate_details:
+                    raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                                        detail="VAT5 certificate details is required")
+                sale, count_sale = await assign_invoice_number(sale, terminal)
+                async with session_factory() as session:
+                    response = await submit_sale(session, sale, terminal, lambda: process_sale(
+                        session, sale, terminal, context, count_sale=count_sale, deadline=deadline))
+            except HTTPException as e:
+                return {"invoice_number": sale.invoice_number, "status_code": e.status_code, "detail": e.detail}
+            except Exception as e:
+                # One failing sale must not cost the others, already submitted, their results
+                logger.error(f"Error submitting sale {sale.invoice_number} of a batch: {str(e)}")
+                return {"invoice_number": sale.invoice_number, "status_code": status.HTTP_500_INTERNAL_SERVER_ERROR,
+                        "detail": "Error submitting sale"}
+            return {"invoice_number": sale.invoice_number, "status_code": status.HTTP_200_OK, "result": response}
+
+    return {"results": await asyncio.gather(*(submit(sale) for sale in request.transactions))}
+
+
+@router.post("/offline", dependencies=[Depends(get_current_user)], response_class=NDJSONResponse)
+async def upload_offline_sales(
+        request: Request,
+        x_device_id: Annotated[constr(pattern="^\w{16}$"), Header(..., description="Device ID of the terminal")],
+        db: AsyncSession = Depends(get_async_db)):
+    """Upload the signed invoices a terminal made offline, one JSON invoice per line (NDJSON).
+
+    The body is read as it arrives and the response streams one acknowledgement per line,
+    ending with a summary. Stored invoices are submitted to MRA by the sync job.
+    """
+    terminal = await resolve_terminal(db, x_device_id)
+    if not terminal:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Device ID is not recognized")
+
+    return NDJSONResponse(OfflineUpload(db, terminal, schema=Invoice).ingest(request.stream()))
+
+
+@router.post("/invoice-numbers", dependencies=[Depends(get_current_user)],
+             response_model=InvoiceNumberReservationResponse, status_code=status.HTTP_201_CREATED)
+async def reserve_invoice_number_block(
+        request: InvoiceNumberReservationRequest,
+        x_device_id: Annotated[constr(pattern="^\w{16}$"), Header(..., description="Device ID of the terminal")],
+        db: AsyncSession = Depends(get_async_db)):
+    """Reserve a range of invoice numbers for a terminal to use while it is offline."""
+    terminal = await resolve_terminal(db, x_device_id)
+    if not terminal:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Device ID is not recognized")
+
+    block = await reserve_invoice_numbers(db, terminal, request.count)
+    return {
+        "taxpayer_id": block.taxpayer_id,
+        "position": block.position,
+        "julian_date": block.julian_date,
+        "prefix": block.prefix,
+        "first_count": block.counts[0],
+        "last_count": block.counts[-1],
+        "invoice_numbers": block.invoice_numbers,
+    }
+
+
+async def assign_invoice_number(request: TransactionRequest,
+                                terminal: TerminalSnapshot) -> tuple[TransactionRequest, bool]:
+    """Give a sale sent without an invoice number one minted by the server.
+
+    Returns:
+        The sale and whether it still has to be counted against the terminal. A minted
+        number was counted when it was reserved, so the sale must not count it again.
+    """
+    if request.invoice_number is not None:
+        return request, True
+    return request.model_copy(update={"invoice_number": await next_invoice_number(terminal)}), False
+
+
+async def submit_sale(db: AsyncSession, request: TransactionRequest, terminal: TerminalSnapshot,
+                      process: Callable[[], Awaitable[dict[str, Any]]]) -> dict[str, Any]:
+    """Run ``process`` unless the sale was already submitted, see ``SaleSubmissions``."""
+    response = await sale_submissions.run(
+        db,
+        terminal.id,
+        request.invoice_number,
+        request_fingerprint(request.model_dump_json(warnings=False)),
+        process,
+    )
+    if terminal.tenant.submission_mode == SubmissionMode.OUTBOX:
+        outbox_dispatcher.notify()
+    return response
+
+
+@dataclass(frozen=True)
+class SaleContext:
+    """What every sale of a terminal is priced against, shared by the sales of a batch."""
+
+    global_config_version: int
+    catalog: dict[str, tuple[Product, TaxRate | None]]
+
+
+async def load_sale_context(db: AsyncSession, terminal: TerminalSnapshot, product_codes: set[str]) -> SaleContext:
+    global_config = await db.scalar(select(GlobalConfig).limit(1))
+    if not global_config:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Config is not saved")
+
     if terminal.is_blocked:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
                             detail=f"Terminal is blocked: {terminal.blocking_reason}")
@@ -47,59 +197,61 @@ async def submit_a_transaction(
     if not terminal.tenant.tin:
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Tax payer config is not saved")
 
-    tax_breakdown = {}
-    total_vat = 0
-    invoice_total = 0
-    line_items = []
+    return SaleContext(global_config_version=global_config.version,
+                       catalog=await load_sale_catalog(db, terminal, product_codes))
+
+
+async def process_sale(db: AsyncSession, request: TransactionRequest, terminal: TerminalSnapshot,
+                       context: SaleContext, count_sale: bool = True,
+                       deadline: Deadline | None = None) -> dict[str, Any]:
+    """Price the sale, submit it to MRA and count it against the terminal.
+
+    Sales of a tenant in outbox mode are queued for the outbox dispatcher instead of submitted.
 
+    The transaction count update is left for the caller to commit together with the stored response.
+    ``count_sale`` is off for sales whose invoice number was minted, and so already counted, by the server.
+    With a ``deadline`` the sale is signed offline rather than answered after the POS gave up on it.
+    """
+    catalog = context.catalog
+    products = []
     for item in request.invoice_line_items:
-        product = db.query(Product).filter(Product.code == item.product_code).first()
-        if not product:
+        if item.product_code not in catalog:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Product not found")
 
-        db_tax_rate = db.query(TaxRate).filter(TaxRate.rate_id == product.tax_rate_id).first()
+        product, db_tax_rate = catalog[item.product_code]
         if not db_tax_rate:
             raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Tax rate not found")
+        products.append(product)
 
-        selling_price = product.unit_price - item.discount
-        amount = selling_price * item.quantity
-
-        rate_id = db_tax_rate.rate_id
-        taxable_amount = calculate_taxable_amount(amount, db_tax_rate.rate)
-        taxable_unit_price = calculate_taxable_amount(selling_price, db_tax_rate.rate)
-        tax_amount = amount - taxable_amount
-
-        if rate_id not in tax_breakdown:
-            tax_breakdown[rate_id] = {
-                "taxableAmount": 0,
-                "taxAmount": 0
-            }
-
-        tax_breakdown[rate_id]["taxableAmount"] += taxable_amount
-        tax_breakdown[rate_id]["taxAmount"] += tax_amount
-        total_vat += tax_amount
-        invoice_total += amount
-
-        line_items.append({
-            "id": len(line_items) + 1,
-            "productCode": item.product_code,
-            "description": product.description,
-            "unitPrice": product.unit_price,
-            "quantity": item.quantity,
-            "discount": item.discount,
-            "total": selling_price,
-            "totalVAT": round(tax_amount, 2),
-            "taxRateId": db_tax_rate.rate_id,
-            "isProduct": product.is_product
-        })
-
-    tax_breakdown_list = []
-    for rate_id, breakdown in tax_breakdown.items():
-        tax_breakdown_list.append({
-            "rateId": rate_id,
-            "taxableAmount": round(breakdown["taxableAmount"], 2),
-            "taxAmount": round(breakdown["taxAmount"], 2),
-        })
+    pricing = price_invoice(
+        LineItems(
+            rate_ids=[product.tax_rate_id for product in products],
+            unit_prices=[product.unit_price for product in products],
+            quantities=[item.quantity for item in request.invoice_line_items],
+            discounts=[item.discount for item in request.invoice_line_items],
+        ),
+        {tax_rate.rate_id: tax_rate.rate for _, tax_rate in catalog.values() if tax_rate},
+    )
+
+    line_items = [{
+        "id": index + 1,
+        "productCode": item.product_code,
+        "description": product.description,
+        "unitPrice": float(product.unit_price),
+        "quantity": item.quantity,
+        "discount": item.discount,
+        "total": float(selling_price),
+        "totalVAT": float(line_vat),
+        "taxRateId": product.tax_rate_id,
+        "isProduct": product.is_product
+    } for index, (item, product, selling_price, line_vat) in enumerate(
+        zip(request.invoice_line_items, products, pricing.selling_prices, pricing.line_vat))]
+
+    tax_breakdown_list = [{
+        "rateId": breakdown.rate_id,
+        "taxableAmount": float(breakdown.taxable_amount),
+        "taxAmount": float(breakdown.tax_amount),
+    } for breakdown in pricing.tax_breakdown]
 
     vat5_certificate_details = {
         "projectNumber": request.vat5_certificate_details.project_number,
@@ -116,7 +268,7 @@ async def submit_a_transaction(
             "buyerName": request.buyer_name,
             "buyerAuthorizationCode": request.buyer_authorization_code,
             "siteId": str(terminal.site_id),
-            "globalConfigVersion": global_config.version,
+            "globalConfigVersion": context.global_config_version,
             "taxpayerConfigVersion": terminal.tenant.config_version,
             "terminalConfigVersion": terminal.config_version,
             "isReliefSupply": request.is_relief_supply,
@@ -126,22 +278,31 @@ async def submit_a_transaction(
         "invoiceLineItems": line_items,
         "invoiceSummary": {
             "taxBreakDown": tax_breakdown_list,
-            "totalVAT": round(total_vat, 2),
+            "totalVAT": float(pricing.total_vat),
             "offlineSignature": request.offline_signature,
-            "invoiceTotal": invoice_total
+            "invoiceTotal": float(pricing.invoice_total)
         }
     }
 
-    try:
-        response = await submit_transaction(invoice, terminal, db)
-    except Exception as e:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+    if terminal.tenant.submission_mode == SubmissionMode.OUTBOX:
+        # Stored with the sale's count and response, and delivered to MRA by the outbox dispatcher
+        response = await queue_transaction(invoice, terminal, db)
+    else:
+        try:
+            response = await submit_transaction(invoice, terminal, db, deadline=deadline)
+        except HTTPException:
+            raise
+        except Exception as e:
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
 
     if response.should_block_terminal():
         block_response = await get_blocking_message(terminal)
-        terminal.is_blocked = True
-        terminal.blocking_reason = block_response.blocking_reason()
-        db.commit()
+        await db.execute(update(Terminal).where(Terminal.id == terminal.id).values({
+            Terminal.is_blocked: True,
+            Terminal.blocking_reason: block_response.blocking_reason()
+        }))
+        await db.commit()
+        invalidate_terminal(terminal.device_id)
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=block_response.blocking_reason())
 
     if response.should_download_latest_config():
@@ -150,8 +311,8 @@ async def submit_a_transaction(
     if not response.success():
         raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=response.remark())
 
-    terminal.transaction_count += 1
-    db.commit()
+    if count_sale:
+        await allocate_transaction_numbers(db, terminal.id)
 
     return {
         "validation_url": response.validation_url(),
@@ -160,7 +321,42 @@ async def submit_a_transaction(
     }
 
 
+async def load_sale_catalog(
+        db: AsyncSession,
+        terminal: TerminalSnapshot,
+        product_codes: set[str]
+) -> dict[str, tuple[Product, TaxRate | None]]:
+    """Resolve every product on a sale together with its tax rate in a single query.
+
+    Args:
+        db: Database session
+        terminal: Terminal the sale is made on, used to scope products to its site and tenant
+        product_codes: Distinct product codes on the invoice
+
+    Returns:
+        Mapping of product code to a ``(product, tax_rate)`` pair, the tax rate being None when it is not saved
+    """
+    rows = await db.execute(select(Product, TaxRate)
+                            .outerjoin(TaxRate, TaxRate.rate_id == Product.tax_rate_id)
+                            .where(Product.code.in_(product_codes),
+                                   Product.site_id == terminal.site_id,
+                                   Product.tenant_id == terminal.tenant_id))
+
+    catalog = {}
+    for product, tax_rate in rows:
+        catalog.setdefault(product.code, (product, tax_rate))
+    return catalog
+
+
 @router.post("/sync", status_code=status.HTTP_200_OK)
-async def sync_offline_sale(db: Session = Depends(get_db)):
-    await run_submission_job(db)
-    return {"status": "ok"}
+async def sync_offline_sale(session_factory: Callable[[], AsyncSession] = Depends(get_async_session_factory)):
+    report, _ = await run_submission_job(session_factory)
+    return {"status": "ok", "report": report.as_dict()}
+
+
+@router.post("/dead-letters/requeue", dependencies=[Depends(is_global_admin)], status_code=status.HTTP_200_OK)
+async def requeue_dead_lettered_sales(terminal_id: UUID | None = None, db: AsyncSession = Depends(get_async_db)):
+    """Retry the offline sales that were dead-lettered, of one terminal or of all of them."""
+    requeued = await requeue_dead_letters(db, None if terminal_id is None else [terminal_id])
+    outbox_dispatcher.notify()
+    return {"requeued": requeued}
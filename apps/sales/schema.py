@@ -1,7 +1,9 @@
 from datetime import datetime
 from enum import Enum
 
-from pydantic import BaseModel, field_validator, conlist
+from pydantic import BaseModel, field_validator, conlist, conint
+
+from core.settings import settings
 
 
 class PaymentMethod(str, Enum):
@@ -30,7 +32,7 @@ class VAT5CertificateDetailsRequest(BaseModel):
     quantity: int
 
 class TransactionRequest(BaseModel):
-    invoice_number: str
+    invoice_number: str | None = None
     buyer_tin: str | None = None
     buyer_name: str | None = None
     buyer_authorization_code: str | None = None
@@ -98,3 +100,32 @@ class TransactionResponse(BaseModel):
     validation_url: str
     remark: str
     invoice: Invoice
+
+
+class BatchTransactionRequest(BaseModel):
+    transactions: conlist(TransactionRequest, min_length=1, max_length=settings.SALE_BATCH_MAX_SIZE)
+
+
+class BatchTransactionResult(BaseModel):
+    invoice_number: str | None
+    status_code: int
+    detail: str | None = None
+    result: TransactionResponse | None = None
+
+
+class BatchTransactionResponse(BaseModel):
+    results: list[BatchTransactionResult]
+
+
+class InvoiceNumberReservationRequest(BaseModel):
+    count: conint(ge=1, le=settings.INVOICE_NUMBER_MAX_RESERVATION)
+
+
+class InvoiceNumberReservationResponse(BaseModel):
+    taxpayer_id: int
+    position: int
+    julian_date: int
+    prefix: str
+    first_count: int
+    last_count: int
+    invoice_numbers: list[str]
@@ -8,12 +8,13 @@ from sqlalchemy import or_
 from sqlalchemy.orm import Session
 from starlette import status
 
-from apps.tenants.schema import TenantRead, TenantCreate
+from apps.tenants.schema import TenantRead, TenantCreate, SubmissionModeUpdate
 from apps.users.routes import create_db_user
 from apps.users.schema import UserRead, AdminCreate
 from core.auth import is_global_admin
 from core.database import get_db
 from core.models import Tenant, User, Role
+from core.services.terminal_context import invalidate_tenant_terminals
 from core.utils.emailer import send_email
 from core.utils.helpers import hash_password
 
@@ -105,3 +106,17 @@ def create_tenant_admin(tenant_id: UUID, user: AdminCreate, db: Session = Depend
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Tenant not found")
 
     return create_db_user(user, db, tenant_id)
+
+
+@router.put("/{tenant_id}/submission-mode", response_model=TenantRead, dependencies=[Depends(is_global_admin)])
+def update_submission_mode(tenant_id: UUID, request: SubmissionModeUpdate, db: Session = Depends(get_db)):
+    """Choose whether the tenant's sales go to MRA while the POS waits or through the outbox."""
+    tenant = db.query(Tenant).filter(Tenant.id == tenant_id).first()
+    if not tenant:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Tenant not found")
+
+    tenant.submission_mode = request.submission_mode.value
+    db.commit()
+    db.refresh(tenant)
+    invalidate_tenant_terminals(tenant.id)
+    return tenant
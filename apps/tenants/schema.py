@@ -2,6 +2,7 @@ from uuid import UUID
 
 from pydantic import BaseModel, EmailStr, constr
 
+from core.enums import SubmissionMode
 from core.utils.helpers import phone_number_regex, tenant_code_regex
 
 
@@ -16,8 +17,13 @@ class TenantBase(BaseModel):
 class TenantRead(TenantBase):
     id: UUID
     code: constr(pattern=tenant_code_regex)
+    submission_mode: SubmissionMode
 
 
 class TenantCreate(TenantBase):
     admin_name: str
     password: str
+
+
+class SubmissionModeUpdate(BaseModel):
+    submission_mode: SubmissionMode
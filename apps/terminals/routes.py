@@ -2,15 +2,18 @@ from typing import Annotated
 
 from fastapi import APIRouter, Depends, Header, HTTPException
 from pydantic import constr
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from starlette import status
 
 from apps.config.schema import TerminalRead
 from apps.terminals.schema import UnblockStatusResponse
 from core.auth import get_current_user
-from core.database import get_db
+from core.database import get_db, get_async_db
 from core.models import Terminal
 from core.services.blocking import get_unblock_status
+from core.services.terminal_context import resolve_terminal, invalidate_terminal
 
 router = APIRouter(
     prefix="/terminals",
@@ -22,9 +25,9 @@ router = APIRouter(
 @router.get("/unblock-status", dependencies=[Depends(get_current_user)], response_model=UnblockStatusResponse)
 async def get_terminal_unblock_status(
         x_device_id: Annotated[constr(pattern="^\w{16}$"), Header(..., description="Device ID of the terminal")],
-        db: Session = Depends(get_db),
+        db: AsyncSession = Depends(get_async_db),
 ):
-    terminal = db.query(Terminal).filter(Terminal.device_id == x_device_id).first()
+    terminal = await resolve_terminal(db, x_device_id)
     if not terminal:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -33,11 +36,18 @@ async def get_terminal_unblock_status(
 
     unblock_status = await get_unblock_status(terminal)
     if unblock_status.is_unblocked():
-        terminal.is_blocked = False
-        terminal.blocking_reason = None
-        db.commit()
+        await db.execute(update(Terminal).where(Terminal.id == terminal.id).values({
+            Terminal.is_blocked: False,
+            Terminal.blocking_reason: None
+        }))
+        await db.commit()
+        invalidate_terminal(terminal.device_id)
+        return {
+            "is_unblocked": True,
+            "details": "Terminal is unblocked"
+        }
     return {
-        "is_unblocked": unblock_status.is_unblocked(),
+        "is_unblocked": False,
         "details": terminal.blocking_reason if terminal.is_blocked else "Terminal is unblocked"
     }
 
@@ -6,7 +6,7 @@ from sqlalchemy.orm import Session
 from starlette import status
 
 from apps.users.schema import UserRead, UserCreate, AdminCreate
-from core.auth import get_current_user, has_permission, get_current_tenant_or_none
+from core.auth import get_current_user, has_permission, get_current_tenant_or_none, Principal
 from core.database import get_db
 from core.enums import Scope
 from core.models import Tenant, User, Role
@@ -18,7 +18,7 @@ router = APIRouter(prefix="/users", tags=["Users"], dependencies=[Depends(get_cu
 
 @router.post("/", status_code=status.HTTP_201_CREATED, response_model=UserRead)
 def create_user(user: UserCreate, db: Session = Depends(get_db), tenant: Tenant = Depends(get_current_tenant_or_none),
-                admin: User = Depends(get_current_user)):
+                admin: Principal = Depends(get_current_user)):
     role = db.query(Role).filter(Role.id == user.role_id).first()
     if not role or role.name == "global_admin" and not admin.scope == Scope.GLOBAL:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not logged in as a global admin")
@@ -1,26 +1,119 @@
 import uuid
+from dataclasses import dataclass
 from datetime import timedelta, datetime
 from uuid import UUID
 
 from fastapi import Depends, HTTPException, status, Request
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
-from passlib.context import CryptContext
-from sqlalchemy.orm import Session, Mapped
+from sqlalchemy import event, select, inspect, Connection
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, Mapped, ORMExecuteState
 
-from core.database import get_db
+from core.database import get_db, get_async_db
 from core.enums import RoleEnum, Scope
-from core.models import User, Tenant, Route
+from core.models import User, Tenant, Role
+from core.services.permissions import permission_matrix, SharedVersion, bump_cache_version_in
 from core.settings import settings
+from core.utils.cache import TTLCache
+from core.utils.helpers import get_pwd_context
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/auth/login")
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 TOKEN_URL = "token"
 SECRET_KEY = settings.SECRET_KEY
 ALGORITHM = settings.ALGORITHM
 
 
+@dataclass(frozen=True)
+class Principal:
+    """The authenticated user as seen by request handlers, detached from any session."""
+
+    id: UUID
+    email: str
+    tenant_id: UUID | None
+    role_id: UUID | None
+    role_name: str | None
+    scope: int | None
+    status: int | None
+
+
+PRINCIPALS_CACHE = "principals"
+
+# Principals are cached with the shared version they were loaded at, and reloaded once any
+# worker changes a user or role and bumps the version
+principal_cache: TTLCache[str, tuple[int, Principal]] = TTLCache(
+    maxsize=settings.PRINCIPAL_CACHE_SIZE,
+    ttl=settings.PRINCIPAL_CACHE_TTL,
+)
+principals_version = SharedVersion(PRINCIPALS_CACHE, check_interval=settings.PRINCIPAL_CHECK_INTERVAL)
+
+
+def invalidate_user_principals(user_id: UUID) -> None:
+    principal_cache.discard_where(lambda entry: entry[1].id == user_id)
+
+
+# Columns a cached principal is built from; changes to anything else (last_login, name, ...) keep the cache
+PRINCIPAL_COLUMNS = {
+    User: {"email", "tenant_id", "role_id", "scope", "status", "refresh_token_version"},
+    Role: {"name"},
+}
+
+
+def _principals_changed(connection: Connection) -> None:
+    bump_cache_version_in(connection, PRINCIPALS_CACHE)
+    principals_version.invalidate()
+
+
+def _principal_fields_changed(target: User | Role) -> bool:
+    attrs = inspect(target).attrs
+    return any(attrs[field].history.has_changes() for field in PRINCIPAL_COLUMNS[type(target)])
+
+
+@event.listens_for(User, "after_delete")
+def _user_deleted(mapper, connection, target: User):
+    invalidate_user_principals(target.id)
+    _principals_changed(connection)
+
+
+@event.listens_for(User, "after_update")
+def _user_changed(mapper, connection, target: User):
+    if _principal_fields_changed(target):
+        _user_deleted(mapper, connection, target)
+
+
+@event.listens_for(Role, "after_delete")
+def _role_deleted(mapper, connection, target: Role):
+    principal_cache.discard_where(lambda entry: entry[1].role_id == target.id)
+    _principals_changed(connection)
+
+
+@event.listens_for(Role, "after_update")
+def _role_changed(mapper, connection, target: Role):
+    if _principal_fields_changed(target):
+        _role_deleted(mapper, connection, target)
+
+
+def _bulk_update_columns(state: ORMExecuteState) -> set[str]:
+    columns = {getattr(key, "key", key) for key in state.statement._values or ()}
+    # update(User) executed with a list of parameter dicts sets the keys of those dicts
+    parameters = state.parameters
+    for params in parameters if isinstance(parameters, list) else [parameters or {}]:
+        columns.update(params)
+    return columns
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _users_or_roles_changed_in_bulk(state: ORMExecuteState):
+    # Bulk update() and delete() statements skip the mapper events above
+    if not (state.is_update or state.is_delete) or not state.bind_mapper:
+        return
+    principal_columns = PRINCIPAL_COLUMNS.get(state.bind_mapper.class_)
+    if principal_columns and (state.is_delete or principal_columns & _bulk_update_columns(state)):
+        principal_cache.clear()
+        _principals_changed(state.session.connection())
+
+
 def raise_credentials_exception():
     raise HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
@@ -29,7 +122,7 @@ def raise_credentials_exception():
     )
 
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)) -> Principal:
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
         email: str = payload.get("sub")
@@ -37,10 +130,24 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: Session = De
             return raise_credentials_exception()
     except JWTError:
         return raise_credentials_exception()
-    user = db.query(User).filter(User.email == email).first()
-    if not user:
+
+    cache_key = payload.get("jti") or f"{email}:{payload.get('iat')}"
+    version = await principals_version.current(db)
+    cached = principal_cache.get(cache_key)
+    if cached and cached[0] == version:
+        return cached[1]
+
+    result = await db.execute(select(User.id, User.email, User.tenant_id, User.role_id, Role.name, User.scope,
+                                     User.status)
+                              .outerjoin(Role, Role.id == User.role_id)
+                              .where(User.email == email))
+    row = result.first()
+    if not row:
         return raise_credentials_exception()
-    return user
+
+    principal = Principal(*row)
+    principal_cache.set(cache_key, (version, principal))
+    return principal
 
 
 def create_access_token(data: dict, expires_delta: timedelta = timedelta(minutes=15)):
@@ -48,7 +155,8 @@ def create_access_token(data: dict, expires_delta: timedelta = timedelta(minutes
     expire = datetime.now() + expires_delta
     to_encode.update({
         "exp": expire,
-        "iat": datetime.now()
+        "iat": datetime.now(),
+        "jti": str(uuid.uuid4())
     })
     return jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
 
@@ -76,7 +184,7 @@ async def get_current_tenant_or_none(token: str = Depends(oauth2_scheme), db: Se
     return tenant
 
 
-async def get_tenant(db: Session = Depends(get_db), user: User = Depends(get_current_user)):
+async def get_tenant(db: Session = Depends(get_db), user: Principal = Depends(get_current_user)):
     if not user or not user.tenant_id:
         raise HTTPException(status_code=400, detail="User not found")
     tenant = db.query(Tenant).filter(Tenant.id == user.tenant_id).first()
@@ -85,37 +193,37 @@ async def get_tenant(db: Session = Depends(get_db), user: User = Depends(get_cur
     return tenant
 
 
-async def is_global_admin(user: User = Depends(get_current_user)):
-    if user.role.name != RoleEnum.GLOBAL_ADMIN or not user.scope == Scope.GLOBAL:
+async def is_global_admin(user: Principal = Depends(get_current_user)):
+    if user.role_name != RoleEnum.GLOBAL_ADMIN or not user.scope == Scope.GLOBAL:
         raise HTTPException(status_code=403, detail="User is not a global admin user")
     return user
 
 
-async def is_admin(user: User = Depends(get_current_user)):
-    if user.role.name != "admin":
+async def is_admin(user: Principal = Depends(get_current_user)):
+    if user.role_name != "admin":
         raise HTTPException(status_code=403, detail="User is not an admin user")
     return user
 
 
 async def has_permission(
         request: Request,
-        current_user: User = Depends(get_current_user),
-        db: Session = Depends(get_db)
+        current_user: Principal = Depends(get_current_user),
+        db: AsyncSession = Depends(get_async_db)
 ):
     path = request.url.path
     route = request.scope.get("route")
     path = route.path if route else path
-    method = request.method
-    route = db.query(Route).filter(Route.path == path, Route.method == method).first()
-    if not route or current_user.scope == Scope.GLOBAL or current_user.role in route.roles:
+    if current_user.scope == Scope.GLOBAL:
+        return True
+    if await permission_matrix.allows(db, request.method, path, current_user.role_id):
         return True
 
     raise HTTPException(status_code=403, detail="Forbidden")
 
 
 def verify_password(plain_password: str, hashed_password: str | Mapped[str]):
-    return pwd_context.verify(plain_password, hashed_password)
+    return get_pwd_context().verify(plain_password, hashed_password)
 
 
 def get_password_hash(password: str):
-    return pwd_context.hash(password)
+    return get_pwd_context().hash(password)
@@ -1,13 +1,139 @@
-from sqlalchemy import create_engine
-from sqlalchemy.orm import declarative_base, sessionmaker
+import logging
+import threading
+from typing import Any, Callable
+
+from sqlalchemy import create_engine, make_url, Engine
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncEngine, AsyncSession
+from sqlalchemy.orm import declarative_base, sessionmaker, Session
+from sqlalchemy.pool import Pool
 
 from core.settings import settings
+from core.utils.pool import InstrumentedQueuePool, InstrumentedAsyncAdaptedQueuePool, pool_sizing
+
+logger = logging.getLogger(__name__)
+
+ASYNC_DRIVERS = {
+    "postgresql": "postgresql+asyncpg",
+    "sqlite": "sqlite+aiosqlite",
+}
+
+
+def async_database_url(url: str) -> str:
+    """Swap the driver of a sync database URL for its asyncio counterpart."""
+    url = make_url(url)
+    drivername = ASYNC_DRIVERS.get(url.get_backend_name(), url.drivername)
+    return url.set(drivername=drivername).render_as_string(hide_password=False)
+
+
+def engine_options(url: str, poolclass: type[Pool]) -> dict[str, Any]:
+    """Pool and connection settings for an engine, sized for this worker's share of connections."""
+    url = make_url(url)
+    if url.get_backend_name() == "sqlite":
+        return {}
+
+    pool_size = settings.DB_POOL_SIZE or pool_sizing(
+        max_connections=settings.DB_MAX_CONNECTIONS,
+        workers=settings.WEB_CONCURRENCY,
+        engines=2,
+        max_overflow=settings.DB_MAX_OVERFLOW,
+    )
+    total = (pool_size + settings.DB_MAX_OVERFLOW) * settings.WEB_CONCURRENCY * 2
+    if total > settings.DB_MAX_CONNECTIONS:
+        logger.warning(f"{settings.WEB_CONCURRENCY} workers may open {total} database connections, "
+                       f"more than DB_MAX_CONNECTIONS={settings.DB_MAX_CONNECTIONS}")
+
+    options = {
+        "poolclass": poolclass,
+        "pool_size": pool_size,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+    }
+    if url.get_backend_name() == "postgresql" and settings.DB_STATEMENT_TIMEOUT_MS:
+        timeout = str(settings.DB_STATEMENT_TIMEOUT_MS)
+        if url.get_driver_name() == "asyncpg":
+            options["connect_args"] = {"server_settings": {"statement_timeout": timeout}}
+        else:
+            options["connect_args"] = {"options": f"-c statement_timeout={timeout}"}
+    return options
+
+
+_engine: Engine | None = None
+_async_engine: AsyncEngine | None = None
+_engine_lock = threading.Lock()
+
+
+def get_engine() -> Engine:
+    """The sync engine, used by Alembic, seeders, background jobs and the admin routers.
+
+    Created on first use so importing ``core`` does not need a reachable database.
+    """
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = create_engine(settings.DATABASE_URL,
+                                        **engine_options(settings.DATABASE_URL, InstrumentedQueuePool))
+    return _engine
+
+
+def get_async_engine() -> AsyncEngine:
+    """The async engine, used by the device facing request path."""
+    global _async_engine
+    if _async_engine is None:
+        with _engine_lock:
+            if _async_engine is None:
+                url = settings.ASYNC_DATABASE_URL or async_database_url(settings.DATABASE_URL)
+                _async_engine = create_async_engine(url, **engine_options(url, InstrumentedAsyncAdaptedQueuePool))
+    return _async_engine
+
+
+class LazySessionMaker(sessionmaker):
+    """A sessionmaker that binds to its engine when the first session is made."""
 
-engine = create_engine(settings.DATABASE_URL)
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+    def __init__(self, engine_factory: Callable[[], Engine], **kw):
+        super().__init__(**kw)
+        self.engine_factory = engine_factory
+
+    def __call__(self, **local_kw) -> Session:
+        if self.kw.get("bind") is None:
+            self.configure(bind=self.engine_factory())
+        return super().__call__(**local_kw)
+
+
+class LazyAsyncSessionMaker(async_sessionmaker):
+    def __init__(self, engine_factory: Callable[[], AsyncEngine], **kw):
+        super().__init__(**kw)
+        self.engine_factory = engine_factory
+
+    def __call__(self, **local_kw) -> AsyncSession:
+        if self.kw.get("bind") is None:
+            self.configure(bind=self.engine_factory())
+        return super().__call__(**local_kw)
+
+
+SessionLocal = LazySessionMaker(get_engine, autocommit=False, autoflush=False)
+AsyncSessionLocal = LazyAsyncSessionMaker(get_async_engine, autoflush=False, expire_on_commit=False)
 Base = declarative_base()
 
-Base.metadata.create_all(bind=engine)
+
+def create_schema(bind: Engine | None = None) -> None:
+    """Create every table that does not exist yet.
+
+    Production schemas are managed by Alembic, this is for development databases and
+    runs at startup only when DB_CREATE_SCHEMA_ON_STARTUP is set.
+    """
+    import core.models  # noqa: F401, registers the tables on Base.metadata
+
+    Base.metadata.create_all(bind=bind or get_engine())
+
+
+async def dispose_engines() -> None:
+    if _async_engine is not None:
+        await _async_engine.dispose()
+    if _engine is not None:
+        _engine.dispose()
 
 
 # Dependency Injection for Database Session
@@ -17,3 +143,22 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+def get_async_session_factory() -> Callable[[], AsyncSession]:
+    """For routes that fan out concurrent work, each unit of which needs a session of its own."""
+    return AsyncSessionLocal
+
+
+def engine_pools() -> dict[str, Pool]:
+    pools = {}
+    if _engine is not None:
+        pools["sync"] = _engine.pool
+    if _async_engine is not None:
+        pools["async"] = _async_engine.sync_engine.pool
+    return pools
@@ -30,3 +30,19 @@ class PaymentStatus(str, Enum):
     PENDING = "pending"
     APPROVED = "approved"
     REJECTED = "rejected"
+
+
+class SubmissionStatus(str, Enum):
+    PENDING = "pending"
+    COMPLETED = "completed"
+
+
+class SubmissionMode(str, Enum):
+    INLINE = "inline"
+    OUTBOX = "outbox"
+
+
+class DeliveryStatus(str, Enum):
+    PENDING = "pending"
+    SUBMITTED = "submitted"
+    DEAD_LETTER = "dead_letter"
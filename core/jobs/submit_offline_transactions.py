@@ -1,4 +1,37 @@
-from core.services.sales import run_submission_job
+import asyncio
+import logging
+import signal
+
+from core.database import dispose_engines
+from core.services.mra_client import close_client
+from core.services.outbox import OutboxDispatcher
+
+logger = logging.getLogger(__name__)
+
+
+async def main() -> None:
+    """Replay offline transactions until SIGINT or SIGTERM, then finish the current sweep and exit.
+
+    Run as many of these as needed, on any number of nodes: terminals are leased, so no
+    transaction is submitted twice.
+    """
+    dispatcher = OutboxDispatcher()
+    stopping = asyncio.Event()
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, stopping.set)
+
+    dispatcher.start()
+    logger.info(f"Offline submission worker {dispatcher.name} started")
+    dispatcher.notify()
+    await stopping.wait()
+
+    logger.info(f"Offline submission worker {dispatcher.name} stopping")
+    await dispatcher.stop()
+    await close_client()
+    await dispose_engines()
+
 
 if __name__ == "__main__":
-    run_submission_job()
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
@@ -1,12 +1,17 @@
 import uuid
 from datetime import datetime
+from decimal import Decimal
 
-from sqlalchemy import Column, String, ForeignKey, UUID, Table, Float, DateTime, func, Integer, JSON, Boolean, Text, \
-    Enum
+from sqlalchemy import Column, String, ForeignKey, UUID, Table, DateTime, func, Integer, JSON, Boolean, Text, \
+    Enum, Index, text, Numeric
 from sqlalchemy.orm import Mapped, relationship, mapped_column
 
 from core.database import Base
-from core.enums import PaymentStatus
+from core.enums import PaymentStatus, SubmissionMode, DeliveryStatus
+
+# Amounts are kept exact to the tambala and load as Decimal, never as binary floats
+Money = Numeric(18, 2)
+Percentage = Numeric(5, 2)
 
 
 class Model(Base):
@@ -90,6 +95,9 @@ class Tenant(Model):
     activated_tax_rate_ids: Mapped[list[str]] = Column(JSON, nullable=True)
     tax_office_code: Mapped[str] = Column(String, nullable=True)
     tax_office_name: Mapped[str] = Column(String, nullable=True)
+    # Whether sales are sent to MRA while the POS waits, or queued and delivered in the background
+    submission_mode: Mapped[str] = Column(String, nullable=False, default=SubmissionMode.INLINE.value,
+                                          server_default=SubmissionMode.INLINE.value)
 
     users: Mapped[list["User"]] = relationship("User", back_populates="tenant")
     profile: Mapped["Profile"] = relationship("Profile", back_populates="tenant")
@@ -103,8 +111,11 @@ class Tenant(Model):
 
 class Route(Model):
     __tablename__ = "routes"
+    __table_args__ = (
+        Index("ix_routes_path_method", "path", "method", unique=True),
+    )
 
-    path: Mapped[str] = Column(String, unique=False, index=True)  # The route path (e.g., "/tasks/")
+    path: Mapped[str] = Column(String, unique=False)  # The route path (e.g., "/tasks/")
     method: Mapped[str] = Column(String)  # The HTTP method (e.g., "GET", "POST")
     action: Mapped[str] = Column(String, nullable=False)  # (e.g. delete task)
     name: Mapped[str] = Column(String, nullable=True)
@@ -144,14 +155,20 @@ class Terminal(Model):
     config_version: Mapped[int] = Column(Integer, nullable=True)
     address_lines: Mapped[list[str]] = Column(JSON, nullable=True)
     offline_limit_hours: Mapped[int] = Column(Integer, nullable=True)
-    offline_limit_amount: Mapped[float] = Column(Float, nullable=True)
-    device_id: Mapped[str] = Column(String, nullable=True)
+    offline_limit_amount: Mapped[Decimal] = Column(Money, nullable=True)
+    device_id: Mapped[str] = Column(String, nullable=True, unique=True, index=True)
     activation_code: Mapped[str] = Column(String, nullable=True)
     site_id: Mapped[str] = Column(String, nullable=False)
     site_name: Mapped[str] = Column(String, nullable=True)
     is_blocked: Mapped[bool] = Column(Boolean, nullable=True)
     blocking_reason: Mapped[str | None] = Column(String, nullable=True)
     transaction_count: Mapped[int] = Column(Integer, nullable=True, default=0)
+    # Worker replaying the terminal's offline transactions, and until when it holds the terminal
+    replay_leased_by: Mapped[str | None] = Column(String, nullable=True)
+    replay_lease_expires_at: Mapped[datetime | None] = Column(DateTime, nullable=True)
+    # Running totals of the offline transactions not yet delivered to MRA, see offline_backlog
+    offline_pending_amount: Mapped[Decimal] = Column(Money, nullable=False, default=0, server_default="0")
+    offline_oldest_pending_at: Mapped[datetime | None] = Column(DateTime, nullable=True)
 
     tenant: Mapped["Tenant"] = relationship("Tenant", back_populates="terminals")
     offline_transactions: Mapped[list["OfflineTransaction"]] = relationship(
@@ -178,7 +195,7 @@ class Package(Model):
 
     name = Column(String, nullable=False)
     number_of_months = Column(Integer, nullable=False)
-    price = Column(Float, nullable=False)
+    price = Column(Money, nullable=False)
 
     subscriptions: Mapped[list["Subscription"]] = relationship("Subscription", back_populates="package")
 
@@ -198,13 +215,29 @@ class Payment(Model):
 
 class OfflineTransaction(Model):
     __tablename__ = "offline_transactions"
+    __table_args__ = (
+        Index("ix_offline_transactions_terminal_id_created_at", "terminal_id", "created_at"),
+        Index("ix_offline_transactions_terminal_id_transaction_id", "terminal_id", "transaction_id", unique=True),
+        Index(
+            "ix_offline_transactions_pending",
+            "created_at",
+            "id",
+            postgresql_where=text("submitted_at IS NULL"),
+            sqlite_where=text("submitted_at IS NULL"),
+        ),
+    )
 
     tenant_id: Mapped[UUID] = Column(UUID(as_uuid=True), ForeignKey("tenants.id"), nullable=False)
     terminal_id: Mapped[UUID] = Column(UUID(as_uuid=True), ForeignKey("terminals.id"), nullable=False)
     transaction_id: Mapped[str] = Column(String, nullable=False)
     details: Mapped[dict] = Column(JSON, nullable=False)
+    amount: Mapped[Decimal | None] = Column(Money, nullable=True)
     submitted_at: Mapped[DateTime | None] = Column(DateTime, nullable=True)
-    status: Mapped[str] = Column(String, nullable=True)
+    status: Mapped[str] = Column(String, nullable=True, default=DeliveryStatus.PENDING.value)
+    # Failed deliveries so far, when the next one is due and why the last one failed
+    attempt_count: Mapped[int] = Column(Integer, nullable=False, default=0, server_default="0")
+    next_attempt_at: Mapped[datetime | None] = Column(DateTime, nullable=True)
+    last_error: Mapped[str | None] = Column(Text, nullable=True)
 
     tenant: Mapped["Tenant"] = relationship("Tenant", back_populates="offline_transactions")
     terminal: Mapped["Terminal"] = relationship("Terminal", back_populates="offline_transactions")
@@ -213,20 +246,23 @@ class OfflineTransaction(Model):
 class TaxRate(Model):
     __tablename__ = "tax_rates"
 
-    rate_id: Mapped[str] = Column(String, nullable=False)
+    rate_id: Mapped[str] = Column(String, nullable=False, unique=True, index=True)
     name: Mapped[str] = Column(String)
-    rate: Mapped[float] = Column(Float, nullable=False)
+    rate: Mapped[Decimal] = Column(Percentage, nullable=False)
     ordinal: Mapped[int] = Column(Integer)
     charge_mode: Mapped[str] = Column(String)
 
 
 class Product(Model):
     __tablename__ = "products"
+    __table_args__ = (
+        Index("ix_products_site_id_code", "site_id", "code"),
+    )
 
     tenant_id: Mapped[UUID] = Column(UUID(as_uuid=True), ForeignKey("tenants.id"), nullable=False)
     description: Mapped[str] = Column(String)
     name: Mapped[str] = Column(String)
-    unit_price: Mapped[float] = Column(Float, nullable=False)
+    unit_price: Mapped[Decimal] = Column(Money, nullable=False)
     quantity: Mapped[int] = Column(Integer, nullable=False)
     unit_of_measure: Mapped[str] = Column(String, nullable=False)
     site_id: Mapped[str] = Column(String, nullable=True)
@@ -254,6 +290,29 @@ class GlobalConfig(Model):
     version: Mapped[int] = Column(Integer, nullable=False)
 
 
+class SaleSubmission(Model):
+    """The outcome of a sale, kept so a retried submission gets the same response back."""
+
+    __tablename__ = "sale_submissions"
+    __table_args__ = (
+        Index("ix_sale_submissions_terminal_id_invoice_number", "terminal_id", "invoice_number", unique=True),
+    )
+
+    terminal_id: Mapped[UUID] = Column(UUID(as_uuid=True), ForeignKey("terminals.id"), nullable=False)
+    invoice_number: Mapped[str] = Column(String, nullable=False)
+    fingerprint: Mapped[str] = Column(String(64), nullable=False)
+    status: Mapped[str] = Column(String, nullable=False)
+    response: Mapped[dict | None] = Column(JSON, nullable=True)
+    claimed_at: Mapped[datetime] = Column(DateTime, nullable=False)
+
+
+class CacheVersion(Model):
+    __tablename__ = "cache_versions"
+
+    name: Mapped[str] = Column(String, unique=True, index=True, nullable=False)
+    version: Mapped[int] = Column(Integer, nullable=False, default=0)
+
+
 class ApiLog(Model):
     __tablename__ = "api_logs"
 
@@ -1,8 +1,8 @@
 import logging
 from typing import Any
 
-import httpx
-
+from core.services.mra_client import get_client
+from core.services.terminal_context import invalidate_terminal
 from core.utils.api_logger import write_api_log, write_api_exception_log
 from core.utils.helpers import get_sequence_number, sign_hmac_sha512, create_fake_mac_address
 
@@ -121,6 +121,7 @@ def sync_terminal_config(
         setattr(db_terminal, key, value)
 
     db.commit()
+    invalidate_terminal(db_terminal.device_id)
     return db_terminal
 
 
@@ -136,23 +137,22 @@ async def confirm_terminal_activation(terminal, db: Session) -> dict[str, Any]:
         "terminalId": terminal.terminal_id
     }
 
+    url = f"{settings.MRA_EIS_URL}/onboarding/terminal-activated-confirmation"
     try:
-        async with httpx.AsyncClient(verify=False) as client:
-            url = f"{settings.MRA_EIS_URL}/onboarding/terminal-activated-confirmation"
-            response = await client.post(
-                url,
-                headers=headers,
-                json=payload
-            )
-            await write_api_log(db, payload, response, url, headers)
-            data = response.json()
-
-            if int(data.get("statusCode")) < 1:
-                raise HTTPException(status_code=400, detail=data.get("remark"))
-
-            return data
+        response = await get_client().post(
+            url,
+            headers=headers,
+            json=payload
+        )
+        write_api_log(payload, response, url, headers)
+        data = response.json()
+
+        if int(data.get("statusCode")) < 1:
+            raise HTTPException(status_code=400, detail=data.get("remark"))
+
+        return data
     except Exception as e:
-        await write_api_exception_log(db, e, payload, url, headers)
+        write_api_exception_log(e, payload, url, headers)
         raise HTTPException(status_code=400, detail=f"error: {str(e)}")
 
 
@@ -172,21 +172,19 @@ async def activate_terminal_with_code(db: Session, code: str) -> dict[str, Any]:
             }
         }
     }
+    url = f"{settings.MRA_EIS_URL}/onboarding/activate-terminal"
     try:
-        async with httpx.AsyncClient(verify=False) as client:
-            url = f"{settings.MRA_EIS_URL}/onboarding/activate-terminal"
-            response = await client.post(
-                url,
-                timeout=settings.MRA_EIS_TIMEOUT,
-                json=payload
-            )
-            await write_api_log(db, payload, response, url)
-
-            if int(response.json()["statusCode"]) < -1:
-                raise HTTPException(status_code=400, detail=response.json()["remark"])
-            return response.json()
+        response = await get_client().post(
+            url,
+            json=payload
+        )
+        write_api_log(payload, response, url)
+
+        if int(response.json()["statusCode"]) < -1:
+            raise HTTPException(status_code=400, detail=response.json()["remark"])
+        return response.json()
     except Exception as e:
-        await write_api_exception_log(db, e, payload, url)
+        write_api_exception_log(e, payload, url)
         raise HTTPException(status_code=400, detail=f"error: {str(e)}")
 
 
@@ -203,12 +201,12 @@ def sync_global_config(db: Session, config: dict[str, Any]) -> list[type[TaxRate
     db_global_config.version = config["versionNo"]
 
     for tax in config["taxrates"]:
-        db_rate = db.query(TaxRate).filter(TaxRate.name == tax["name"]).first()
+        db_rate = db.query(TaxRate).filter(TaxRate.rate_id == tax["id"]).first()
         if db_rate:
+            db_rate.name = tax["name"]
             db_rate.rate = tax["rate"]
             db_rate.charge_mode = tax["chargeMode"]
             db_rate.ordinal = tax["ordinal"]
-            db_rate.rate_id = tax["id"]
             continue
         tax_rate = TaxRate(
             rate_id=tax["id"],
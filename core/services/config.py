@@ -1,36 +1,36 @@
 import logging
 from typing import Any
 
-import httpx
 from fastapi import HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
 from core.models import Tenant
+from core.services.mra_client import hedged_post
+from core.services.terminal_context import invalidate_tenant_terminals
 from core.settings import settings
 from core.utils.api_logger import write_api_log, write_api_exception_log
 
 logger = logging.getLogger(__name__)
 
 
-async def get_configuration(terminal, db: Session):
+async def get_configuration(terminal, db: AsyncSession):
     headers = {
         "accept": "application/json",
         "Authorization": f"Bearer {terminal.token}",
     }
+    url = f"{settings.MRA_EIS_URL}/configuration/get-latest-configs"
     try:
-        async with httpx.AsyncClient(verify=False) as client:
-            url = f"{settings.MRA_EIS_URL}/configuration/get-latest-configs"
-            response = await client.post(
-                url,
-                timeout=settings.MRA_EIS_TIMEOUT,
-                headers=headers
-            )
-            await write_api_log(db, dict(), response, url, headers)
-            response.raise_for_status()
+        response = await hedged_post(
+            url,
+            headers=headers
+        )
+        write_api_log(dict(), response, url, headers)
+        response.raise_for_status()
         return response.json()
     except Exception as e:
         logger.error(f"Error getting configuration: {str(e)}")
-        await write_api_exception_log(db, e, dict(), url, headers)
+        write_api_exception_log(e, dict(), url, headers)
         raise HTTPException(status_code=400, detail=str(e))
 
 
@@ -53,4 +53,5 @@ def save_tax_payer_config(db: Session, tenant: Tenant, config: dict[str, Any], t
         setattr(tenant, key, value)
 
     db.commit()
+    invalidate_tenant_terminals(tenant.id)
     return tenant
@@ -0,0 +1,174 @@
+import asyncio
+import hashlib
+import time
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable
+from uuid import UUID
+
+from fastapi import HTTPException
+from sqlalchemy import select, delete, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette import status
+
+from core.enums import SubmissionStatus
+from core.models import SaleSubmission
+from core.settings import settings
+
+SubmissionKey = tuple[UUID, str]
+
+
+def request_fingerprint(payload: str) -> str:
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _consume_exception(future: asyncio.Future) -> None:
+    # Nobody may be waiting on the future, keep asyncio from logging the exception as lost
+    if not future.cancelled():
+        future.exception()
+
+
+class SaleSubmissions:
+    """Runs each sale once per terminal and invoice number.
+
+    The first request for an invoice claims it with a pending row and runs the sale.
+    The response is stored on that row, so a retry gets the same response back without
+    pricing the invoice or calling MRA again. Duplicates that arrive while the sale is
+    running wait for it, on the same worker through a shared future and across workers
+    by polling the row. A sale that fails releases its claim so the POS can retry it.
+    """
+
+    def __init__(
+            self,
+            wait_timeout: float = settings.SALE_SUBMISSION_WAIT_TIMEOUT,
+            poll_interval: float = settings.SALE_SUBMISSION_POLL_INTERVAL,
+            stale_after: float = settings.SALE_SUBMISSION_STALE_AFTER,
+    ):
+        self.wait_timeout = wait_timeout
+        self.poll_interval = poll_interval
+        self.stale_after = timedelta(seconds=stale_after)
+        self._in_flight: dict[SubmissionKey, tuple[str, asyncio.Future]] = {}
+
+    async def run(
+            self,
+            db: AsyncSession,
+            terminal_id: UUID,
+            invoice_number: str,
+            fingerprint: str,
+            submit: Callable[[], Awaitable[dict[str, Any]]],
+    ) -> dict[str, Any]:
+        """Return the response of the sale, submitting it only if it has not been submitted yet.
+
+        Args:
+            db: Database session
+            terminal_id: Terminal the sale is made on
+            invoice_number: Invoice number the POS gave the sale
+            fingerprint: Hash of the request, a retry must send the same sale
+            submit: Prices and submits the sale, returning the response to store
+
+        Raises:
+            HTTPException: 409 if the invoice number was used for a different sale, or the
+                original submission did not finish in time
+        """
+        key = (terminal_id, invoice_number)
+        if key in self._in_flight:
+            in_flight_fingerprint, future = self._in_flight[key]
+            self._check_fingerprint(in_flight_fingerprint, fingerprint)
+            return await asyncio.shield(future)
+
+        future = asyncio.get_running_loop().create_future()
+        future.add_done_callback(_consume_exception)
+        self._in_flight[key] = (fingerprint, future)
+        try:
+            response = await self._submit_once(db, key, fingerprint, submit)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(response)
+            return response
+        finally:
+            del self._in_flight[key]
+
+    async def _submit_once(self, db: AsyncSession, key: SubmissionKey, fingerprint: str,
+                           submit: Callable[[], Awaitable[dict[str, Any]]]) -> dict[str, Any]:
+        terminal_id, invoice_number = key
+        deadline = time.monotonic() + self.wait_timeout
+        while True:
+            row = (await db.execute(
+                select(SaleSubmission.status, SaleSubmission.fingerprint, SaleSubmission.response,
+                       SaleSubmission.claimed_at)
+                .where(SaleSubmission.terminal_id == terminal_id, SaleSubmission.invoice_number == invoice_number)
+            )).first()
+
+            if row is None:
+                if await self._claim(db, key, fingerprint):
+                    break
+                continue
+
+            self._check_fingerprint(row.fingerprint, fingerprint)
+            if row.status == SubmissionStatus.COMPLETED:
+                return row.response
+
+            if row.claimed_at < datetime.now() - self.stale_after:
+                await self._release(db, key, claimed_at=row.claimed_at)
+                continue
+
+            if time.monotonic() > deadline:
+                raise HTTPException(status_code=status.HTTP_409_CONFLICT,
+                                    detail="Sale is still being processed, retry later")
+            await asyncio.sleep(self.poll_interval)
+
+        try:
+            response = await submit()
+        except BaseException:
+            await db.rollback()
+            await self._release(db, key)
+            raise
+
+        await db.execute(update(SaleSubmission)
+                         .where(SaleSubmission.terminal_id == terminal_id,
+                                SaleSubmission.invoice_number == invoice_number)
+                         .values(status=SubmissionStatus.COMPLETED.value, response=response))
+        await db.commit()
+        return response
+
+    @staticmethod
+    async def _claim(db: AsyncSession, key: SubmissionKey, fingerprint: str) -> bool:
+        terminal_id, invoice_number = key
+        db.add(SaleSubmission(
+            terminal_id=terminal_id,
+            invoice_number=invoice_number,
+            fingerprint=fingerprint,
+            status=SubmissionStatus.PENDING.value,
+            claimed_at=datetime.now(),
+        ))
+        try:
+            await db.commit()
+            return True
+        except IntegrityError:
+            await db.rollback()
+            return False
+
+    @staticmethod
+    async def _release(db: AsyncSession, key: SubmissionKey, claimed_at: datetime | None = None) -> None:
+        terminal_id, invoice_number = key
+        statement = delete(SaleSubmission).where(SaleSubmission.terminal_id == terminal_id,
+                                                 SaleSubmission.invoice_number == invoice_number,
+                                                 SaleSubmission.status == SubmissionStatus.PENDING.value)
+        if claimed_at is not None:
+            statement = statement.where(SaleSubmission.claimed_at == claimed_at)
+        await db.execute(statement)
+        await db.commit()
+
+    @staticmethod
+    def _check_fingerprint(stored: str, fingerprint: str) -> None:
+        if stored != fingerprint:
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT,
+                                detail="Invoice number was already used for a different sale")
+
+
+sale_submissions = SaleSubmissions()
@@ -0,0 +1,76 @@
+from dataclasses import dataclass
+from datetime import datetime
+
+from fastapi import HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette import status
+
+from core.services.counters import allocate_transaction_numbers, transaction_counter
+from core.services.terminal_context import TerminalSnapshot
+from core.utils.helpers import b10_2_b64, generate_invoice_number, to_julian_date
+
+
+@dataclass(frozen=True)
+class InvoiceNumberBlock:
+    """A run of transaction counts reserved for one terminal.
+
+    An invoice number is ``taxpayer id-position-Julian date-count``, each part base64
+    encoded. Counts are what make numbers unique, so a terminal holding a block can mint
+    numbers for any day on its own as long as it uses each count once.
+    """
+
+    taxpayer_id: int
+    position: int
+    julian_date: int
+    counts: range
+
+    @property
+    def prefix(self) -> str:
+        return f"{b10_2_b64(self.taxpayer_id)}-{b10_2_b64(self.position)}-{b10_2_b64(self.julian_date)}"
+
+    @property
+    def invoice_numbers(self) -> list[str]:
+        return [f"{self.prefix}-{b10_2_b64(count)}" for count in self.counts]
+
+
+def invoice_numbering(terminal: TerminalSnapshot) -> tuple[int, int]:
+    """The taxpayer id and terminal position that every invoice number of a terminal starts with."""
+    if terminal.tenant.taxpayer_id is None or terminal.position is None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail="Terminal is not configured for invoice numbering")
+    return terminal.tenant.taxpayer_id, terminal.position
+
+
+async def reserve_invoice_numbers(
+        db: AsyncSession,
+        terminal: TerminalSnapshot,
+        count: int,
+        transaction_date: datetime | None = None
+) -> InvoiceNumberBlock:
+    """Reserve ``count`` consecutive transaction counts for a terminal to mint invoice numbers from.
+
+    Args:
+        db: Database session, committed once the counts are reserved
+        terminal: Terminal the numbers are for
+        count: How many counts to reserve
+        transaction_date: Date encoded in the returned numbers, today by default
+
+    Returns:
+        The reserved block
+    """
+    taxpayer_id, position = invoice_numbering(terminal)
+    counts = await allocate_transaction_numbers(db, terminal.id, count)
+    await db.commit()
+    return InvoiceNumberBlock(
+        taxpayer_id=taxpayer_id,
+        position=position,
+        julian_date=to_julian_date(transaction_date or datetime.now()),
+        counts=counts,
+    )
+
+
+async def next_invoice_number(terminal: TerminalSnapshot, transaction_date: datetime | None = None) -> str:
+    """Mint a single invoice number, from the terminal's block held by this worker."""
+    taxpayer_id, position = invoice_numbering(terminal)
+    count = await transaction_counter.next(terminal.id)
+    return generate_invoice_number(taxpayer_id, position, transaction_date or datetime.now(), count)
@@ -0,0 +1,135 @@
+import asyncio
+import logging
+import time
+
+import httpx
+
+from core.settings import settings
+from core.utils.circuit_breaker import CircuitBreaker
+
+logger = logging.getLogger(__name__)
+
+mra_breaker = CircuitBreaker(
+    window=settings.MRA_BREAKER_WINDOW,
+    min_calls=settings.MRA_BREAKER_MIN_CALLS,
+    error_rate=settings.MRA_BREAKER_ERROR_RATE,
+    slow_call_seconds=settings.MRA_BREAKER_SLOW_CALL_SECONDS,
+    open_seconds=settings.MRA_BREAKER_OPEN_SECONDS,
+    probes=settings.MRA_BREAKER_PROBES,
+)
+
+
+class CircuitOpenError(httpx.TransportError):
+    """MRA is failing or too slow, so the request was not sent."""
+
+
+class BreakerTransport(httpx.AsyncBaseTransport):
+    """Sends requests through a circuit breaker, counting transport errors and 5xx responses as failures."""
+
+    def __init__(self, transport: httpx.AsyncBaseTransport, breaker: CircuitBreaker):
+        self.transport = transport
+        self.breaker = breaker
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if not self.breaker.allow():
+            raise CircuitOpenError("MRA EIS circuit is open", request=request)
+
+        started = time.perf_counter()
+        try:
+            response = await self.transport.handle_async_request(request)
+        except asyncio.CancelledError:
+            self.breaker.release()
+            raise
+        except Exception:
+            self.breaker.record(success=False, latency=time.perf_counter() - started)
+            raise
+        self.breaker.record(success=response.status_code < 500, latency=time.perf_counter() - started)
+        return response
+
+    async def aclose(self) -> None:
+        await self.transport.aclose()
+
+_client: httpx.AsyncClient | None = None
+_client_loop: asyncio.AbstractEventLoop | None = None
+
+
+def create_client() -> httpx.AsyncClient:
+    """Build a connection-pooled client for the MRA EIS API.
+
+    Returns:
+        A client whose pool size, keep-alive and HTTP/2 support come from the settings,
+        sending every request through the shared MRA circuit breaker
+    """
+    limits = httpx.Limits(
+        max_connections=settings.MRA_EIS_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.MRA_EIS_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=settings.MRA_EIS_KEEPALIVE_EXPIRY,
+    )
+    http2 = settings.MRA_EIS_HTTP2
+    if http2:
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            logger.warning("HTTP/2 requested for MRA EIS but the h2 package is not installed, using HTTP/1.1")
+            http2 = False
+
+    transport = httpx.AsyncHTTPTransport(limits=limits, http2=http2, verify=settings.MRA_EIS_VERIFY_SSL)
+    return httpx.AsyncClient(
+        timeout=settings.MRA_EIS_TIMEOUT,
+        transport=BreakerTransport(transport, mra_breaker),
+    )
+
+
+def get_client() -> httpx.AsyncClient:
+    """Return the shared MRA EIS client, creating it on first use.
+
+    The client is bound to the event loop it was created on, so a new one is
+    created when called from a different loop (e.g. a one-off job run).
+    """
+    global _client, _client_loop
+    loop = asyncio.get_running_loop()
+    if _client is None or _client.is_closed or _client_loop is not loop:
+        _client = create_client()
+        _client_loop = loop
+    return _client
+
+
+async def hedged_post(url: str, **kwargs) -> httpx.Response:
+    """POST an idempotent read to MRA, racing a second copy when the first is slow.
+
+    With ``MRA_HEDGE_READS`` on, a second request is sent once the first has taken longer
+    than MRA's recent p95 latency, and the first successful response wins. The loser is
+    cancelled. Hedging only applies to reads, a sale must never be sent twice.
+    """
+    client = get_client()
+    if not settings.MRA_HEDGE_READS:
+        return await client.post(url, **kwargs)
+
+    delay = max(mra_breaker.latency_percentile(95), settings.MRA_HEDGE_MIN_DELAY)
+    requests = [asyncio.create_task(client.post(url, **kwargs))]
+    try:
+        done, _ = await asyncio.wait(requests, timeout=delay)
+        if not done:
+            requests.append(asyncio.create_task(client.post(url, **kwargs)))
+
+        error = None
+        pending = set(requests)
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for request in done:
+                if request.exception() is None:
+                    return request.result()
+                error = error or request.exception()
+        raise error
+    finally:
+        for request in requests:
+            request.cancel()
+
+
+async def close_client() -> None:
+    """Close the shared client and release its pooled connections."""
+    global _client, _client_loop
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+    _client = None
+    _client_loop = None
@@ -0,0 +1,114 @@
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from decimal import Decimal
+from uuid import UUID
+
+from fastapi import HTTPException
+from sqlalchemy import update, func, select, and_, or_, case
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette import status
+
+from core.enums import DeliveryStatus
+from core.models import Terminal, OfflineTransaction
+from core.services.terminal_context import TerminalSnapshot
+
+
+def pending_delivery():
+    """Offline transactions still to be delivered, dead letters excluded."""
+    return and_(OfflineTransaction.submitted_at.is_(None),
+                OfflineTransaction.status == DeliveryStatus.PENDING.value)
+
+
+async def add_to_offline_backlog(
+        db: AsyncSession,
+        terminal: TerminalSnapshot,
+        amount: Decimal,
+        oldest_at: datetime,
+        enforce_limits: bool = True
+) -> None:
+    """Count invoices waiting for MRA against the terminal's offline limits.
+
+    Each terminal keeps a running total of the amount of its undelivered offline invoices
+    and when the oldest of them was made, so checking MRA's offline limits is a single
+    ``UPDATE ... RETURNING`` on the terminal row rather than a sum over its backlog. The
+    totals are only updated once the caller commits, together with the invoices.
+
+    Args:
+        db: Database session
+        terminal: Terminal the invoices were made on
+        amount: Total amount of the invoices
+        oldest_at: When the oldest of the invoices was made
+        enforce_limits: Refuse invoices that would take the terminal past its limits. Off for
+            invoices the terminal already made offline on its own
+
+    Raises:
+        HTTPException: When the terminal has been offline for longer than ``offline_limit_hours``,
+            or the backlog would exceed ``offline_limit_amount``
+    """
+    new_amount = func.coalesce(Terminal.offline_pending_amount, 0) + amount
+    query = _grow_backlog(terminal.id, amount, oldest_at).returning(Terminal.id)
+    if enforce_limits and terminal.offline_limit_hours is not None:
+        cutoff = datetime.now() - timedelta(hours=terminal.offline_limit_hours)
+        query = query.where(or_(Terminal.offline_oldest_pending_at.is_(None),
+                                Terminal.offline_oldest_pending_at >= cutoff))
+    if enforce_limits and terminal.offline_limit_amount is not None:
+        query = query.where(new_amount <= terminal.offline_limit_amount)
+
+    if await db.scalar(query) is None:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST,
+                            detail="Terminal has reached its offline limit, sales cannot be saved offline")
+
+
+async def restore_offline_backlog(db: AsyncSession, terminal_id: UUID, amount: Decimal, oldest_at: datetime) -> None:
+    """Put invoices that are pending delivery again, such as requeued dead letters, back on the totals."""
+    await db.execute(_grow_backlog(terminal_id, amount, oldest_at))
+
+
+def _grow_backlog(terminal_id: UUID, amount: Decimal, oldest_at: datetime):
+    return (update(Terminal)
+            .where(Terminal.id == terminal_id)
+            .values(offline_pending_amount=func.coalesce(Terminal.offline_pending_amount, 0) + amount,
+                    offline_oldest_pending_at=case(
+                        (or_(Terminal.offline_oldest_pending_at.is_(None),
+                             Terminal.offline_oldest_pending_at > oldest_at), oldest_at),
+                        else_=Terminal.offline_oldest_pending_at))
+            .execution_options(synchronize_session=False))
+
+
+@dataclass
+class SettledInvoices:
+    """Invoices of one terminal taken off its backlog: their total and the oldest of them."""
+
+    amount: Decimal = Decimal(0)
+    oldest_at: datetime | None = None
+
+    def add(self, amount: Decimal | None, created_at: datetime) -> None:
+        self.amount += amount or 0
+        self.oldest_at = created_at if self.oldest_at is None else min(self.oldest_at, created_at)
+
+
+async def remove_from_offline_backlog(db: AsyncSession, settled: dict[UUID, SettledInvoices]) -> None:
+    """Take invoices that were delivered or dead-lettered off their terminals' running totals.
+
+    Called in the transaction that marks the invoices as submitted or dead-lettered, so the
+    oldest pending invoice found for each terminal already excludes them. A terminal's
+    invoices are settled in order, so its pending ones are all newer than those settled and
+    the lookup walks ``ix_offline_transactions_terminal_id_created_at`` from there rather
+    than from the terminal's first invoice.
+
+    Args:
+        db: Database session
+        settled: The settled invoices by terminal id
+    """
+    for terminal_id, invoices in settled.items():
+        oldest_pending = (select(func.min(OfflineTransaction.created_at))
+                          .where(OfflineTransaction.terminal_id == terminal_id,
+                                 OfflineTransaction.created_at >= invoices.oldest_at,
+                                 pending_delivery())
+                          .scalar_subquery())
+        await db.execute(update(Terminal)
+                         .where(Terminal.id == terminal_id)
+                         .values(offline_pending_amount=func.coalesce(Terminal.offline_pending_amount, 0)
+                                 - invoices.amount,
+                                 offline_oldest_pending_at=oldest_pending)
+                         .execution_options(synchronize_session=False))
@@ -0,0 +1,171 @@
+import hmac
+import json
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Any, AsyncIterator
+
+from pydantic import BaseModel, ValidationError
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.models import OfflineTransaction
+from core.services.offline_backlog import add_to_offline_backlog
+from core.services.pricing import to_decimal
+from core.services.sales import offline_transaction_signature
+from core.services.terminal_context import TerminalSnapshot
+from core.settings import settings
+
+
+class LineTooLong(ValueError):
+    pass
+
+
+async def ndjson_lines(chunks: AsyncIterator[bytes], max_line_bytes: int) -> AsyncIterator[bytes]:
+    """Split a byte stream into its non-blank lines without holding more than one line in memory."""
+    pending = b""
+    async for chunk in chunks:
+        pending += chunk
+        *lines, pending = pending.split(b"\n")
+        for line in lines:
+            if line.strip():
+                yield line
+        if len(pending) > max_line_bytes:
+            raise LineTooLong(f"Line is longer than {max_line_bytes} bytes")
+    if pending.strip():
+        yield pending
+
+
+@dataclass
+class UploadReport:
+    accepted: int = 0
+    duplicates: int = 0
+    rejected: int = 0
+    seen: set[str] = field(default_factory=set, repr=False)
+
+    def as_dict(self) -> dict[str, int]:
+        return {"accepted": self.accepted, "duplicates": self.duplicates, "rejected": self.rejected}
+
+
+class OfflineUpload:
+    """Stores the signed invoices a terminal made while it was offline, for the replay job to submit.
+
+    Each line of the upload is one invoice, checked against ``schema`` and the terminal's
+    offline signature as it arrives. Invoices are inserted ``chunk_size`` lines at a time,
+    and each line is acknowledged once its chunk is committed. An invoice number the
+    terminal already uploaded is acknowledged as a duplicate and not stored again.
+    """
+
+    def __init__(self, db: AsyncSession, terminal: TerminalSnapshot, schema: type[BaseModel],
+                 chunk_size: int = settings.OFFLINE_UPLOAD_CHUNK_SIZE,
+                 max_line_bytes: int = settings.OFFLINE_UPLOAD_MAX_LINE_BYTES):
+        self.db = db
+        self.terminal = terminal
+        self.schema = schema
+        self.chunk_size = chunk_size
+        self.max_line_bytes = max_line_bytes
+        self.report = UploadReport()
+        self._created_at = datetime.min
+
+    async def ingest(self, chunks: AsyncIterator[bytes]) -> AsyncIterator[dict[str, Any]]:
+        """Acknowledge every line of the upload, in order, followed by a summary."""
+        chunk: list[tuple[int, dict | ValueError]] = []
+        line_number = 0
+        complete = True
+        try:
+            async for line in ndjson_lines(chunks, self.max_line_bytes):
+                line_number += 1
+                try:
+                    chunk.append((line_number, self._parse(line)))
+                except ValueError as e:
+                    chunk.append((line_number, e))
+
+                if len(chunk) == self.chunk_size:
+                    for ack in await self._flush(chunk):
+                        yield ack
+                    chunk = []
+        except LineTooLong as e:
+            chunk.append((line_number + 1, e))
+            complete = False
+
+        for ack in await self._flush(chunk):
+            yield ack
+        yield {"summary": self.report.as_dict(), "complete": complete}
+
+    def _parse(self, line: bytes) -> dict:
+        try:
+            invoice = json.loads(line)
+        except json.JSONDecodeError:
+            raise ValueError("Line is not valid JSON")
+        if not isinstance(invoice, dict):
+            raise ValueError("Line is not an invoice")
+
+        try:
+            self.schema.model_validate(invoice)
+        except ValidationError as e:
+            error = e.errors()[0]
+            raise ValueError(f"{'.'.join(map(str, error['loc']))}: {error['msg']}")
+        signature = invoice["invoiceSummary"].get("offlineSignature") or ""
+        if not hmac.compare_digest(signature, offline_transaction_signature(invoice, self.terminal)):
+            raise ValueError("Offline signature does not match the invoice")
+        return invoice
+
+    async def _flush(self, chunk: list[tuple[int, dict | ValueError]]) -> list[dict[str, Any]]:
+        rows = {}
+        for _, parsed in chunk:
+            if isinstance(parsed, dict):
+                invoice_number = parsed["invoiceHeader"]["invoiceNumber"]
+                if invoice_number not in self.report.seen:
+                    self.report.seen.add(invoice_number)
+                    rows[invoice_number] = {
+                        "tenant_id": self.terminal.tenant_id,
+                        "terminal_id": self.terminal.id,
+                        "transaction_id": invoice_number,
+                        "details": parsed,
+                        "amount": to_decimal(parsed["invoiceSummary"]["invoiceTotal"]),
+                        "created_at": self._next_created_at(),
+                    }
+        inserted = await self._insert_new(list(rows.values()))
+
+        acks = []
+        for line_number, parsed in chunk:
+            if isinstance(parsed, ValueError):
+                self.report.rejected += 1
+                acks.append({"line": line_number, "status": "rejected", "detail": str(parsed)})
+                continue
+
+            invoice_number = parsed["invoiceHeader"]["invoiceNumber"]
+            if invoice_number in inserted:
+                # Later lines with the same invoice number are duplicates of this one
+                inserted.discard(invoice_number)
+                self.report.accepted += 1
+                acks.append({"line": line_number, "invoice_number": invoice_number, "status": "accepted"})
+            else:
+                self.report.duplicates += 1
+                acks.append({"line": line_number, "invoice_number": invoice_number, "status": "duplicate"})
+        return acks
+
+    async def _insert_new(self, rows: list[dict[str, Any]]) -> set[str]:
+        """Insert the invoices the terminal has not uploaded yet and return their numbers.
+
+        The unique index on ``(terminal_id, transaction_id)`` decides what is new, so an
+        invoice sent by two overlapping uploads is only stored, and replayed, once.
+        """
+        if not rows:
+            return set()
+        dialect = sqlite if self.db.get_bind().dialect.name == "sqlite" else postgresql
+        inserted = list(await self.db.execute(
+            dialect.insert(OfflineTransaction)
+            .values(rows)
+            .on_conflict_do_nothing(index_elements=["terminal_id", "transaction_id"])
+            .returning(OfflineTransaction.transaction_id, OfflineTransaction.amount, OfflineTransaction.created_at)))
+        if inserted:
+            # The sales were already made on the terminal, they are counted but never refused
+            await add_to_offline_backlog(self.db, self.terminal, sum(row.amount for row in inserted),
+                                         min(row.created_at for row in inserted), enforce_limits=False)
+        await self.db.commit()
+        return {row.transaction_id for row in inserted}
+
+    def _next_created_at(self) -> datetime:
+        # The replay job submits a terminal's invoices in created_at order, keep it the upload order
+        self._created_at = max(datetime.now(), self._created_at + timedelta(microseconds=1))
+        return self._created_at
@@ -0,0 +1,87 @@
+import asyncio
+import logging
+from typing import Callable
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.database import AsyncSessionLocal
+from core.services.replay import ReplayReport, run_submission_job, worker_name
+from core.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class OutboxDispatcher:
+    """Background task delivering queued sales from the ``offline_transactions`` outbox to MRA.
+
+    Sales of tenants in outbox mode are stored in the same transaction as the sale itself,
+    and ``notify`` wakes the dispatcher once they are committed. Every sweep leases up to
+    ``lease_terminals`` terminals with pending sales and replays them, so any number of
+    dispatchers can drain the outbox side by side and a terminal's sales still go out in
+    order. Sales that failed stay pending and are retried on a later sweep, run at least
+    every ``poll_interval``.
+    """
+
+    def __init__(self, poll_interval: float = settings.OUTBOX_POLL_INTERVAL,
+                 lease_terminals: int = settings.OFFLINE_REPLAY_LEASE_TERMINALS,
+                 session_factory: Callable[[], AsyncSession] = AsyncSessionLocal):
+        self.poll_interval = poll_interval
+        self.lease_terminals = lease_terminals
+        self.session_factory = session_factory
+        self.name = worker_name()
+        self._wake = asyncio.Event()
+        self._stopping = False
+        self._task: asyncio.Task | None = None
+
+    def start(self) -> None:
+        if self._task and not self._task.done():
+            return
+        self._wake = asyncio.Event()
+        self._stopping = False
+        self._task = asyncio.create_task(self._run(), name="outbox-dispatcher")
+
+    async def stop(self, timeout: float = settings.OUTBOX_SHUTDOWN_TIMEOUT) -> None:
+        """Stop taking new work and let the current sweep finish.
+
+        A sweep still running after ``timeout`` seconds is cancelled. Its leases are released
+        and its undelivered sales stay pending for the next dispatcher.
+        """
+        if self._task is None:
+            return
+        self._stopping = True
+        self._wake.set()
+        try:
+            await asyncio.wait_for(self._task, timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Outbox dispatcher did not finish its sweep in time, abandoning it")
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    def notify(self) -> None:
+        """Wake the dispatcher for sales that were just committed to the outbox."""
+        self._wake.set()
+
+    async def dispatch_once(self) -> ReplayReport:
+        report, leased = await run_submission_job(self.session_factory, self.name, self.lease_terminals)
+        if leased == self.lease_terminals:
+            # More terminals may be waiting, sweep again straight away
+            self._wake.set()
+        return report
+
+    async def _run(self) -> None:
+        while not self._stopping:
+            try:
+                await asyncio.wait_for(self._wake.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            if self._stopping:
+                break
+            try:
+                await self.dispatch_once()
+            except Exception as e:
+                logger.error(f"Error dispatching the outbox: {str(e)}")
+
+
+outbox_dispatcher = OutboxDispatcher()
@@ -0,0 +1,116 @@
+import time
+from uuid import UUID
+
+from sqlalchemy import select, update, insert, Connection
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from core.models import Route, CacheVersion, role_route_association
+from core.settings import settings
+
+PERMISSIONS_CACHE = "permissions"
+
+
+async def get_cache_version(db: AsyncSession, name: str) -> int:
+    version = await db.scalar(select(CacheVersion.version).where(CacheVersion.name == name))
+    return version or 0
+
+
+def bump_cache_version(db: Session, name: str) -> None:
+    """Increment a shared cache version so other workers notice their copy is stale."""
+    updated = (db.query(CacheVersion)
+               .filter(CacheVersion.name == name)
+               .update({CacheVersion.version: CacheVersion.version + 1}))
+    if not updated:
+        db.add(CacheVersion(name=name, version=1))
+    db.commit()
+
+
+def bump_cache_version_in(connection: Connection, name: str) -> None:
+    """Increment a shared cache version within the caller's transaction, as flush events must."""
+    table = CacheVersion.__table__
+    updated = connection.execute(update(table)
+                                 .where(table.c.name == name)
+                                 .values(version=table.c.version + 1)).rowcount
+    if not updated:
+        connection.execute(insert(table).values(name=name, version=1))
+
+
+class SharedVersion:
+    """A worker's view of a shared cache version, read at most once every ``check_interval`` seconds."""
+
+    def __init__(self, name: str, check_interval: float):
+        self.name = name
+        self.check_interval = check_interval
+        self._version: int | None = None
+        self._checked_at = 0.0
+
+    async def current(self, db: AsyncSession) -> int:
+        if self._version is None or time.monotonic() - self._checked_at >= self.check_interval:
+            self._version = await get_cache_version(db, self.name)
+            self._checked_at = time.monotonic()
+        return self._version
+
+    def invalidate(self) -> None:
+        """Read the version again on next use, after this worker changed it."""
+        self._version = None
+
+
+class PermissionMatrix:
+    """In-memory map of ``(method, route path)`` to the ids of the roles allowed on it.
+
+    The matrix is rebuilt from the routes table when the shared ``permissions`` version
+    changes. The version is read at most once every ``check_interval`` seconds, so a
+    change made by another worker is picked up within that interval.
+    """
+
+    def __init__(self, check_interval: float):
+        self.check_interval = check_interval
+        self.version: int | None = None
+        self._routes: dict[tuple[str, str], frozenset[UUID]] | None = None
+        self._checked_at = 0.0
+        self._generation = 0
+
+    async def allows(self, db: AsyncSession, method: str, path: str, role_id: UUID | None) -> bool:
+        roles = (await self._current(db)).get((method, path))
+        return roles is None or role_id in roles
+
+    def invalidate(self) -> None:
+        self._generation += 1
+        self._routes = None
+
+    async def _current(self, db: AsyncSession) -> dict[tuple[str, str], frozenset[UUID]]:
+        routes = self._routes
+        if routes is not None and time.monotonic() - self._checked_at < self.check_interval:
+            return routes
+
+        # Concurrent refreshes are harmless, but one started before an invalidation must not win
+        generation = self._generation
+        version = await get_cache_version(db, PERMISSIONS_CACHE)
+        if routes is None or version != self.version:
+            routes = await self._build(db)
+        if generation == self._generation:
+            self._routes = routes
+            self.version = version
+            self._checked_at = time.monotonic()
+        return routes
+
+    @staticmethod
+    async def _build(db: AsyncSession) -> dict[tuple[str, str], frozenset[UUID]]:
+        rows = await db.execute(select(Route.method, Route.path, role_route_association.c.role_id)
+                                .outerjoin(role_route_association, role_route_association.c.route_id == Route.id))
+        routes: dict[tuple[str, str], set[UUID]] = {}
+        for method, path, role_id in rows:
+            roles = routes.setdefault((method, path), set())
+            if role_id:
+                roles.add(role_id)
+        return {key: frozenset(roles) for key, roles in routes.items()}
+
+
+permission_matrix = PermissionMatrix(check_interval=settings.PERMISSIONS_CHECK_INTERVAL)
+
+
+def permissions_changed(db: Session) -> None:
+    """Record a change to routes or their role assignments."""
+    bump_cache_version(db, PERMISSIONS_CACHE)
+    permission_matrix.invalidate()
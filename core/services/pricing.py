@@ -0,0 +1,98 @@
+from dataclasses import dataclass
+from decimal import Decimal, ROUND_HALF_UP
+from operator import mul, sub
+from typing import Mapping, Sequence
+
+CENT = Decimal("0.01")
+
+Amount = Decimal | float | int
+
+
+def to_decimal(value: Amount) -> Decimal:
+    # Through str, so a price stored as the float 0.1 prices as 0.1 and not as its binary approximation
+    return value if isinstance(value, Decimal) else Decimal(str(value))
+
+
+def round_money(value: Decimal) -> Decimal:
+    """Round to the cent, halves away from zero as MRA does."""
+    return value.quantize(CENT, rounding=ROUND_HALF_UP)
+
+
+@dataclass(frozen=True)
+class LineItems:
+    """The line items of an invoice as columns, entry ``i`` of each column belonging to line ``i``."""
+
+    rate_ids: Sequence[str]
+    unit_prices: Sequence[Amount]
+    quantities: Sequence[int]
+    discounts: Sequence[Amount]
+
+    def __len__(self) -> int:
+        return len(self.rate_ids)
+
+
+@dataclass(frozen=True)
+class RateBreakdown:
+    rate_id: str
+    taxable_amount: Decimal
+    tax_amount: Decimal
+
+
+@dataclass(frozen=True)
+class InvoicePricing:
+    """Columns of per-line amounts plus the invoice totals. Only VAT amounts are rounded."""
+
+    selling_prices: list[Decimal]
+    line_totals: list[Decimal]
+    line_vat: list[Decimal]
+    tax_breakdown: list[RateBreakdown]
+    total_vat: Decimal
+    invoice_total: Decimal
+
+
+def price_invoice(lines: LineItems, rates: Mapping[str, Amount]) -> InvoicePricing:
+    """Compute line totals, VAT and the per-rate tax breakdown of an invoice.
+
+    Prices are VAT inclusive, so the VAT of a line is ``total * rate / (100 + rate)``.
+    Each column is computed in one pass over the lines, and the fraction of each rate is
+    computed once per rate rather than once per line. Line VAT and the breakdown are
+    rounded to the cent from the exact sums, so rounding errors do not accumulate.
+
+    Args:
+        lines: Line items of the invoice
+        rates: Tax rate in percent by rate id
+
+    Returns:
+        The priced invoice
+
+    Raises:
+        KeyError: If a line uses a rate id missing from ``rates``
+    """
+    vat_fractions = {}
+    for rate_id in set(lines.rate_ids):
+        rate = to_decimal(rates[rate_id])
+        vat_fractions[rate_id] = rate / (100 + rate)
+
+    selling_prices = list(map(sub, map(to_decimal, lines.unit_prices), map(to_decimal, lines.discounts)))
+    line_totals = list(map(mul, selling_prices, lines.quantities))
+    line_tax = list(map(mul, line_totals, map(vat_fractions.__getitem__, lines.rate_ids)))
+
+    gross: dict[str, Decimal] = dict.fromkeys(vat_fractions, Decimal(0))
+    tax: dict[str, Decimal] = dict.fromkeys(vat_fractions, Decimal(0))
+    for rate_id, total, tax_amount in zip(lines.rate_ids, line_totals, line_tax):
+        gross[rate_id] += total
+        tax[rate_id] += tax_amount
+
+    # Breakdown in the order the rates first appear on the invoice
+    rate_order = dict.fromkeys(lines.rate_ids)
+    return InvoicePricing(
+        selling_prices=selling_prices,
+        line_totals=line_totals,
+        line_vat=list(map(round_money, line_tax)),
+        tax_breakdown=[RateBreakdown(rate_id=rate_id,
+                                     taxable_amount=round_money(gross[rate_id] - tax[rate_id]),
+                                     tax_amount=round_money(tax[rate_id]))
+                       for rate_id in rate_order],
+        total_vat=round_money(sum(tax.values(), Decimal(0))),
+        invoice_total=sum(line_totals, Decimal(0)),
+    )
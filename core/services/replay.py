@@ -0,0 +1,474 @@
+import asyncio
+import logging
+import os
+import socket
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from decimal import Decimal
+from typing import Any, Callable
+from uuid import UUID, uuid4
+
+import httpx
+from sqlalchemy import and_, or_, select, update, func
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.database import AsyncSessionLocal
+from core.enums import DeliveryStatus
+from core.models import OfflineTransaction, Terminal
+from core.services.offline_backlog import remove_from_offline_backlog, restore_offline_backlog, \
+    pending_delivery, SettledInvoices
+from core.services.mra_client import CircuitOpenError
+from core.services.sales import deliver_offline_transaction
+from core.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class PendingTransaction:
+    id: UUID
+    terminal_id: UUID
+    created_at: datetime
+    details: dict[str, Any]
+    token: str
+    attempt_count: int
+    next_attempt_at: datetime | None
+    amount: Decimal | None
+
+
+@dataclass(frozen=True)
+class FailedAttempt:
+    id: UUID
+    terminal_id: UUID
+    created_at: datetime
+    amount: Decimal | None
+    attempt_count: int
+    error: str
+    dead_letter: bool
+    retry_in: timedelta | None
+
+
+def retry_delay(attempt_count: int) -> timedelta:
+    """Exponential backoff after the ``attempt_count``-th failed attempt, capped at ``OFFLINE_REPLAY_BACKOFF_MAX``."""
+    seconds = settings.OFFLINE_REPLAY_BACKOFF_BASE * 2 ** max(attempt_count - 1, 0)
+    return timedelta(seconds=min(seconds, settings.OFFLINE_REPLAY_BACKOFF_MAX))
+
+
+@dataclass
+class ReplayReport:
+    submitted: int = 0
+    rejected: int = 0
+    failed: int = 0
+    skipped: int = 0
+    dead_lettered: int = 0
+    started_at: float = field(default_factory=time.monotonic)
+    finished_at: float | None = None
+
+    @property
+    def processed(self) -> int:
+        return self.submitted + self.rejected + self.failed + self.skipped
+
+    @property
+    def elapsed(self) -> float:
+        return (self.finished_at or time.monotonic()) - self.started_at
+
+    @property
+    def throughput(self) -> float:
+        return self.submitted / self.elapsed if self.elapsed > 0 else 0.0
+
+    def as_dict(self) -> dict[str, Any]:
+        return {
+            "submitted": self.submitted,
+            "rejected": self.rejected,
+            "failed": self.failed,
+            "skipped": self.skipped,
+            "dead_lettered": self.dead_lettered,
+            "elapsed_seconds": round(self.elapsed, 3),
+            "throughput_per_second": round(self.throughput, 2),
+        }
+
+
+class TerminalRateLimiter:
+    """Spaces out submissions of a single terminal to at most ``rate`` per second."""
+
+    def __init__(self, rate: float):
+        self.interval = 1 / rate if rate > 0 else 0
+        self._next_slot = 0.0
+
+    async def wait(self) -> None:
+        if not self.interval:
+            return
+        now = time.monotonic()
+        delay = self._next_slot - now
+        self._next_slot = max(now, self._next_slot) + self.interval
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+
+class OfflineReplayEngine:
+    """Submits pending offline transactions to MRA concurrently across terminals.
+
+    Pending rows are streamed in pages ordered by creation time and fanned out to one
+    worker per terminal, so a terminal's invoices still go out one at a time and in order
+    while different terminals are submitted in parallel, capped at ``concurrency`` calls.
+
+    An invoice MRA failed on, or refused because the terminal must be blocked or
+    reconfigured, is retried with exponential backoff and its terminal's later invoices wait
+    for it. After ``max_attempts`` such failures it is dead-lettered. An invoice MRA rejects
+    is dead-lettered at once, so it stops holding up its terminal. While MRA cannot be
+    reached at all, invoices are only postponed: an outage does not use up their attempts.
+    """
+
+    def __init__(
+            self,
+            db: AsyncSession,
+            concurrency: int = settings.OFFLINE_REPLAY_CONCURRENCY,
+            page_size: int = settings.OFFLINE_REPLAY_PAGE_SIZE,
+            terminal_rate: float = settings.OFFLINE_REPLAY_TERMINAL_RATE,
+            max_attempts: int = settings.OFFLINE_REPLAY_MAX_ATTEMPTS,
+            progress_interval: float = 10.0,
+    ):
+        self.db = db
+        self.page_size = page_size
+        self.terminal_rate = terminal_rate
+        self.max_attempts = max_attempts
+        self.progress_interval = progress_interval
+        self.report = ReplayReport()
+        self._calls = asyncio.Semaphore(concurrency)
+        self._backlog = asyncio.Semaphore(page_size * 2)
+        self._queues: dict[UUID, asyncio.Queue[PendingTransaction | None]] = {}
+        self._workers: list[asyncio.Task] = []
+        self._halted: set[UUID] = set()
+        self._submitted: list[PendingTransaction] = []
+        self._failed_attempts: list[FailedAttempt] = []
+        self._last_progress = time.monotonic()
+
+    async def run(self, terminal_ids: list[UUID] | None = None) -> ReplayReport:
+        cursor = None
+        while page := await self._fetch_page(cursor, terminal_ids):
+            for txn in page:
+                await self._backlog.acquire()
+                self._queue_for(txn.terminal_id).put_nowait(txn)
+            cursor = (page[-1].created_at, page[-1].id)
+            await self._record_outcomes()
+            self._log_progress()
+
+        for queue in self._queues.values():
+            queue.put_nowait(None)
+        await asyncio.gather(*self._workers)
+        await self._record_outcomes()
+
+        self.report.finished_at = time.monotonic()
+        logger.info(f"Offline replay finished: {self.report.as_dict()}")
+        return self.report
+
+    async def _fetch_page(self, cursor: tuple[datetime, UUID] | None,
+                          terminal_ids: list[UUID] | None) -> list[PendingTransaction]:
+        query = (select(OfflineTransaction.id, OfflineTransaction.terminal_id, OfflineTransaction.created_at,
+                        OfflineTransaction.details, Terminal.token, OfflineTransaction.attempt_count,
+                        OfflineTransaction.next_attempt_at, OfflineTransaction.amount)
+                 .join(Terminal, Terminal.id == OfflineTransaction.terminal_id)
+                 .where(pending_delivery()))
+        if terminal_ids is not None:
+            query = query.where(OfflineTransaction.terminal_id.in_(terminal_ids))
+        if cursor:
+            created_at, last_id = cursor
+            query = query.where(or_(
+                OfflineTransaction.created_at > created_at,
+                and_(OfflineTransaction.created_at == created_at, OfflineTransaction.id > last_id)
+            ))
+        rows = await self.db.execute(query.order_by(OfflineTransaction.created_at, OfflineTransaction.id)
+                                     .limit(self.page_size))
+        return [PendingTransaction(*row) for row in rows]
+
+    def halt(self, terminal_ids: set[UUID]) -> None:
+        """Stop submitting the terminals' remaining invoices, leaving them pending."""
+        self._halted.update(terminal_ids)
+
+    def _queue_for(self, terminal_id: UUID) -> asyncio.Queue:
+        if terminal_id not in self._queues:
+            self._queues[terminal_id] = asyncio.Queue()
+            self._workers.append(asyncio.create_task(self._work(terminal_id)))
+        return self._queues[terminal_id]
+
+    async def _work(self, terminal_id: UUID) -> None:
+        queue = self._queues[terminal_id]
+        limiter = TerminalRateLimiter(self.terminal_rate)
+        while (txn := await queue.get()) is not None:
+            try:
+                if terminal_id in self._halted:
+                    self.report.skipped += 1
+                    continue
+                if txn.next_attempt_at and txn.next_attempt_at > datetime.now():
+                    # Backing off, and the terminal's later invoices must not overtake it
+                    self._halted.add(terminal_id)
+                    self.report.skipped += 1
+                    continue
+                await limiter.wait()
+                async with self._calls:
+                    await self._submit(txn)
+            finally:
+                self._backlog.release()
+
+    async def _submit(self, txn: PendingTransaction) -> None:
+        try:
+            response = await deliver_offline_transaction(txn.details, txn.token)
+            terminal_refused = response.should_block_terminal() or response.should_download_latest_config()
+        except (httpx.TransportError, CircuitOpenError) as e:
+            # MRA never saw the invoice, including while the breaker is open
+            logger.warning(f"Could not reach MRA for offline transaction {txn.id}: {str(e) or type(e).__name__}")
+            self.report.failed += 1
+            self._postpone(txn, str(e) or type(e).__name__)
+            return
+        except httpx.HTTPStatusError as e:
+            # An MRA outage says nothing about the invoice, so it must not use up its attempts
+            logger.warning(f"MRA failed offline transaction {txn.id} with {e.response.status_code}")
+            self.report.failed += 1
+            if e.response.is_server_error:
+                self._postpone(txn, f"MRA returned {e.response.status_code}")
+            else:
+                self._fail(txn, str(e))
+            return
+        except Exception as e:
+            logger.error(f"Error replaying offline transaction {txn.id}: {str(e)}")
+            self.report.failed += 1
+            self._fail(txn, str(e))
+            return
+
+        if terminal_refused:
+            logger.warning(f"MRA refused offline transaction {txn.id} for its terminal: {response.remark()}")
+            self.report.failed += 1
+            self._fail(txn, response.remark() or "Terminal refused by MRA")
+            return
+
+        if not response.success():
+            logger.warning(f"MRA rejected offline transaction {txn.id}: {response.remark()}")
+            self.report.rejected += 1
+            self._fail(txn, response.remark() or "Rejected by MRA", dead_letter=True)
+            return
+
+        self.report.submitted += 1
+        self._submitted.append(txn)
+
+    def _fail(self, txn: PendingTransaction, error: str, dead_letter: bool = False) -> None:
+        attempt_count = txn.attempt_count + 1
+        dead_letter = dead_letter or attempt_count >= self.max_attempts
+        if dead_letter:
+            logger.error(f"Offline transaction {txn.id} dead-lettered after {attempt_count} attempts: {error}")
+            self.report.dead_lettered += 1
+        else:
+            self._halted.add(txn.terminal_id)
+        self._failed_attempts.append(FailedAttempt(txn.id, txn.terminal_id, txn.created_at, txn.amount, attempt_count,
+                                                   error, dead_letter,
+                                                   None if dead_letter else retry_delay(attempt_count)))
+
+    def _postpone(self, txn: PendingTransaction, error: str) -> None:
+        self._halted.add(txn.terminal_id)
+        self._failed_attempts.append(FailedAttempt(txn.id, txn.terminal_id, txn.created_at, txn.amount,
+                                                   txn.attempt_count, error, dead_letter=False,
+                                                   retry_in=retry_delay(1)))
+
+    async def _record_outcomes(self) -> None:
+        if not self._submitted and not self._failed_attempts:
+            return
+        submitted, self._submitted = self._submitted, []
+        failed, self._failed_attempts = self._failed_attempts, []
+        now = datetime.now()
+        # Delivered and dead-lettered invoices both leave their terminal's backlog
+        settled: dict[UUID, SettledInvoices] = defaultdict(SettledInvoices)
+        if submitted:
+            await self.db.execute(update(OfflineTransaction)
+                                  .where(OfflineTransaction.id.in_([txn.id for txn in submitted]))
+                                  .values(submitted_at=now, status=DeliveryStatus.SUBMITTED.value,
+                                          next_attempt_at=None)
+                                  .execution_options(synchronize_session=False))
+            for txn in submitted:
+                settled[txn.terminal_id].add(txn.amount, txn.created_at)
+        for attempt in failed:
+            await self.db.execute(update(OfflineTransaction)
+                                  .where(OfflineTransaction.id == attempt.id)
+                                  .values(attempt_count=attempt.attempt_count,
+                                          last_error=attempt.error,
+                                          status=(DeliveryStatus.DEAD_LETTER if attempt.dead_letter
+                                                  else DeliveryStatus.PENDING).value,
+                                          next_attempt_at=None if attempt.dead_letter else now + attempt.retry_in)
+                                  .execution_options(synchronize_session=False))
+            if attempt.dead_letter:
+                settled[attempt.terminal_id].add(attempt.amount, attempt.created_at)
+        if settled:
+            await remove_from_offline_backlog(self.db, settled)
+        await self.db.commit()
+
+    def _log_progress(self) -> None:
+        if time.monotonic() - self._last_progress < self.progress_interval:
+            return
+        self._last_progress = time.monotonic()
+        logger.info(f"Offline replay progress: {self.report.as_dict()}")
+
+
+async def requeue_dead_letters(db: AsyncSession, terminal_ids: list[UUID] | None = None) -> int:
+    """Give dead-lettered offline transactions a fresh set of attempts, once what stopped them is fixed.
+
+    Args:
+        db: Database session, committed once the transactions are requeued
+        terminal_ids: Only requeue the dead letters of these terminals
+
+    Returns:
+        The number of transactions requeued
+    """
+    query = update(OfflineTransaction).where(OfflineTransaction.status == DeliveryStatus.DEAD_LETTER.value)
+    if terminal_ids is not None:
+        query = query.where(OfflineTransaction.terminal_id.in_(terminal_ids))
+    requeued = (await db.execute(query
+                                 .values(status=DeliveryStatus.PENDING.value, attempt_count=0, next_attempt_at=None)
+                                 .returning(OfflineTransaction.terminal_id, OfflineTransaction.amount,
+                                            OfflineTransaction.created_at)
+                                 .execution_options(synchronize_session=False))).all()
+
+    backlogs: dict[UUID, SettledInvoices] = defaultdict(SettledInvoices)
+    for terminal_id, amount, created_at in requeued:
+        backlogs[terminal_id].add(amount, created_at)
+    for terminal_id, backlog in backlogs.items():
+        await restore_offline_backlog(db, terminal_id, backlog.amount, backlog.oldest_at)
+    await db.commit()
+    return len(requeued)
+
+
+def worker_name() -> str:
+    """A name for this process, unique across the nodes replaying offline transactions."""
+    return f"{socket.gethostname()}:{os.getpid()}:{uuid4().hex[:8]}"
+
+
+class TerminalLeases:
+    """Time-limited claims on terminals' offline transactions, held by one worker at a time.
+
+    A worker only replays terminals it holds a lease on, so replicas drain the queue in
+    parallel without submitting an invoice twice, and each terminal's invoices still go out
+    in order. Candidates are picked with ``FOR UPDATE SKIP LOCKED`` so workers claiming at
+    the same time pass over each other's terminals instead of waiting. A lease that is not
+    renewed expires after ``lease_seconds``, and the terminals of a worker that died are
+    picked up again from then on.
+    """
+
+    def __init__(self, db: AsyncSession, owner: str, lease_seconds: float = settings.OFFLINE_REPLAY_LEASE_SECONDS):
+        self.db = db
+        self.owner = owner
+        self.lease_seconds = lease_seconds
+
+    async def claim(self, limit: int | None = None) -> list[UUID]:
+        """Lease up to ``limit`` terminals with transactions due for delivery, oldest pending first.
+
+        Returns:
+            The ids of the terminals leased
+        """
+        now = datetime.now()
+        oldest_pending = (select(func.min(OfflineTransaction.created_at))
+                          .where(OfflineTransaction.terminal_id == Terminal.id, pending_delivery())
+                          .scalar_subquery())
+        backing_off = (select(OfflineTransaction.id)
+                       .where(OfflineTransaction.terminal_id == Terminal.id, pending_delivery(),
+                              OfflineTransaction.next_attempt_at > now)
+                       .exists())
+        candidates = list(await self.db.scalars(
+            select(Terminal.id)
+            .where(oldest_pending.is_not(None), ~backing_off, self._available(now))
+            .order_by(oldest_pending)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        ))
+        if not candidates:
+            await self.db.commit()
+            return []
+
+        claimed = list(await self.db.scalars(
+            update(Terminal)
+            .where(Terminal.id.in_(candidates), self._available(now))
+            .values(replay_leased_by=self.owner, replay_lease_expires_at=now + timedelta(seconds=self.lease_seconds))
+            .returning(Terminal.id)
+            .execution_options(synchronize_session=False)
+        ))
+        await self.db.commit()
+        return claimed
+
+    async def renew(self, terminal_ids: list[UUID]) -> set[UUID]:
+        """Extend the leases still held on the terminals.
+
+        Returns:
+            The terminals whose lease was lost, and which must not be replayed any further
+        """
+        renewed = set(await self.db.scalars(
+            update(Terminal)
+            .where(Terminal.id.in_(terminal_ids), Terminal.replay_leased_by == self.owner)
+            .values(replay_lease_expires_at=datetime.now() + timedelta(seconds=self.lease_seconds))
+            .returning(Terminal.id)
+            .execution_options(synchronize_session=False)
+        ))
+        await self.db.commit()
+        return set(terminal_ids) - renewed
+
+    async def release(self, terminal_ids: list[UUID]) -> None:
+        await self.db.execute(update(Terminal)
+                              .where(Terminal.id.in_(terminal_ids), Terminal.replay_leased_by == self.owner)
+                              .values(replay_leased_by=None, replay_lease_expires_at=None)
+                              .execution_options(synchronize_session=False))
+        await self.db.commit()
+
+    def _available(self, now: datetime):
+        return or_(Terminal.replay_lease_expires_at.is_(None), Terminal.replay_lease_expires_at < now)
+
+
+async def run_submission_job(
+        session_factory: Callable[[], AsyncSession] = AsyncSessionLocal,
+        owner: str | None = None,
+        limit: int | None = None,
+) -> tuple[ReplayReport, int]:
+    """Lease terminals with pending offline transactions and replay them to MRA.
+
+    The leases are renewed while the replay runs and released when it ends, also when it
+    is cancelled. A terminal whose lease is lost along the way is not replayed further.
+
+    Args:
+        session_factory: Creates the sessions used for the replay and for the leases
+        owner: Name of the worker holding the leases, a fresh one by default
+        limit: Most terminals to lease, all that are available by default
+
+    Returns:
+        The report of the replay and the number of terminals leased
+    """
+    owner = owner or worker_name()
+    async with session_factory() as db:
+        terminal_ids = await TerminalLeases(db, owner).claim(limit)
+        if not terminal_ids:
+            report = ReplayReport()
+            report.finished_at = time.monotonic()
+            return report, 0
+
+        engine = OfflineReplayEngine(db)
+        heartbeat = asyncio.create_task(_renew_leases(session_factory, owner, terminal_ids, engine))
+        try:
+            return await engine.run(terminal_ids), len(terminal_ids)
+        finally:
+            heartbeat.cancel()
+            async with session_factory() as lease_db:
+                await TerminalLeases(lease_db, owner).release(terminal_ids)
+
+
+async def _renew_leases(session_factory: Callable[[], AsyncSession], owner: str, terminal_ids: list[UUID],
+                        engine: OfflineReplayEngine) -> None:
+    interval = settings.OFFLINE_REPLAY_LEASE_SECONDS / 3
+    held_until = time.monotonic() + settings.OFFLINE_REPLAY_LEASE_SECONDS
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            async with session_factory() as db:
+                lost = await TerminalLeases(db, owner).renew(terminal_ids)
+            held_until = time.monotonic() + settings.OFFLINE_REPLAY_LEASE_SECONDS
+        except Exception as e:
+            logger.error(f"Error renewing offline replay leases: {str(e)}")
+            # Another worker may take the terminals over once the leases run out
+            lost = set(terminal_ids) if time.monotonic() + interval >= held_until else set()
+        if lost:
+            logger.warning(f"Lost the offline replay lease on {len(lost)} terminals")
+            engine.halt(lost)
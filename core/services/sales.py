@@ -1,77 +1,120 @@
+import asyncio
+from datetime import datetime
+
 import httpx
 from fastapi import HTTPException
-from sqlalchemy import func
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 
-from core.database import SessionLocal
+from core.enums import DeliveryStatus
 from core.models import OfflineTransaction
+from core.services.mra_client import get_client, CircuitOpenError
+from core.services.offline_backlog import add_to_offline_backlog
+from core.services.pricing import to_decimal
 from core.services.responses.sales_response import SalesResponse
 from core.settings import settings
 from core.utils.api_logger import write_api_log, write_api_exception_log
+from core.utils.deadline import Deadline
 from core.utils.helpers import sign_hmac_sha512
 
 
-async def submit_transaction(transaction, terminal, db) -> SalesResponse:
+async def submit_transaction(transaction, terminal, db: AsyncSession,
+                             deadline: Deadline | None = None) -> SalesResponse:
     headers = {
         "Content-Type": "application/json",
         "Accept": "application/json",
         "Authorization": f"Bearer {terminal.token}"
     }
     url = f"{settings.MRA_EIS_URL}/sales/submit-sales-transaction"
+
+    # Leave enough of the POS's budget to sign the sale offline if MRA does not answer in time
+    timeout = settings.MRA_EIS_TIMEOUT
+    if deadline is not None:
+        timeout = min(timeout, deadline.remaining() - settings.SALE_DEADLINE_RESERVE)
+    if timeout <= 0:
+        write_api_exception_log("Request deadline reached", transaction, url, headers)
+        return await save_offline_transaction(transaction, terminal, db)
+
     try:
-        async with httpx.AsyncClient(timeout=settings.MRA_EIS_TIMEOUT) as client:
-            response = await client.post(
+        # httpx applies its timeout to connecting, writing and reading separately, this bounds them together
+        async with asyncio.timeout(timeout):
+            response = await get_client().post(
                 url,
                 json=transaction,
-                headers=headers
+                headers=headers,
+                timeout=timeout
             )
-            await write_api_log(db, transaction, response, url, headers)
-            # response.raise_for_status()
-            return SalesResponse(response.json())
-    except httpx.TimeoutException:
-        await write_api_exception_log(db, "Request timed out", transaction, url, headers)
-        txn_details = sign_offline_transaction(transaction, terminal)
-        record = OfflineTransaction(
-            terminal_id=terminal.id,
-            transaction_id=transaction['invoiceHeader']['invoiceNumber'],
-            details=txn_details,
-            tenant_id=terminal.tenant_id
-        )
-        terminal.offline_transactions.append(record)
-        db.commit()
-        return SalesResponse({
-            "statusCode": 0,
-            "remark": "Transaction saved offline",
-            "data": {
-                "validationURL": txn_details['invoiceSummary']['offlineSignature'],
-                "shouldDownloadLatestConfig": False,
-                "shouldBlockTerminal": False
-            }
-        })
+        write_api_log(transaction, response, url, headers)
+        # response.raise_for_status()
+        return SalesResponse(response.json())
+    except (httpx.TimeoutException, TimeoutError, CircuitOpenError) as e:
+        # Sign offline when MRA timed out, or straight away while the breaker knows it is down
+        write_api_exception_log(str(e) if isinstance(e, CircuitOpenError) else "Request timed out",
+                                transaction, url, headers)
+        return await save_offline_transaction(transaction, terminal, db)
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Error submitting transaction: {str(e)}")
 
 
-async def submit_offline_transaction(txn: type[OfflineTransaction], db: Session):
-    try:
-        async with httpx.AsyncClient(timeout=settings.MRA_EIS_TIMEOUT) as client:
-            response = await client.post(
-                f"{settings.MRA_EIS_URL}/sales/submit-sales-transaction",
-                json=txn.details,
-                headers={
-                    "Content-Type": "application/json",
-                    "Accept": "application/json",
-                    "Authorization": txn.terminal.token
-                }
-            )
-            response_obj = SalesResponse(response.json())
-            if response_obj.success():
-                txn.submitted_at = func.now()
-                db.commit()
-            return response_obj
-    except Exception as e:
-        # pass
-        raise HTTPException(status_code=400, detail=f"Error submitting transaction: {str(e)}")
+async def save_offline_transaction(transaction, terminal, db: AsyncSession) -> SalesResponse:
+    response = await queue_transaction(transaction, terminal, db, remark="Transaction saved offline",
+                                       enforce_limits=True)
+    await db.commit()
+    return response
+
+
+async def queue_transaction(transaction, terminal, db: AsyncSession,
+                            remark: str = "Transaction queued for submission",
+                            enforce_limits: bool = False) -> SalesResponse:
+    """Sign a sale and add it to the outbox that the replay engine delivers to MRA.
+
+    The row is only added to the session, so it is stored together with whatever else the
+    caller commits. The POS is answered with the offline signature as validation URL.
+    MRA's offline limits only apply to sales signed offline because MRA could not be
+    reached, not to sales an outbox tenant queues while MRA is up.
+
+    Raises:
+        HTTPException: With ``enforce_limits``, when the sale would take the terminal past its
+            offline limits
+    """
+    amount = to_decimal(transaction['invoiceSummary']['invoiceTotal'])
+    created_at = datetime.now()
+    await add_to_offline_backlog(db, terminal, amount, created_at, enforce_limits=enforce_limits)
+
+    txn_details = sign_offline_transaction(transaction, terminal)
+    db.add(OfflineTransaction(
+        terminal_id=terminal.id,
+        transaction_id=transaction['invoiceHeader']['invoiceNumber'],
+        details=txn_details,
+        amount=amount,
+        tenant_id=terminal.tenant_id,
+        status=DeliveryStatus.PENDING.value,
+        created_at=created_at
+    ))
+    return SalesResponse({
+        "statusCode": 0,
+        "remark": remark,
+        "data": {
+            "validationURL": txn_details['invoiceSummary']['offlineSignature'],
+            "shouldDownloadLatestConfig": False,
+            "shouldBlockTerminal": False
+        }
+    })
+
+
+async def deliver_offline_transaction(details: dict, token: str) -> SalesResponse:
+    response = await get_client().post(
+        f"{settings.MRA_EIS_URL}/sales/submit-sales-transaction",
+        json=details,
+        headers={
+            "Content-Type": "application/json",
+            "Accept": "application/json",
+            "Authorization": token
+        }
+    )
+    if response.is_server_error:
+        # MRA failed rather than rejected the invoice, so it is worth retrying
+        response.raise_for_status()
+    return SalesResponse(response.json())
 
 
 def sign_offline_transaction(transaction, terminal) -> dict:
@@ -84,16 +127,3 @@ def offline_transaction_signature(transaction, terminal) -> str:
     line_item_count = len(transaction['invoiceLineItems'])
     transaction_date = transaction['invoiceHeader']['invoiceDateTime']
     return sign_hmac_sha512(f"{invoice_number}{line_item_count}{transaction_date}", terminal.secret_key)
-
-
-async def run_submission_job(db: Session = None):
-    innerscope = db is None
-    if not db:
-        db = SessionLocal()
-
-    transactions = db.query(OfflineTransaction).filter(OfflineTransaction.submitted_at.is_(None)).all()
-
-    for transaction in transactions:
-        await submit_offline_transaction(transaction, db)
-    if innerscope:
-        db.close()
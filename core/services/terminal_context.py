@@ -0,0 +1,109 @@
+from dataclasses import dataclass
+from decimal import Decimal
+from uuid import UUID
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import joinedload
+
+from core.models import Terminal, Tenant
+from core.settings import settings
+from core.utils.cache import TTLCache
+
+
+@dataclass(frozen=True)
+class TenantSnapshot:
+    id: UUID
+    tin: str | None
+    config_version: int | None
+    taxpayer_id: int | None
+    submission_mode: str
+
+    @classmethod
+    def from_model(cls, tenant: Tenant) -> "TenantSnapshot":
+        return cls(
+            id=tenant.id,
+            tin=tenant.tin,
+            config_version=tenant.config_version,
+            taxpayer_id=tenant.taxpayer_id,
+            submission_mode=tenant.submission_mode,
+        )
+
+
+@dataclass(frozen=True)
+class TerminalSnapshot:
+    """Read-only view of a terminal and its tenant, safe to share between requests."""
+
+    id: UUID
+    terminal_id: str | None
+    device_id: str
+    tenant_id: UUID
+    site_id: str
+    position: int | None
+    token: str | None
+    secret_key: str | None
+    config_version: int | None
+    is_blocked: bool | None
+    blocking_reason: str | None
+    offline_limit_hours: int | None
+    offline_limit_amount: Decimal | None
+    tenant: TenantSnapshot
+
+    @classmethod
+    def from_model(cls, terminal: Terminal) -> "TerminalSnapshot":
+        return cls(
+            id=terminal.id,
+            terminal_id=terminal.terminal_id,
+            device_id=terminal.device_id,
+            tenant_id=terminal.tenant_id,
+            site_id=terminal.site_id,
+            position=terminal.position,
+            token=terminal.token,
+            secret_key=terminal.secret_key,
+            config_version=terminal.config_version,
+            is_blocked=terminal.is_blocked,
+            blocking_reason=terminal.blocking_reason,
+            offline_limit_hours=terminal.offline_limit_hours,
+            offline_limit_amount=terminal.offline_limit_amount,
+            tenant=TenantSnapshot.from_model(terminal.tenant),
+        )
+
+
+terminal_cache: TTLCache[str, TerminalSnapshot] = TTLCache(
+    maxsize=settings.TERMINAL_CACHE_SIZE,
+    ttl=settings.TERMINAL_CACHE_TTL,
+)
+
+
+async def resolve_terminal(db: AsyncSession, device_id: str) -> TerminalSnapshot | None:
+    """Look up the terminal registered to a device, serving repeat lookups from the cache.
+
+    Args:
+        db: Database session
+        device_id: The X-Device-Id sent by the POS
+
+    Returns:
+        A snapshot of the terminal and its tenant, or None when the device is not registered
+    """
+    snapshot = terminal_cache.get(device_id)
+    if snapshot:
+        return snapshot
+
+    terminal = await db.scalar(select(Terminal)
+                               .options(joinedload(Terminal.tenant))
+                               .where(Terminal.device_id == device_id))
+    if not terminal:
+        return None
+
+    snapshot = TerminalSnapshot.from_model(terminal)
+    terminal_cache.set(device_id, snapshot)
+    return snapshot
+
+
+def invalidate_terminal(device_id: str | None) -> None:
+    if device_id:
+        terminal_cache.pop(device_id)
+
+
+def invalidate_tenant_terminals(tenant_id: UUID) -> None:
+    terminal_cache.discard_where(lambda snapshot: snapshot.tenant_id == tenant_id)
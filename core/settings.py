@@ -18,6 +18,20 @@ class Settings(BaseSettings):
     PORT: int
     HOST: str
     DATABASE_URL: str
+    ASYNC_DATABASE_URL: str | None = None
+    # Connections Postgres grants this app, shared by every worker's sync and async engine
+    DB_MAX_CONNECTIONS: int = 100
+    # Uvicorn worker processes, the pool of each worker is sized from it
+    WEB_CONCURRENCY: int = 1
+    # Overrides the pool size derived from DB_MAX_CONNECTIONS and WEB_CONCURRENCY
+    DB_POOL_SIZE: int | None = None
+    DB_MAX_OVERFLOW: int = 5
+    DB_POOL_TIMEOUT: float = 30.0
+    DB_POOL_RECYCLE: int = 1800
+    DB_POOL_PRE_PING: bool = True
+    DB_STATEMENT_TIMEOUT_MS: int | None = 30000
+    # Create missing tables when a worker starts, for development databases without migrations
+    DB_CREATE_SCHEMA_ON_STARTUP: bool = False
     TEST_SECRET: str
     TEST_HASH: str
     ALGORITHM: str
@@ -25,10 +39,82 @@ class Settings(BaseSettings):
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24 * 7
     MRA_EIS_URL: str
     MRA_EIS_TIMEOUT: int
+    MRA_EIS_MAX_CONNECTIONS: int = 100
+    MRA_EIS_MAX_KEEPALIVE_CONNECTIONS: int = 20
+    MRA_EIS_KEEPALIVE_EXPIRY: float = 30.0
+    MRA_EIS_HTTP2: bool = False
+    MRA_EIS_VERIFY_SSL: bool = True
+    # Circuit breaker: calls tracked over MRA_BREAKER_WINDOW seconds open it once MRA_BREAKER_MIN_CALLS
+    # were made and the error rate or the p95 latency crosses its threshold
+    MRA_BREAKER_WINDOW: float = 30.0
+    MRA_BREAKER_MIN_CALLS: int = 20
+    MRA_BREAKER_ERROR_RATE: float = 0.5
+    MRA_BREAKER_SLOW_CALL_SECONDS: float = 5.0
+    MRA_BREAKER_OPEN_SECONDS: float = 30.0
+    MRA_BREAKER_PROBES: int = 3
+    # Race a second copy of slow idempotent reads (configs, products, blocking status) after MRA's p95 latency
+    MRA_HEDGE_READS: bool = False
+    MRA_HEDGE_MIN_DELAY: float = 0.5
+
+    OFFLINE_REPLAY_CONCURRENCY: int = 20
+    OFFLINE_REPLAY_PAGE_SIZE: int = 500
+    OFFLINE_REPLAY_TERMINAL_RATE: float = 5.0
+    # How long a worker holds the terminals it replays without renewing, and how many it takes at once
+    OFFLINE_REPLAY_LEASE_SECONDS: float = 60.0
+    OFFLINE_REPLAY_LEASE_TERMINALS: int = 100
+    # Failed deliveries after which an offline transaction is dead-lettered, and the backoff between them
+    OFFLINE_REPLAY_MAX_ATTEMPTS: int = 8
+    OFFLINE_REPLAY_BACKOFF_BASE: float = 30.0
+    OFFLINE_REPLAY_BACKOFF_MAX: float = 3600.0
+
+    # Deliver outbox sales from the API process too, besides the offline submission workers
+    OUTBOX_DISPATCHER_ENABLED: bool = False
+    # Seconds between outbox sweeps when no sale wakes the dispatcher, retrying failed deliveries
+    OUTBOX_POLL_INTERVAL: float = 5.0
+    # How long a stopping dispatcher lets its current sweep finish before abandoning it
+    OUTBOX_SHUTDOWN_TIMEOUT: float = 30.0
+
+    TERMINAL_CACHE_SIZE: int = 10000
+    TERMINAL_CACHE_TTL: float = 30.0
+
+    PRINCIPAL_CACHE_SIZE: int = 10000
+    PRINCIPAL_CACHE_TTL: float = 60.0
+    # How often a worker checks whether another worker changed a user or role
+    PRINCIPAL_CHECK_INTERVAL: float = 5.0
+
+    PERMISSIONS_CHECK_INTERVAL: float = 5.0
+
+    # How long a duplicate sale waits for the original to finish before giving up
+    SALE_SUBMISSION_WAIT_TIMEOUT: float = 30.0
+    SALE_SUBMISSION_POLL_INTERVAL: float = 0.25
+    # A pending sale older than this is assumed abandoned by a crashed worker
+    SALE_SUBMISSION_STALE_AFTER: float = 120.0
+
+    # Seconds of the POS's X-Request-Budget-Ms kept back to sign a sale offline when MRA is slow
+    SALE_DEADLINE_RESERVE: float = 0.25
+
+    # Largest batch POST /sales/batch accepts, and how many of its sales go to MRA at once
+    SALE_BATCH_MAX_SIZE: int = 500
+    SALE_BATCH_CONCURRENCY: int = 8
+
+    # Offline invoices inserted per round trip during an NDJSON upload, and the longest line accepted
+    OFFLINE_UPLOAD_CHUNK_SIZE: int = 500
+    OFFLINE_UPLOAD_MAX_LINE_BYTES: int = 1_048_576
+
+    # Transaction numbers a worker reserves at once when handing them out in blocks. Numbers left
+    # in a block when the worker stops are never used, so above 1 invoice counts can have gaps
+    TRANSACTION_COUNTER_BLOCK_SIZE: int = 1
+    # Most invoice numbers an offline-capable terminal may reserve in one request
+    INVOICE_NUMBER_MAX_RESERVATION: int = 1000
+
     APP_NAME: str
     APP_VERSION: str
     APP_ENVIRONMENT: str
 
+    API_LOG_QUEUE_SIZE: int = 10000
+    API_LOG_BATCH_SIZE: int = 200
+    API_LOG_FLUSH_INTERVAL: float = 1.0
+
     SMTP_HOST: str
     SMTP_PORT: int
     SMTP_USERNAME: str
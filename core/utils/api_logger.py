@@ -1,31 +1,172 @@
 import json
+import logging
+import queue
+import threading
+import time
+from datetime import datetime
+from typing import Any, Callable
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
 
 from core import ApiLog
+from core.database import SessionLocal
+from core.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+class ApiLogSink:
+    """Bounded in-process queue of ``api_logs`` rows written in batches by a background thread.
+
+    Rows are flushed when ``batch_size`` of them are queued or ``flush_interval`` seconds
+    have passed since the first one, whichever comes first. When the queue is full new
+    rows are dropped and counted instead of blocking the caller.
+    """
+
+    def __init__(
+            self,
+            session_factory: Callable[[], Session] = SessionLocal,
+            max_queue_size: int = 10000,
+            batch_size: int = 200,
+            flush_interval: float = 1.0,
+    ):
+        self.session_factory = session_factory
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self._queue: queue.Queue[dict[str, Any]] = queue.Queue(maxsize=max_queue_size)
+        self._stop = threading.Event()
+        self._write_lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+
+    @property
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    def submit(self, row: dict[str, Any]) -> bool:
+        """Queue a row without blocking.
+
+        Returns:
+            False when the queue is full and the row was dropped
+        """
+        try:
+            self._queue.put_nowait(row)
+            return True
+        except queue.Full:
+            self.dropped += 1
+            if self.dropped == 1 or self.dropped % 1000 == 0:
+                logger.warning(f"API log queue is full, {self.dropped} log rows dropped so far")
+            return False
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="api-log-sink", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Stop the flusher thread and write whatever is still queued."""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+            self._thread = None
+        self.flush()
+
+    def flush(self) -> int:
+        """Write every queued row on the calling thread.
+
+        Returns:
+            The number of rows taken off the queue
+        """
+        total = 0
+        while batch := self._drain(self.batch_size):
+            self._write(batch)
+            total += len(batch)
+        return total
+
+    def clear(self) -> int:
+        """Discard every queued row.
+
+        Returns:
+            The number of rows discarded
+        """
+        return len(self._drain(self._queue.maxsize or self.pending))
+
+    def _drain(self, limit: int) -> list[dict[str, Any]]:
+        rows = []
+        while len(rows) < limit:
+            try:
+                rows.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return rows
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                first = self._queue.get(timeout=self.flush_interval)
+            except queue.Empty:
+                continue
+
+            batch = [first]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size and not self._stop.is_set():
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._write(batch)
+
+    def _write(self, rows: list[dict[str, Any]]) -> None:
+        with self._write_lock:
+            db = self.session_factory()
+            try:
+                db.execute(insert(ApiLog), rows)
+                db.commit()
+                self.written += len(rows)
+            except Exception as e:
+                db.rollback()
+                self.failed += len(rows)
+                logger.error(f"Error writing {len(rows)} API log rows: {str(e)}")
+            finally:
+                db.close()
+
+
+api_log_sink = ApiLogSink(
+    max_queue_size=settings.API_LOG_QUEUE_SIZE,
+    batch_size=settings.API_LOG_BATCH_SIZE,
+    flush_interval=settings.API_LOG_FLUSH_INTERVAL,
+)
+
+
+def write_api_log(payload, response, url, headers=None):
+    api_log_sink.submit({
+        "method": "POST",
+        "url": url,
+        "request_headers": json.dumps(headers),
+        "request_body": json.dumps(payload),
+        "response_status": response.status_code,
+        "response_headers": json.dumps(dict(response.headers)),
+        "response_body": response.text,
+        "created_at": datetime.now(),
+    })
 
 
-async def write_api_log(db, payload, response, url, headers=None):
-    log = ApiLog(
-        method="POST",
-        url=url,
-        request_headers=json.dumps(headers),
-        request_body=json.dumps(payload),
-        response_status=response.status_code,
-        response_headers=json.dumps(dict(response.headers)),
-        response_body=response.text
-    )
-    db.add(log)
-    db.commit()
-
-
-async def write_api_exception_log(db, e, payload, url, headers=None):
-    log = ApiLog(
-        method="POST",
-        url=url,
-        request_headers=json.dumps(headers),
-        request_body=json.dumps(payload),
-        response_status=0,
-        response_headers="{}",
-        response_body=str(e),
-    )
-    db.add(log)
-    db.commit()
+def write_api_exception_log(e, payload, url, headers=None):
+    api_log_sink.submit({
+        "method": "POST",
+        "url": url,
+        "request_headers": json.dumps(headers),
+        "request_body": json.dumps(payload),
+        "response_status": 0,
+        "response_headers": "{}",
+        "response_body": str(e),
+        "created_at": datetime.now(),
+    })
@@ -0,0 +1,160 @@
+import threading
+import time
+from collections import deque, Counter
+from enum import Enum
+from typing import Callable
+
+
+class BreakerState(str, Enum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """Stops calling a dependency that is failing or slow, and probes it until it recovers.
+
+    Calls made in the last ``window`` seconds are tracked. Once at least ``min_calls`` were
+    made, the breaker opens when the share of failures reaches ``error_rate`` or the 95th
+    percentile latency reaches ``slow_call_seconds``. While open, calls are refused. After
+    ``open_seconds`` the breaker is half-open and lets ``probes`` calls through: it closes
+    when they all succeed and opens again on the first failure.
+    """
+
+    def __init__(self, window: float, min_calls: int, error_rate: float, slow_call_seconds: float,
+                 open_seconds: float, probes: int, clock: Callable[[], float] = time.monotonic):
+        self.window = window
+        self.min_calls = min_calls
+        self.error_rate = error_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.open_seconds = open_seconds
+        self.probes = probes
+        self.clock = clock
+
+        self.state = BreakerState.CLOSED
+        self.transitions: Counter[BreakerState] = Counter()
+        self.rejected = 0
+        self._calls: deque[tuple[float, bool, float]] = deque()
+        self._opened_at = 0.0
+        self._probes_started = 0
+        self._probes_succeeded = 0
+        self._lock = threading.Lock()
+
+    def allow(self) -> bool:
+        """Whether a call may go ahead. A call that is allowed must be followed by ``record``."""
+        with self._lock:
+            if self.state == BreakerState.OPEN and self.clock() - self._opened_at >= self.open_seconds:
+                self._transition(BreakerState.HALF_OPEN)
+            if self.state == BreakerState.HALF_OPEN and self._probes_started < self.probes:
+                self._probes_started += 1
+                return True
+            if self.state == BreakerState.CLOSED:
+                return True
+            self.rejected += 1
+            return False
+
+    def record(self, success: bool, latency: float) -> None:
+        with self._lock:
+            now = self.clock()
+            if self.state == BreakerState.HALF_OPEN:
+                if not success:
+                    self._transition(BreakerState.OPEN)
+                    return
+                self._probes_succeeded += 1
+                if self._probes_succeeded >= self.probes:
+                    self._transition(BreakerState.CLOSED)
+                return
+            if self.state == BreakerState.OPEN:
+                # A call allowed before the breaker opened, its outcome is already stale
+                return
+
+            self._calls.append((now, success, latency))
+            self._evict(now)
+            if len(self._calls) >= self.min_calls and (
+                    self._failure_rate() >= self.error_rate or self._latency_percentile(95) >= self.slow_call_seconds):
+                self._transition(BreakerState.OPEN)
+
+    def release(self) -> None:
+        """Forget an allowed call that ended without an outcome, such as a cancelled request."""
+        with self._lock:
+            if self.state == BreakerState.HALF_OPEN and self._probes_started > self._probes_succeeded:
+                self._probes_started -= 1
+
+    def reset(self) -> None:
+        with self._lock:
+            self.state = BreakerState.CLOSED
+            self.transitions.clear()
+            self.rejected = 0
+            self._calls.clear()
+            self._probes_started = 0
+            self._probes_succeeded = 0
+
+    def failure_rate(self) -> float:
+        with self._lock:
+            self._evict(self.clock())
+            return self._failure_rate()
+
+    def latency_percentile(self, percentile: float) -> float:
+        with self._lock:
+            self._evict(self.clock())
+            return self._latency_percentile(percentile)
+
+    def _failure_rate(self) -> float:
+        if not self._calls:
+            return 0.0
+        return sum(not success for _, success, _ in self._calls) / len(self._calls)
+
+    def _latency_percentile(self, percentile: float) -> float:
+        if not self._calls:
+            return 0.0
+        latencies = sorted(latency for _, _, latency in self._calls)
+        return latencies[min(int(len(latencies) * percentile / 100), len(latencies) - 1)]
+
+    def _evict(self, now: float) -> None:
+        while self._calls and self._calls[0][0] < now - self.window:
+            self._calls.popleft()
+
+    def _transition(self, state: BreakerState) -> None:
+        self.state = state
+        self.transitions[state] += 1
+        self._probes_started = 0
+        self._probes_succeeded = 0
+        if state == BreakerState.OPEN:
+            self._opened_at = self.clock()
+        if state == BreakerState.CLOSED:
+            self._calls.clear()
+
+
+BREAKER_METRICS = {
+    "circuit_breaker_rejected_total": ("counter", "Calls refused while the breaker was open",
+                                       lambda breaker: breaker.rejected),
+    "circuit_breaker_failure_rate": ("gauge", "Share of failed calls in the window",
+                                     lambda breaker: round(breaker.failure_rate(), 4)),
+    "circuit_breaker_latency_p50_seconds": ("gauge", "Median latency of calls in the window",
+                                            lambda breaker: round(breaker.latency_percentile(50), 6)),
+    "circuit_breaker_latency_p95_seconds": ("gauge", "95th percentile latency of calls in the window",
+                                            lambda breaker: round(breaker.latency_percentile(95), 6)),
+}
+
+
+def render_breaker_metrics(breakers: dict[str, CircuitBreaker]) -> str:
+    """Render the state of the breakers in the Prometheus text format."""
+    lines = []
+    for metric, (kind, description, read) in BREAKER_METRICS.items():
+        lines.append(f"# HELP {metric} {description}")
+        lines.append(f"# TYPE {metric} {kind}")
+        for name, breaker in breakers.items():
+            lines.append(f'{metric}{{breaker="{name}"}} {read(breaker)}')
+
+    for metric, kind, description, read in (
+            ("circuit_breaker_state", "gauge", "1 for the state the breaker is in",
+             lambda breaker, state: int(breaker.state == state)),
+            ("circuit_breaker_transitions_total", "counter", "Times the breaker entered each state",
+             lambda breaker, state: breaker.transitions[state]),
+    ):
+        lines.append(f"# HELP {metric} {description}")
+        lines.append(f"# TYPE {metric} {kind}")
+        for name, breaker in breakers.items():
+            for state in BreakerState:
+                lines.append(f'{metric}{{breaker="{name}",state="{state.value}"}} {read(breaker, state)}')
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,25 @@
+import time
+from dataclasses import dataclass
+from typing import Annotated
+
+from fastapi import Header
+
+
+@dataclass(frozen=True)
+class Deadline:
+    """A point in time by which a request must be answered."""
+
+    expires_at: float
+
+    @classmethod
+    def after(cls, seconds: float) -> "Deadline":
+        return cls(time.monotonic() + seconds)
+
+    def remaining(self) -> float:
+        return max(self.expires_at - time.monotonic(), 0.0)
+
+
+def get_request_deadline(
+        x_request_budget_ms: Annotated[int | None, Header(ge=1, description="Time the POS waits for an answer")] = None
+) -> Deadline | None:
+    return Deadline.after(x_request_budget_ms / 1000) if x_request_budget_ms is not None else None
@@ -1,21 +1,26 @@
 import os
 from email.message import EmailMessage
-
-import aiosmtplib
-import jinja2
+from functools import cache
 
 from core.settings import settings
 
 template_dir = os.path.join(
     os.path.dirname(os.path.abspath(__file__)), "../templates"
 )
-jinja_env = jinja2.Environment(
-    loader=jinja2.FileSystemLoader(template_dir), autoescape=jinja2.select_autoescape()
-)
+
+
+@cache
+def get_jinja_env():
+    """The template environment, built on the first email so jinja2 stays out of worker boot."""
+    import jinja2
+
+    return jinja2.Environment(
+        loader=jinja2.FileSystemLoader(template_dir), autoescape=jinja2.select_autoescape()
+    )
 
 
 def render_template(template_name: str, context: dict) -> str:
-    template = jinja_env.get_template(template_name)
+    template = get_jinja_env().get_template(template_name)
     return template.render(context)
 
 
@@ -52,6 +57,8 @@ async def send_email(
                 filename=attachment["filename"]
             )
 
+    import aiosmtplib
+
     await aiosmtplib.send(
         msg,
         hostname=settings.SMTP_HOST,
@@ -4,12 +4,17 @@ import hmac
 import secrets
 import string
 from datetime import datetime
+from functools import cache
 
-from passlib.context import CryptContext
+import rstr
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
-import rstr
+@cache
+def get_pwd_context():
+    """The bcrypt password context, built on first use to keep passlib out of worker boot."""
+    from passlib.context import CryptContext
+
+    return CryptContext(schemes=["bcrypt"], deprecated="auto")
 
 
 def get_sequence_number(length=16):
@@ -146,8 +151,8 @@ def generate_password(length=12) -> str:
 
 
 def hash_password(plain_password: str) -> str:
-    return pwd_context.hash(plain_password)
+    return get_pwd_context().hash(plain_password)
 
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    return get_pwd_context().verify(plain_password, hashed_password)
@@ -0,0 +1,81 @@
+import threading
+import time
+
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import Pool, QueuePool, AsyncAdaptedQueuePool
+
+
+class InstrumentedPoolMixin:
+    """Counts checkouts that had to wait for a connection because the pool was exhausted."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.waits = 0
+        self.wait_seconds = 0.0
+        self.timeouts = 0
+        self._stats_lock = threading.Lock()
+
+    def _do_get(self):
+        if self.checkedin() or self.overflow() < self._max_overflow or self._max_overflow < 0:
+            return super()._do_get()
+
+        started = time.perf_counter()
+        timed_out = False
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            timed_out = True
+            raise
+        finally:
+            with self._stats_lock:
+                self.waits += 1
+                self.wait_seconds += time.perf_counter() - started
+                self.timeouts += timed_out
+
+
+class InstrumentedQueuePool(InstrumentedPoolMixin, QueuePool):
+    pass
+
+
+class InstrumentedAsyncAdaptedQueuePool(InstrumentedPoolMixin, AsyncAdaptedQueuePool):
+    pass
+
+
+def pool_sizing(max_connections: int, workers: int, engines: int, max_overflow: int) -> int:
+    """Split the connections Postgres grants the app between workers and their engines.
+
+    Args:
+        max_connections: Connections the app may hold open in total, across every worker
+        workers: Number of uvicorn worker processes
+        engines: Engines each worker opens (sync and async)
+        max_overflow: Overflow connections each engine may open on top of its pool
+
+    Returns:
+        The pool size of each engine, at least 1
+    """
+    budget = max_connections // max(workers * engines, 1)
+    return max(budget - max_overflow, 1)
+
+
+POOL_METRICS = {
+    "db_pool_size": ("gauge", "Connections the pool keeps open", lambda pool: pool.size()),
+    "db_pool_checked_out": ("gauge", "Connections currently checked out", lambda pool: pool.checkedout()),
+    "db_pool_checked_in": ("gauge", "Idle connections in the pool", lambda pool: pool.checkedin()),
+    "db_pool_overflow": ("gauge", "Connections open beyond the pool size", lambda pool: max(pool.overflow(), 0)),
+    "db_pool_waits_total": ("counter", "Checkouts that waited for a free connection", lambda pool: pool.waits),
+    "db_pool_wait_seconds_total": ("counter", "Time spent waiting for a free connection",
+                                   lambda pool: round(pool.wait_seconds, 6)),
+    "db_pool_timeouts_total": ("counter", "Checkouts that gave up waiting", lambda pool: pool.timeouts),
+}
+
+
+def render_pool_metrics(pools: dict[str, Pool]) -> str:
+    """Render the state of the instrumented pools in the Prometheus text format."""
+    instrumented = {name: pool for name, pool in pools.items() if isinstance(pool, InstrumentedPoolMixin)}
+    lines = []
+    for metric, (kind, description, read) in POOL_METRICS.items():
+        lines.append(f"# HELP {metric} {description}")
+        lines.append(f"# TYPE {metric} {kind}")
+        for name, pool in instrumented.items():
+            lines.append(f'{metric}{{engine="{name}"}} {read(pool)}')
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,39 @@
+import functools
+from typing import Any, Callable
+
+
+class LazyLimiter:
+    """Stands in for a slowapi ``Limiter`` until the first rate limited request.
+
+    slowapi pulls in the ``limits`` package and its storage backends, which is a
+    large share of a worker's boot time. The real limiter is built, and each
+    endpoint wrapped by it, on the first call instead of at import.
+    """
+
+    def __init__(self, **options: Any):
+        self.options = options
+        self._limiter = None
+
+    @property
+    def limiter(self):
+        if self._limiter is None:
+            from slowapi import Limiter
+            from slowapi.util import get_remote_address
+
+            self._limiter = Limiter(**{"key_func": get_remote_address, **self.options})
+        return self._limiter
+
+    def limit(self, limit_value: str) -> Callable:
+        def decorator(func: Callable) -> Callable:
+            limited = None
+
+            @functools.wraps(func)
+            async def wrapper(*args, **kwargs):
+                nonlocal limited
+                if limited is None:
+                    limited = self.limiter.limit(limit_value)(func)
+                return await limited(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
@@ -0,0 +1,29 @@
+import json
+from typing import Any, AsyncIterator
+
+from starlette.responses import StreamingResponse
+from starlette.types import Receive, Scope, Send
+
+
+class NDJSONResponse(StreamingResponse):
+    """Streams one JSON document per line, while the endpoint may still be reading the request body.
+
+    Before ASGI 2.4 ``StreamingResponse`` reads ``receive`` itself to notice disconnects,
+    which would swallow request body chunks. Here the request stream does that instead,
+    raising ``ClientDisconnect`` when the client goes away.
+    """
+
+    media_type = "application/x-ndjson"
+
+    def __init__(self, documents: AsyncIterator[Any], **kwargs):
+        super().__init__(self._encode(documents), **kwargs)
+
+    @staticmethod
+    async def _encode(documents: AsyncIterator[Any]) -> AsyncIterator[bytes]:
+        async for document in documents:
+            yield json.dumps(document).encode() + b"\n"
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        await self.stream_response(send)
+        if self.background is not None:
+            await self.background()
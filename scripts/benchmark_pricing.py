@@ -0,0 +1,85 @@
+"""Time the pricing engine against the per-line float loop it replaced, on large invoices.
+
+    python -m scripts.benchmark_pricing
+    python -m scripts.benchmark_pricing --lines 1000 10000 100000 --runs 10
+"""
+import argparse
+import random
+import time
+from decimal import Decimal
+
+from core.services.pricing import price_invoice, LineItems
+
+RATES = {"A": Decimal("16.5"), "B": Decimal("0"), "E": Decimal("20"), "C": Decimal("5.5")}
+FLOAT_RATES = {rate_id: float(rate) for rate_id, rate in RATES.items()}
+
+
+def random_invoice(lines: int, seed: int = 42) -> LineItems:
+    """Prices as Decimal, the way they load from the Numeric columns."""
+    rng = random.Random(seed)
+    return LineItems(
+        rate_ids=[rng.choice(list(RATES)) for _ in range(lines)],
+        unit_prices=[Decimal(rng.randint(1, 100_000)).scaleb(-2) for _ in range(lines)],
+        quantities=[rng.randint(1, 20) for _ in range(lines)],
+        discounts=[rng.choice((0, 0, 0, 0.5, 1.25)) for _ in range(lines)],
+    )
+
+
+def as_floats(lines: LineItems) -> LineItems:
+    return LineItems(rate_ids=lines.rate_ids, unit_prices=list(map(float, lines.unit_prices)),
+                     quantities=lines.quantities, discounts=lines.discounts)
+
+
+def price_per_line(lines: LineItems, rates: dict[str, float]) -> dict:
+    """The float loop the sale route used before the pricing engine."""
+    tax_breakdown = {}
+    total_vat = 0
+    invoice_total = 0
+    line_vat = []
+    for rate_id, unit_price, quantity, discount in zip(lines.rate_ids, lines.unit_prices,
+                                                       lines.quantities, lines.discounts):
+        selling_price = unit_price - discount
+        amount = selling_price * quantity
+        taxable_amount = amount / (1 + rates[rate_id] / 100)
+        tax_amount = amount - taxable_amount
+        breakdown = tax_breakdown.setdefault(rate_id, {"taxableAmount": 0, "taxAmount": 0})
+        breakdown["taxableAmount"] += taxable_amount
+        breakdown["taxAmount"] += tax_amount
+        total_vat += tax_amount
+        invoice_total += amount
+        line_vat.append(round(tax_amount, 2))
+    return {"line_vat": line_vat, "total_vat": round(total_vat, 2), "invoice_total": invoice_total}
+
+
+def best_of(runs: int, fn) -> float:
+    timings = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - started)
+    return min(timings) * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--lines", type=int, nargs="+", default=[1, 10, 100, 1000, 10_000])
+    parser.add_argument("--runs", type=int, default=20)
+    args = parser.parse_args()
+
+    print(f"{'lines':>8} {'float loop ms':>14} {'engine ms':>10} {'lines/s':>12} {'line VAT off by a cent':>24}")
+    for lines in args.lines:
+        invoice = random_invoice(lines)
+        float_invoice = as_floats(invoice)
+        legacy = best_of(args.runs, lambda: price_per_line(float_invoice, FLOAT_RATES))
+        engine = best_of(args.runs, lambda: price_invoice(invoice, RATES))
+
+        expected = price_invoice(invoice, RATES).line_vat
+        actual = price_per_line(float_invoice, FLOAT_RATES)["line_vat"]
+        mismatches = sum(Decimal(str(a)) != e for a, e in zip(actual, expected))
+
+        print(f"{lines:>8} {legacy:>14.3f} {engine:>10.3f} {lines / engine * 1000:>12,.0f} "
+              f"{mismatches / lines * 100:>23.2f}%")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,64 @@
+"""Measure how long a fresh interpreter takes to import the application.
+
+Each run imports ``apps.main`` in a new process, so nothing is cached between runs.
+Pass ``--compare`` to time another git revision side by side, it is checked out
+into a temporary worktree for the duration of the benchmark.
+
+    python -m scripts.benchmark_startup
+    python -m scripts.benchmark_startup --compare HEAD~1 --runs 20
+"""
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+IMPORT_SNIPPET = "import time; started = time.perf_counter(); import {module}; print(time.perf_counter() - started)"
+
+
+def time_import(tree: Path, module: str, runs: int) -> list[float]:
+    env = {**os.environ, "PYTHONPATH": str(tree), "PYTHONDONTWRITEBYTECODE": "1"}
+    timings = []
+    for _ in range(runs):
+        result = subprocess.run([sys.executable, "-c", IMPORT_SNIPPET.format(module=module)],
+                                cwd=tree, env=env, capture_output=True, text=True)
+        if result.returncode:
+            raise SystemExit(f"Importing {module} from {tree} failed:\n{result.stderr}")
+        timings.append(float(result.stdout.strip().splitlines()[-1]))
+    return timings
+
+
+def summary(label: str, timings: list[float]) -> str:
+    return (f"{label:<24} median {statistics.median(timings) * 1000:>8.1f} ms   "
+            f"min {min(timings) * 1000:>8.1f} ms   max {max(timings) * 1000:>8.1f} ms")
+
+
+def run(module: str, runs: int, compare: str | None) -> None:
+    trees = {"working tree": ROOT}
+    with tempfile.TemporaryDirectory() as scratch:
+        if compare:
+            worktree = Path(scratch) / "compare"
+            subprocess.run(["git", "worktree", "add", "--detach", str(worktree), compare],
+                           cwd=ROOT, check=True, capture_output=True)
+            trees = {compare: worktree, **trees}
+        try:
+            # The first import of each tree warms the OS file cache and is discarded
+            for label, tree in trees.items():
+                time_import(tree, module, 1)
+                print(summary(label, time_import(tree, module, runs)))
+        finally:
+            if compare:
+                subprocess.run(["git", "worktree", "remove", "--force", str(worktree)], cwd=ROOT, check=True)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--module", default="apps.main")
+    parser.add_argument("--runs", type=int, default=10)
+    parser.add_argument("--compare", help="git revision to time alongside the working tree")
+    args = parser.parse_args()
+    run(args.module, args.runs, args.compare)
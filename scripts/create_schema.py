@@ -0,0 +1,5 @@
+from core.database import create_schema
+
+if __name__ == "__main__":
+    create_schema()
+    print("✅ Schema created.")
@@ -0,0 +1,75 @@
+"""Report which modules a cold import of the application spends its time on.
+
+Runs ``python -X importtime`` in a fresh interpreter and ranks the modules by the
+time spent importing them (self), and the top level packages by the time their
+outermost import took (cumulative, children included).
+
+    python -m scripts.profile_imports
+    python -m scripts.profile_imports --module core.auth --top 40
+"""
+import argparse
+import subprocess
+import sys
+from collections import defaultdict
+from dataclasses import dataclass
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+@dataclass
+class ImportTiming:
+    module: str
+    self_us: int
+    cumulative_us: int
+    depth: int
+
+
+def profile(module: str) -> list[ImportTiming]:
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                            cwd=ROOT, capture_output=True, text=True)
+    if result.returncode:
+        raise SystemExit(f"Importing {module} failed:\n{result.stderr}")
+
+    timings = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line.removeprefix("import time:").split("|")
+        depth = (len(name) - len(name.lstrip())) // 2
+        timings.append(ImportTiming(name.strip(), int(self_us), int(cumulative_us), depth))
+    return timings
+
+
+def by_package(timings: list[ImportTiming]) -> dict[str, int]:
+    """Cumulative time of each top level package, counting only its outermost imports."""
+    packages = defaultdict(int)
+    for i, timing in enumerate(timings):
+        package = timing.module.split(".")[0]
+        # importtime lists a module after everything it imported, so its importer comes later
+        parent = next((t for t in timings[i + 1:] if t.depth < timing.depth), None)
+        if parent is None or parent.module.split(".")[0] != package:
+            packages[package] += timing.cumulative_us
+    return packages
+
+
+def report(module: str, top: int) -> None:
+    timings = profile(module)
+    total = max(timing.cumulative_us for timing in timings)
+    print(f"import {module}: {total / 1000:.1f} ms, {len(timings)} modules\n")
+
+    print(f"{'self ms':>9}  module")
+    for timing in sorted(timings, key=lambda t: t.self_us, reverse=True)[:top]:
+        print(f"{timing.self_us / 1000:>9.1f}  {timing.module}")
+
+    print(f"\n{'cumul. ms':>9}  top level package")
+    for package, cumulative_us in sorted(by_package(timings).items(), key=lambda p: p[1], reverse=True)[:top]:
+        print(f"{cumulative_us / 1000:>9.1f}  {package}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--module", default="apps.main")
+    parser.add_argument("--top", type=int, default=25)
+    args = parser.parse_args()
+    report(args.module, args.top)
@@ -1,12 +1,11 @@
-from core import Base
-from core.database import engine, SessionLocal
+from core.database import SessionLocal, create_schema
 from core.seeders.dictionary_seeder import seed_dictionary
 from core.seeders.roles_seeder import seed_roles
 from core.seeders.user_seeder import seed_users
 
 
 def run():
-    Base.metadata.create_all(bind=engine)
+    create_schema()
     db = SessionLocal()
     try:
         seed_dictionary(db)
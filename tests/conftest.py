@@ -1,34 +1,45 @@
 import json
 import os
+import tempfile
 import uuid
 from datetime import timedelta, datetime
 from pathlib import Path
 
 import pytest
 import rstr
-from sqlalchemy import create_engine, StaticPool, insert
+from sqlalchemy import create_engine, insert, NullPool
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker, AsyncSession
 from sqlalchemy.orm import sessionmaker, Session
 from starlette.testclient import TestClient
 
 from apps.main import app
 from core import Subscription
-from core.auth import create_access_token
-from core.database import Base, get_db
+from core.auth import create_access_token, principal_cache, principals_version
+from core.database import Base, get_db, get_async_db, get_async_session_factory
 from core.enums import RoleEnum, Scope, StatusEnum
 from core.models import Tenant, Role, User, Terminal, Profile, role_route_association, Route, Product, Item, TaxRate, \
     GlobalConfig, OfflineTransaction, Dictionary, Package
+from core.services.counters import transaction_counter
+from core.services.mra_client import mra_breaker
+from core.services.permissions import permission_matrix
 from core.settings import settings
+from core.services.terminal_context import terminal_cache
+from core.utils.api_logger import api_log_sink
 from core.utils.helpers import get_sequence_number, get_random_number, tenant_code_regex
 
-# Use an in-memory SQLite database for testing
+# Use a scratch SQLite file for testing, shared by the sync and the async engine
+TEST_DATABASE = Path(tempfile.gettempdir()) / f"receipt_rocket_test_{os.getpid()}.db"
 engine_test = create_engine(
-    "sqlite:///:memory:",
+    f"sqlite:///{TEST_DATABASE}",
     connect_args={"check_same_thread": False},
-    poolclass=StaticPool
 )
+async_engine_test = create_async_engine(f"sqlite+aiosqlite:///{TEST_DATABASE}", poolclass=NullPool)
 TestingSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine_test)
+AsyncTestingSessionLocal = async_sessionmaker(async_engine_test, autoflush=False, expire_on_commit=False)
 
 Base.metadata.create_all(bind=engine_test)
+api_log_sink.session_factory = TestingSessionLocal
+transaction_counter.session_factory = AsyncTestingSessionLocal
 
 
 def override_get_db():
@@ -39,15 +50,39 @@ def override_get_db():
         db.close()
 
 
+@pytest.fixture(scope="session", autouse=True)
+def test_database_file():
+    yield
+    engine_test.dispose()
+    TEST_DATABASE.unlink(missing_ok=True)
+
+
+async def override_get_async_db():
+    db: AsyncSession = AsyncTestingSessionLocal()
+    try:
+        yield db
+    finally:
+        await db.close()
+
+
 @pytest.fixture
 def client(test_db):
     app.dependency_overrides[get_db] = lambda: test_db
+    app.dependency_overrides[get_async_db] = override_get_async_db
+    app.dependency_overrides[get_async_session_factory] = lambda: AsyncTestingSessionLocal
     yield TestClient(app)
 
 
 @pytest.fixture(scope="function", autouse=True)
 def test_db():
     Base.metadata.create_all(bind=engine_test)
+    api_log_sink.clear()
+    terminal_cache.clear()
+    principal_cache.clear()
+    principals_version.invalidate()
+    permission_matrix.invalidate()
+    transaction_counter.clear()
+    mra_breaker.reset()
     db = TestingSessionLocal()
     try:
         yield db
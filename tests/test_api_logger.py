@@ -0,0 +1,44 @@
+from httpx import Response
+
+from core.models import ApiLog
+from core.utils.api_logger import ApiLogSink
+from tests.conftest import TestingSessionLocal
+
+
+def make_row(sink: ApiLogSink, count: int):
+    for i in range(count):
+        sink.submit({
+            "method": "POST",
+            "url": f"https://example.com/{i}",
+            "response_status": 200,
+            "response_body": Response(200, json={"statusCode": 1}).text,
+        })
+
+
+def test_flush_writes_queued_logs_in_batches(test_db):
+    sink = ApiLogSink(session_factory=TestingSessionLocal, batch_size=2)
+    make_row(sink, 5)
+
+    assert sink.pending == 5
+    assert sink.flush() == 5
+    assert sink.pending == 0
+    assert sink.written == 5
+    assert test_db.query(ApiLog).count() == 5
+
+
+def test_full_queue_drops_logs(test_db):
+    sink = ApiLogSink(session_factory=TestingSessionLocal, max_queue_size=3)
+    make_row(sink, 5)
+
+    assert sink.pending == 3
+    assert sink.dropped == 2
+
+
+def test_stop_flushes_pending_logs(test_db):
+    sink = ApiLogSink(session_factory=TestingSessionLocal, flush_interval=60)
+    sink.start()
+    make_row(sink, 3)
+    sink.stop()
+
+    assert sink.pending == 0
+    assert test_db.query(ApiLog).count() == 3
@@ -1,4 +1,12 @@
+from datetime import datetime
+
+from sqlalchemy import event, text, update, select
+
+from core.auth import principal_cache, principals_version, PRINCIPALS_CACHE
+from core.models import User, CacheVersion
+from core.services.permissions import bump_cache_version
 from core.settings import settings
+from tests.conftest import async_engine_test
 
 
 def test_login(test_user_with_routes, client, test_db, test_route):
@@ -14,3 +22,69 @@ def test_login(test_user_with_routes, client, test_db, test_route):
 def test_login_wrong_password(client):
     response = client.post("/auth/login", data={"username": "some@email.io", "password": "wrong_password"})
     assert response.status_code == 401
+
+
+def test_authenticated_user_is_cached(client, test_db, auth_header, test_user):
+    assert client.get("/api/v1/terminals", headers=auth_header).status_code == 200
+    assert len(principal_cache) == 1
+
+    test_user.email = "renamed@example.com"
+    test_db.commit()
+    assert len(principal_cache) == 0
+    assert client.get("/api/v1/terminals", headers=auth_header).status_code == 401
+
+
+def test_bulk_user_update_invalidates_cached_principals(client, test_db, auth_header, test_user):
+    assert client.get("/api/v1/terminals", headers=auth_header).status_code == 200
+
+    test_db.execute(update(User).where(User.id == test_user.id).values(email="renamed@example.com"))
+    test_db.commit()
+    assert len(principal_cache) == 0
+    assert client.get("/api/v1/terminals", headers=auth_header).status_code == 401
+
+
+def test_user_changed_on_another_worker_invalidates_cached_principals(client, test_db, auth_header, test_user,
+                                                                      monkeypatch):
+    assert client.get("/api/v1/terminals", headers=auth_header).status_code == 200
+
+    # Another worker renames the user: this worker's cache is untouched, only the shared version moves
+    test_db.execute(text("UPDATE users SET email = 'renamed@example.com' WHERE id = :id"),
+                    {"id": test_user.id.hex})
+    bump_cache_version(test_db, PRINCIPALS_CACHE)
+    assert client.get("/api/v1/terminals", headers=auth_header).status_code == 200
+
+    monkeypatch.setattr(principals_version, "check_interval", 0)
+    assert client.get("/api/v1/terminals", headers=auth_header).status_code == 401
+
+
+def test_login_keeps_cached_principals(client, test_db, auth_header, test_user_with_routes, test_route):
+    def principals_version_row():
+        return test_db.scalar(select(CacheVersion.version).where(CacheVersion.name == PRINCIPALS_CACHE))
+
+    assert client.get("/api/v1/terminals", headers=auth_header).status_code == 200
+    version = principals_version_row()
+
+    response = client.post("/auth/login",
+                           data={"username": test_user_with_routes.email, "password": settings.TEST_SECRET})
+    assert response.status_code == 200
+    test_db.execute(update(User).where(User.id == test_user_with_routes.id).values(last_login=datetime.now()))
+    test_db.commit()
+
+    assert principals_version_row() == version
+    assert len(principal_cache) == 1
+
+
+def test_cached_user_skips_user_lookup(client, test_db, auth_header, test_user):
+    statements = []
+
+    def record_statement(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(async_engine_test.sync_engine, "before_cursor_execute", record_statement)
+    try:
+        for _ in range(3):
+            assert client.get("/api/v1/terminals", headers=auth_header).status_code == 200
+    finally:
+        event.remove(async_engine_test.sync_engine, "before_cursor_execute", record_statement)
+
+    assert len([statement for statement in statements if "FROM users" in statement]) == 1
@@ -24,3 +24,18 @@ def test_get_new_config(client, device_headers, test_db, test_terminal):
     assert test_db.query(Terminal).count() == 2
     # assert test_db.get(Terminal, test_terminal.id).phone_number == '+265888123456'
     assert test_db.query(Tenant).filter(Tenant.id == test_terminal.tenant_id).first().tin == '31699145'
+
+
+@respx.mock
+def test_renamed_tax_rate_is_updated_in_place(client, device_headers, test_db, test_terminal, test_tax_rate):
+    mock_path = Path(__file__).parent / "data" / "config_response.json"
+    mock_data = json.loads(mock_path.read_text())
+
+    respx.post(f"{settings.MRA_EIS_URL}/configuration/get-latest-configs").mock(
+        return_value=Response(200, json=mock_data))
+
+    response = client.get(f"/api/v1/config", headers=device_headers)
+    assert response.status_code == 200
+    assert test_db.query(TaxRate).count() == 3
+    test_db.refresh(test_tax_rate)
+    assert (test_tax_rate.rate_id, test_tax_rate.name) == ("A", "Standard Rated")
@@ -0,0 +1,32 @@
+import asyncio
+
+from core.services.counters import allocate_transaction_numbers, TransactionCounter
+from tests.conftest import AsyncTestingSessionLocal
+
+SALES = 1000
+
+
+async def test_concurrent_allocations_have_no_gaps_or_duplicates(test_db, test_terminal):
+    connections = asyncio.Semaphore(20)
+
+    async def sell() -> int:
+        async with connections, AsyncTestingSessionLocal() as db:
+            numbers = await allocate_transaction_numbers(db, test_terminal.id)
+            await db.commit()
+            return numbers[0]
+
+    numbers = await asyncio.gather(*(sell() for _ in range(SALES)))
+
+    assert sorted(numbers) == list(range(1, SALES + 1))
+    test_db.refresh(test_terminal)
+    assert test_terminal.transaction_count == SALES
+
+
+async def test_block_counter_hands_out_each_number_once(test_db, test_terminal):
+    counter = TransactionCounter(block_size=50, session_factory=AsyncTestingSessionLocal)
+
+    numbers = await asyncio.gather(*(counter.next(test_terminal.id) for _ in range(SALES)))
+
+    assert sorted(numbers) == list(range(1, SALES + 1))
+    test_db.refresh(test_terminal)
+    assert test_terminal.transaction_count == SALES
@@ -0,0 +1,52 @@
+import asyncio
+from datetime import datetime
+
+from core.enums import SubmissionStatus
+from core.models import SaleSubmission
+from core.services.idempotency import SaleSubmissions
+from tests.conftest import AsyncTestingSessionLocal
+
+
+async def test_concurrent_duplicates_share_one_submission(test_db, test_terminal):
+    submissions = SaleSubmissions(wait_timeout=5, poll_interval=0.01, stale_after=60)
+    calls = []
+
+    async def submit():
+        calls.append(1)
+        await asyncio.sleep(0.05)
+        return {"remark": "ok"}
+
+    async def run():
+        async with AsyncTestingSessionLocal() as db:
+            return await submissions.run(db, test_terminal.id, "INV-0001", "fingerprint", submit)
+
+    results = await asyncio.gather(*(run() for _ in range(5)))
+
+    assert results == [{"remark": "ok"}] * 5
+    assert len(calls) == 1
+
+
+async def test_waits_for_a_sale_claimed_by_another_worker(test_db, test_terminal):
+    test_db.add(SaleSubmission(terminal_id=test_terminal.id, invoice_number="INV-0001", fingerprint="fingerprint",
+                               status=SubmissionStatus.PENDING.value, claimed_at=datetime.now()))
+    test_db.commit()
+    submissions = SaleSubmissions(wait_timeout=5, poll_interval=0.01, stale_after=60)
+
+    async def submit():
+        raise AssertionError("the sale must not be submitted twice")
+
+    async def finish_elsewhere():
+        await asyncio.sleep(0.05)
+        async with AsyncTestingSessionLocal() as db:
+            submission = await db.get(SaleSubmission, test_db.query(SaleSubmission.id).scalar())
+            submission.status = SubmissionStatus.COMPLETED.value
+            submission.response = {"remark": "ok"}
+            await db.commit()
+
+    async with AsyncTestingSessionLocal() as db:
+        result, _ = await asyncio.gather(
+            submissions.run(db, test_terminal.id, "INV-0001", "fingerprint", submit),
+            finish_elsewhere(),
+        )
+
+    assert result == {"remark": "ok"}
@@ -0,0 +1,179 @@
+import asyncio
+import time
+
+import pytest
+import respx
+from httpx import Response
+
+from core.models import OfflineTransaction
+from core.services.mra_client import get_client, close_client, mra_breaker, hedged_post
+from core.settings import settings
+from core.utils.circuit_breaker import CircuitBreaker, BreakerState
+from tests.conftest import get_mock_data
+
+
+@pytest.mark.asyncio
+async def test_client_is_shared_until_closed():
+    client = get_client()
+    assert get_client() is client
+
+    await close_client()
+    assert client.is_closed
+    assert get_client() is not client
+    await close_client()
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def make_breaker(clock: FakeClock) -> CircuitBreaker:
+    return CircuitBreaker(window=10, min_calls=4, error_rate=0.5, slow_call_seconds=2,
+                          open_seconds=30, probes=2, clock=clock)
+
+
+def test_breaker_opens_on_errors_and_closes_after_probes():
+    clock = FakeClock()
+    breaker = make_breaker(clock)
+
+    for success in (True, False, True, False):
+        assert breaker.allow()
+        breaker.record(success=success, latency=0.1)
+    assert breaker.state == BreakerState.OPEN
+    assert not breaker.allow()
+
+    clock.now += 30
+    assert breaker.allow() and breaker.allow()
+    assert breaker.state == BreakerState.HALF_OPEN
+    assert not breaker.allow()
+    breaker.record(success=True, latency=0.1)
+    breaker.record(success=False, latency=0.1)
+    assert breaker.state == BreakerState.OPEN
+
+    clock.now += 30
+    assert breaker.allow() and breaker.allow()
+    breaker.record(success=True, latency=0.1)
+    breaker.record(success=True, latency=0.1)
+    assert breaker.state == BreakerState.CLOSED
+    assert breaker.transitions == {BreakerState.OPEN: 2, BreakerState.HALF_OPEN: 2, BreakerState.CLOSED: 1}
+    assert breaker.rejected == 2
+
+
+def test_breaker_opens_on_slow_calls_within_the_window():
+    clock = FakeClock()
+    breaker = make_breaker(clock)
+
+    for latency in (0.1, 3, 3):
+        breaker.record(success=True, latency=latency)
+    clock.now += 11
+    breaker.record(success=True, latency=3)
+    assert breaker.state == BreakerState.CLOSED
+
+    breaker.record(success=True, latency=3)
+    breaker.record(success=True, latency=0.1)
+    breaker.record(success=True, latency=3)
+    assert breaker.state == BreakerState.OPEN
+    assert breaker.latency_percentile(95) == 3
+
+
+@respx.mock
+def test_sale_goes_offline_while_the_breaker_is_open(client, test_db, device_headers, test_terminal, test_product,
+                                                     test_global_config):
+    mra = respx.post(f"{settings.MRA_EIS_URL}/sales/submit-sales-transaction").mock(
+        return_value=Response(200, json=get_mock_data(filename="sales_response.json")))
+    for _ in range(settings.MRA_BREAKER_MIN_CALLS):
+        mra_breaker.record(success=False, latency=settings.MRA_EIS_TIMEOUT)
+
+    response = client.post("/api/v1/sales", headers=device_headers, json={
+        "invoice_number": "INV-2025-09-22-0001",
+        "payment_method": "cash",
+        "invoice_line_items": [{"product_code": test_product.code, "quantity": 1}]
+    })
+
+    assert response.status_code == 200
+    assert response.json()["remark"] == "Transaction saved offline"
+    assert not mra.called
+    assert test_db.query(OfflineTransaction).filter(
+        OfflineTransaction.transaction_id == "INV-2025-09-22-0001").count() == 1
+
+    metrics = client.get("/metrics").text
+    assert 'circuit_breaker_state{breaker="mra",state="open"} 1' in metrics
+    assert 'circuit_breaker_transitions_total{breaker="mra",state="open"} 1' in metrics
+    assert 'circuit_breaker_rejected_total{breaker="mra"} 1' in metrics
+
+
+@respx.mock
+async def test_slow_read_is_hedged(monkeypatch):
+    monkeypatch.setattr(settings, "MRA_HEDGE_READS", True)
+    monkeypatch.setattr(settings, "MRA_HEDGE_MIN_DELAY", 0.05)
+    delays = [5, 0]
+    sent = []
+
+    async def mra_response(request):
+        sent.append(request)
+        await asyncio.sleep(delays[len(sent) - 1])
+        return Response(200, json={"statusCode": len(sent)})
+
+    respx.post(f"{settings.MRA_EIS_URL}/configuration/get-latest-configs").mock(side_effect=mra_response)
+
+    started = time.perf_counter()
+    response = await hedged_post(f"{settings.MRA_EIS_URL}/configuration/get-latest-configs")
+
+    assert time.perf_counter() - started < 1
+    assert response.json() == {"statusCode": 2}
+    assert len(sent) == 2
+    await close_client()
+
+
+@respx.mock
+def test_sale_submission_keeps_to_the_pos_budget(client, test_db, device_headers, test_terminal, test_product,
+                                                 test_global_config):
+    timeouts = []
+
+    def mra_response(request):
+        timeouts.append(request.extensions["timeout"]["read"])
+        return Response(200, json=get_mock_data(filename="sales_response.json"))
+
+    respx.post(f"{settings.MRA_EIS_URL}/sales/submit-sales-transaction").mock(side_effect=mra_response)
+
+    def sell(invoice_number: str, budget_ms: int):
+        return client.post("/api/v1/sales", headers={**device_headers, "X-Request-Budget-Ms": str(budget_ms)}, json={
+            "invoice_number": invoice_number,
+            "payment_method": "cash",
+            "invoice_line_items": [{"product_code": test_product.code, "quantity": 1}]
+        })
+
+    response = sell("INV-2025-09-22-0001", 2000)
+    assert response.json()["remark"] == "Transaction successful"
+    assert 0 < timeouts[0] <= 2 - settings.SALE_DEADLINE_RESERVE
+
+    response = sell("INV-2025-09-22-0002", 100)
+    assert response.json()["remark"] == "Transaction saved offline"
+    assert len(timeouts) == 1
+
+
+@respx.mock
+def test_slow_mra_response_is_cut_off_at_the_pos_budget(client, test_db, device_headers, test_terminal, test_product,
+                                                        test_global_config):
+    async def slow_response(request):
+        # Each phase stays within httpx's per-phase timeout, together they take twice as long
+        for _ in range(4):
+            await asyncio.sleep(request.extensions["timeout"]["read"] / 2)
+        return Response(200, json=get_mock_data(filename="sales_response.json"))
+
+    respx.post(f"{settings.MRA_EIS_URL}/sales/submit-sales-transaction").mock(side_effect=slow_response)
+
+    started = time.monotonic()
+    response = client.post("/api/v1/sales", headers={**device_headers, "X-Request-Budget-Ms": "1000"}, json={
+        "invoice_number": "INV-2025-09-22-0001",
+        "payment_method": "cash",
+        "invoice_line_items": [{"product_code": test_product.code, "quantity": 1}]
+    })
+
+    assert response.json()["remark"] == "Transaction saved offline"
+    assert time.monotonic() - started < 1
+    assert test_db.query(OfflineTransaction).count() == 1
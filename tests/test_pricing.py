@@ -0,0 +1,49 @@
+from decimal import Decimal
+
+import pytest
+
+from core.services.pricing import price_invoice, LineItems, RateBreakdown
+
+RATES = {"A": 16.5, "B": 0.0, "E": 20.0}
+
+
+def test_price_invoice():
+    pricing = price_invoice(LineItems(
+        rate_ids=["A", "B", "A"],
+        unit_prices=[300, 150.5, 100],
+        quantities=[2, 1, 3],
+        discounts=[50, 0, 0.1],
+    ), RATES)
+
+    assert pricing.selling_prices == [Decimal("250"), Decimal("150.5"), Decimal("99.9")]
+    assert pricing.line_totals == [Decimal("500"), Decimal("150.5"), Decimal("299.7")]
+    assert pricing.line_vat == [Decimal("70.82"), Decimal("0.00"), Decimal("42.45")]
+    assert pricing.tax_breakdown == [
+        RateBreakdown(rate_id="A", taxable_amount=Decimal("686.44"), tax_amount=Decimal("113.26")),
+        RateBreakdown(rate_id="B", taxable_amount=Decimal("150.50"), tax_amount=Decimal("0.00")),
+    ]
+    assert pricing.total_vat == Decimal("113.26")
+    assert pricing.invoice_total == Decimal("950.2")
+
+
+def test_price_invoice_rounds_half_up():
+    # The VAT is exactly 0.175, which float arithmetic rounds down to 0.17
+    pricing = price_invoice(LineItems(rate_ids=["E"], unit_prices=[1.05], quantities=[1], discounts=[0]), RATES)
+
+    assert pricing.line_vat == [Decimal("0.18")]
+    assert pricing.total_vat == Decimal("0.18")
+    assert pricing.tax_breakdown[0].taxable_amount == Decimal("0.88")
+
+
+def test_price_invoice_does_not_accumulate_rounding():
+    lines = 10_000
+    pricing = price_invoice(LineItems(
+        rate_ids=["E"] * lines, unit_prices=[1.05] * lines, quantities=[1] * lines, discounts=[0] * lines), RATES)
+
+    assert pricing.total_vat == Decimal("1750.00")
+    assert sum(pricing.line_vat) == Decimal("1800.00")
+
+
+def test_price_invoice_unknown_rate():
+    with pytest.raises(KeyError):
+        price_invoice(LineItems(rate_ids=["Z"], unit_prices=[1], quantities=[1], discounts=[0]), RATES)
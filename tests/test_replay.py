@@ -0,0 +1,180 @@
+import asyncio
+import json
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import pytest
+import respx
+from httpx import Response, ConnectError
+
+from core.enums import DeliveryStatus
+from core.models import OfflineTransaction, Terminal
+from core.services.outbox import OutboxDispatcher
+from core.services.replay import TerminalLeases, run_submission_job
+from core.settings import settings
+from core.utils.helpers import get_random_number
+from tests.conftest import get_mock_data, AsyncTestingSessionLocal
+
+
+async def test_terminal_is_leased_by_one_worker_at_a_time(test_db, test_offline_transaction, test_terminal):
+    async with AsyncTestingSessionLocal() as db:
+        first, second = TerminalLeases(db, "worker-1"), TerminalLeases(db, "worker-2")
+
+        assert await first.claim() == [test_terminal.id]
+        assert await second.claim() == []
+        assert await second.renew([test_terminal.id]) == {test_terminal.id}
+
+        await first.release([test_terminal.id])
+        assert await second.claim() == [test_terminal.id]
+
+
+async def test_expired_lease_is_taken_over(test_db, test_offline_transaction, test_terminal):
+    async with AsyncTestingSessionLocal() as db:
+        assert await TerminalLeases(db, "crashed-worker", lease_seconds=-1).claim() == [test_terminal.id]
+        assert await TerminalLeases(db, "worker").claim() == [test_terminal.id]
+
+    test_db.refresh(test_terminal)
+    assert test_terminal.replay_leased_by == "worker"
+
+
+@respx.mock
+async def test_workers_do_not_submit_an_invoice_twice(test_db, test_tenant, test_terminal):
+    terminals = [test_terminal]
+    for i in range(3):
+        terminal = Terminal(terminal_id=f"Terminal {i + 2}", secret_key=settings.SECRET_KEY, tenant_id=test_tenant.id,
+                            site_id=test_terminal.site_id, token=f"token-{i}", phone_number="1234567890",
+                            device_id=get_random_number(16))
+        test_db.add(terminal)
+        terminals.append(terminal)
+    test_db.commit()
+
+    now = datetime.now()
+    for terminal in terminals:
+        for i in range(5):
+            test_db.add(OfflineTransaction(
+                transaction_id=f"{terminal.terminal_id}-{i}",
+                tenant_id=test_tenant.id,
+                terminal_id=terminal.id,
+                details={"invoiceHeader": {"invoiceNumber": f"{terminal.terminal_id}-{i}"}},
+                created_at=now + timedelta(seconds=i),
+            ))
+    test_db.commit()
+
+    submitted = []
+
+    async def mra_response(request):
+        submitted.append(json.loads(request.content)["invoiceHeader"]["invoiceNumber"])
+        await asyncio.sleep(0.01)
+        return Response(200, json=get_mock_data(filename="sales_response.json"))
+
+    respx.post(f"{settings.MRA_EIS_URL}/sales/submit-sales-transaction").mock(side_effect=mra_response)
+
+    results = await asyncio.gather(*(run_submission_job(AsyncTestingSessionLocal, f"worker-{i}", limit=2)
+                                     for i in range(3)))
+    while sum(leased for _, leased in results):
+        results = [await run_submission_job(AsyncTestingSessionLocal, "worker-0", limit=2)]
+
+    assert sorted(submitted) == sorted(f"{terminal.terminal_id}-{i}" for terminal in terminals for i in range(5))
+    assert test_db.query(OfflineTransaction).filter(OfflineTransaction.submitted_at.is_(None)).count() == 0
+    assert test_db.query(Terminal).filter(Terminal.replay_leased_by.is_not(None)).count() == 0
+
+
+@respx.mock
+async def test_dispatcher_finishes_its_sweep_on_stop(test_db, test_offline_transaction, test_terminal):
+    sweeping = asyncio.Event()
+
+    async def mra_response(_):
+        sweeping.set()
+        await asyncio.sleep(0.05)
+        return Response(200, json=get_mock_data(filename="sales_response.json"))
+
+    respx.post(f"{settings.MRA_EIS_URL}/sales/submit-sales-transaction").mock(side_effect=mra_response)
+
+    dispatcher = OutboxDispatcher(poll_interval=60, session_factory=AsyncTestingSessionLocal)
+    dispatcher.start()
+    dispatcher.notify()
+    await sweeping.wait()
+    await dispatcher.stop(timeout=5)
+
+    test_db.refresh(test_offline_transaction)
+    test_db.refresh(test_terminal)
+    assert test_offline_transaction.submitted_at is not None
+    assert test_terminal.replay_leased_by is None
+
+
+@respx.mock
+async def test_failed_delivery_backs_off_and_is_dead_lettered(test_db, test_tenant, test_terminal):
+    now = datetime.now()
+    for i in range(2):
+        test_db.add(OfflineTransaction(
+            transaction_id=f"INV-{i}",
+            tenant_id=test_tenant.id,
+            terminal_id=test_terminal.id,
+            details={"invoiceHeader": {"invoiceNumber": f"INV-{i}"}},
+            created_at=now + timedelta(seconds=i),
+        ))
+    test_db.commit()
+    # A garbled reply may be about the invoice itself, so unlike an outage it uses up an attempt
+    garbled = Response(200, text="<html>Service Unavailable</html>")
+    route = respx.post(f"{settings.MRA_EIS_URL}/sales/submit-sales-transaction").mock(return_value=garbled)
+
+    report, _ = await run_submission_job(AsyncTestingSessionLocal)
+
+    assert (report.failed, report.skipped, report.dead_lettered) == (1, 1, 0)
+    first, second = test_db.query(OfflineTransaction).order_by(OfflineTransaction.created_at).all()
+    assert first.attempt_count == 1
+    assert "Expecting value" in first.last_error
+    assert first.next_attempt_at - datetime.now() > timedelta(seconds=settings.OFFLINE_REPLAY_BACKOFF_BASE - 5)
+    assert second.attempt_count == 0
+
+    # Not due yet, so the terminal is not even leased
+    _, leased = await run_submission_job(AsyncTestingSessionLocal)
+    assert leased == 0
+    assert route.call_count == 1
+
+    first.attempt_count = settings.OFFLINE_REPLAY_MAX_ATTEMPTS - 1
+    first.next_attempt_at = datetime.now()
+    test_db.commit()
+    route.mock(side_effect=[garbled, Response(200, json=get_mock_data(filename="sales_response.json"))])
+
+    report, _ = await run_submission_job(AsyncTestingSessionLocal)
+
+    assert (report.failed, report.dead_lettered, report.submitted) == (1, 1, 1)
+    test_db.refresh(first)
+    test_db.refresh(second)
+    assert (first.status, first.attempt_count) == (DeliveryStatus.DEAD_LETTER, settings.OFFLINE_REPLAY_MAX_ATTEMPTS)
+    assert second.status == DeliveryStatus.SUBMITTED
+
+
+@pytest.mark.parametrize("outage", [ConnectError("Connection refused"), Response(503)])
+@respx.mock
+async def test_outage_does_not_use_up_attempts(test_db, test_offline_transaction, test_terminal, outage):
+    respx.post(f"{settings.MRA_EIS_URL}/sales/submit-sales-transaction").mock(side_effect=[outage])
+    test_offline_transaction.attempt_count = settings.OFFLINE_REPLAY_MAX_ATTEMPTS - 1
+    test_db.commit()
+
+    report, _ = await run_submission_job(AsyncTestingSessionLocal)
+
+    assert (report.failed, report.dead_lettered) == (1, 0)
+    test_db.refresh(test_offline_transaction)
+    assert test_offline_transaction.status == DeliveryStatus.PENDING
+    assert test_offline_transaction.attempt_count == settings.OFFLINE_REPLAY_MAX_ATTEMPTS - 1
+    assert test_offline_transaction.next_attempt_at > datetime.now()
+
+
+def test_requeue_dead_letters(client, test_db, test_offline_transaction, test_terminal, auth_header_global_admin):
+    test_offline_transaction.status = DeliveryStatus.DEAD_LETTER.value
+    test_offline_transaction.attempt_count = settings.OFFLINE_REPLAY_MAX_ATTEMPTS
+    test_offline_transaction.amount = Decimal("150.00")
+    test_db.commit()
+
+    response = client.post("/api/v1/sales/dead-letters/requeue", headers=auth_header_global_admin,
+                           params={"terminal_id": str(test_terminal.id)})
+
+    assert response.status_code == 200
+    assert response.json() == {"requeued": 1}
+    test_db.refresh(test_offline_transaction)
+    test_db.refresh(test_terminal)
+    assert (test_offline_transaction.status, test_offline_transaction.attempt_count) == (DeliveryStatus.PENDING, 0)
+    assert test_terminal.offline_pending_amount == Decimal("150.00")
+    assert test_terminal.offline_oldest_pending_at == test_offline_transaction.created_at
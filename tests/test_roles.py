@@ -3,7 +3,8 @@ import uuid
 from fastapi import status
 from sqlalchemy.orm import Session
 
-from core.models import Role, Route
+from core.models import Role, Route, CacheVersion
+from core.services.permissions import PERMISSIONS_CACHE
 from tests.conftest import create_role
 from tests.test_routes import create_route
 
@@ -150,3 +151,30 @@ def test_update_role_not_found(client, auth_header_global_admin):
                             json={'name': 'head'},
                             headers=auth_header_global_admin)
     assert response.status_code == 404
+
+
+def test_route_permissions_follow_role_assignments(client, test_db: Session, auth_header_global_admin,
+                                                   auth_header_tenant_admin, test_tenant_admin):
+    response = client.post("/api/v1/routes/", json={"path": "/roles/", "method": "GET", "action": "list"},
+                           headers=auth_header_global_admin)
+    assert response.status_code == status.HTTP_201_CREATED
+    route_id = response.json()["id"]
+
+    response = client.get("/api/v1/roles/", headers=auth_header_tenant_admin)
+    assert response.status_code == status.HTTP_403_FORBIDDEN
+
+    response = client.put(f"/api/v1/roles/{test_tenant_admin.role_id}/routes", json=[route_id],
+                          headers=auth_header_global_admin)
+    assert response.status_code == status.HTTP_200_OK
+    version = test_db.query(CacheVersion.version).filter(CacheVersion.name == PERMISSIONS_CACHE).scalar()
+    assert version == 2
+
+    response = client.get("/api/v1/roles/", headers=auth_header_tenant_admin)
+    assert response.status_code == status.HTTP_200_OK
+
+    response = client.delete(f"/api/v1/roles/{test_tenant_admin.role_id}/routes/{route_id}",
+                             headers=auth_header_global_admin)
+    assert response.status_code == status.HTTP_204_NO_CONTENT
+
+    response = client.get("/api/v1/roles/", headers=auth_header_tenant_admin)
+    assert response.status_code == status.HTTP_403_FORBIDDEN
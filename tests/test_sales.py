@@ -1,13 +1,24 @@
+import asyncio
+import json
+from datetime import datetime, timedelta
+from decimal import Decimal
+
 import pytest
 import respx
 from httpx import Response, ConnectTimeout
+from sqlalchemy import event
 from starlette import status
 
-from apps.sales.schema import PaymentMethod
-from core.models import Product, OfflineTransaction
+from apps.sales.schema import PaymentMethod, Invoice
+from core.enums import SubmissionMode, DeliveryStatus
+from core.models import Product, OfflineTransaction, Terminal
+from core.services.offline_uploads import OfflineUpload
+from core.services.outbox import OutboxDispatcher
+from core.services.sales import sign_offline_transaction
+from core.services.terminal_context import TerminalSnapshot
 from core.settings import settings
-from core.utils.helpers import get_random_number
-from tests.conftest import get_mock_data
+from core.utils.helpers import get_random_number, generate_invoice_number
+from tests.conftest import get_mock_data, async_engine_test, AsyncTestingSessionLocal
 
 
 @pytest.mark.asyncio
@@ -292,3 +303,532 @@ def test_send_offline_transaction(client, test_db, test_offline_transaction):
     assert response.status_code == status.HTTP_200_OK
     test_db.refresh(test_offline_transaction)
     assert test_offline_transaction.submitted_at is not None
+
+
+@pytest.mark.asyncio
+@respx.mock
+def test_make_a_sale_product_from_another_site(client, test_db, device_headers, test_terminal, test_product,
+                                               test_global_config):
+    respx.post(f"{settings.MRA_EIS_URL}/sales/submit-sales-transaction").mock(
+        return_value=Response(200, json=get_mock_data(filename="sales_response.json")))
+
+    product = Product(
+        tenant_id=test_terminal.tenant_id,
+        site_id="another-site",
+        unit_price=300, quantity=4,
+        code=get_random_number(12),
+        unit_of_measure="kg",
+        tax_rate_id=test_product.tax_rate_id,
+        is_product=True
+    )
+    test_db.add(product)
+    test_db.commit()
+
+    response = client.post("/api/v1/sales", headers=device_headers, json={
+        "invoice_number": "INV-2025-09-22-0001",
+        "payment_method": PaymentMethod.CASH,
+        "invoice_line_items": [
+            {
+                "product_code": product.code,
+                "quantity": 1,
+            }
+        ]
+    })
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert response.json()["detail"] == "Product not found"
+
+
+@pytest.mark.asyncio
+@respx.mock
+def test_make_a_sale_queries_stay_flat(client, test_db, device_headers, test_terminal, test_product,
+                                       test_global_config):
+    respx.post(f"{settings.MRA_EIS_URL}/sales/submit-sales-transaction").mock(
+        return_value=Response(200, json=get_mock_data(filename="sales_response.json")))
+
+    product_code = test_product.code
+    statements = []
+
+    def record_statement(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(async_engine_test.sync_engine, "before_cursor_execute", record_statement)
+
+    def count_product_queries(line_count: int) -> int:
+        statements.clear()
+        response = client.post("/api/v1/sales", headers=device_headers, json={
+            "invoice_number": f"INV-2025-09-22-{line_count:04d}",
+            "payment_method": PaymentMethod.CASH,
+            "invoice_line_items": [{"product_code": product_code, "quantity": 1}] * line_count
+        })
+        assert response.status_code == status.HTTP_200_OK
+        return len([statement for statement in statements if "FROM products" in statement])
+
+    try:
+        assert count_product_queries(1) == count_product_queries(60) == 1
+    finally:
+        event.remove(async_engine_test.sync_engine, "before_cursor_execute", record_statement)
+
+
+@pytest.mark.asyncio
+@respx.mock
+def test_sync_offline_transactions_in_order_per_terminal(client, test_db, test_tenant, test_terminal):
+    other_terminal = Terminal(
+        terminal_id="Terminal 2",
+        secret_key=settings.SECRET_KEY,
+        tenant_id=test_tenant.id,
+        site_id=test_terminal.site_id,
+        token="other-token",
+        phone_number="1234567890",
+        device_id=get_random_number(16),
+    )
+    test_db.add(other_terminal)
+    test_db.commit()
+
+    now = datetime.now()
+    for terminal in (test_terminal, other_terminal):
+        for i in range(3):
+            test_db.add(OfflineTransaction(
+                transaction_id=f"{terminal.terminal_id}-{i}",
+                tenant_id=test_tenant.id,
+                terminal_id=terminal.id,
+                details={"invoiceHeader": {"invoiceNumber": f"{terminal.terminal_id}-{i}"}},
+                created_at=now + timedelta(seconds=i),
+            ))
+    test_db.commit()
+
+    submitted = []
+
+    def mra_response(request):
+        invoice_number = json.loads(request.content)["invoiceHeader"]["invoiceNumber"]
+        submitted.append(invoice_number)
+        if invoice_number == "Terminal 2-1":
+            return Response(200, json=get_mock_data(filename="sales_response_tin_not_found.json"))
+        return Response(200, json=get_mock_data(filename="sales_response.json"))
+
+    respx.post(f"{settings.MRA_EIS_URL}/sales/submit-sales-transaction").mock(side_effect=mra_response)
+
+    response = client.post("/api/v1/sales/sync")
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["report"]["submitted"] == 5
+    assert response.json()["report"]["rejected"] == 1
+    assert response.json()["report"]["dead_lettered"] == 1
+    assert [n for n in submitted if n.startswith("Terminal 1")] == ["Terminal 1-0", "Terminal 1-1", "Terminal 1-2"]
+    assert [n for n in submitted if n.startswith("Terminal 2")] == ["Terminal 2-0", "Terminal 2-1", "Terminal 2-2"]
+
+    # The rejected invoice is set aside instead of holding up the rest of its terminal
+    pending = test_db.query(OfflineTransaction).filter(OfflineTransaction.submitted_at.is_(None)).all()
+    assert [(txn.transaction_id, txn.status, txn.last_error) for txn in pending] == [
+        ("Terminal 2-1", DeliveryStatus.DEAD_LETTER, "TIN not found")]
+
+
+@pytest.mark.asyncio
+@respx.mock
+def test_retried_sale_is_not_resubmitted(client, test_db, device_headers, test_terminal, test_product,
+                                         test_global_config):
+    mra = respx.post(f"{settings.MRA_EIS_URL}/sales/submit-sales-transaction").mock(
+        return_value=Response(200, json=get_mock_data(filename="sales_response.json")))
+
+    sale = {
+        "invoice_number": "INV-2025-09-22-0001",
+        "payment_method": PaymentMethod.CASH,
+        "invoice_line_items": [{"product_code": test_product.code, "quantity": 1}]
+    }
+    first = client.post("/api/v1/sales", headers=device_headers, json=sale)
+    retry = client.post("/api/v1/sales", headers=device_headers, json=sale)
+
+    assert first.status_code == retry.status_code == status.HTTP_200_OK
+    assert retry.json() == first.json()
+    assert mra.call_count == 1
+    test_db.refresh(test_terminal)
+    assert test_terminal.transaction_count == 1
+
+    response = client.post("/api/v1/sales", headers=device_headers, json={**sale, "payment_method": "card"})
+    assert response.status_code == status.HTTP_409_CONFLICT
+    assert response.json()["detail"] == "Invoice number was already used for a different sale"
+
+
+@pytest.mark.asyncio
+@respx.mock
+def test_rejected_sale_can_be_retried(client, test_db, device_headers, test_terminal, test_product,
+                                      test_global_config):
+    mra = respx.post(f"{settings.MRA_EIS_URL}/sales/submit-sales-transaction").mock(side_effect=[
+        Response(200, json=get_mock_data(filename="sales_response_tin_not_found.json")),
+        Response(200, json=get_mock_data(filename="sales_response.json")),
+    ])
+
+    sale = {
+        "invoice_number": "INV-2025-09-22-0001",
+        "payment_method": PaymentMethod.CASH,
+        "invoice_line_items": [{"product_code": test_product.code, "quantity": 1}]
+    }
+    assert client.post("/api/v1/sales", headers=device_headers, json=sale).status_code == 400
+    assert client.post("/api/v1/sales", headers=device_headers, json=sale).status_code == 200
+    assert mra.call_count == 2
+
+
+def test_reserve_invoice_numbers(client, test_db, device_headers, test_terminal):
+    first = client.post("/api/v1/sales/invoice-numbers", headers=device_headers, json={"count": 5})
+    second = client.post("/api/v1/sales/invoice-numbers", headers=device_headers, json={"count": 3})
+
+    assert first.status_code == second.status_code == status.HTTP_201_CREATED
+    assert (first.json()["first_count"], first.json()["last_count"]) == (1, 5)
+    assert (second.json()["first_count"], second.json()["last_count"]) == (6, 8)
+    assert first.json()["invoice_numbers"] == [
+        generate_invoice_number(2345, 1, datetime.now(), count) for count in range(1, 6)]
+    assert all(number.startswith(first.json()["prefix"]) for number in second.json()["invoice_numbers"])
+    test_db.refresh(test_terminal)
+    assert test_terminal.transaction_count == 8
+
+    too_many = {"count": settings.INVOICE_NUMBER_MAX_RESERVATION + 1}
+    assert client.post("/api/v1/sales/invoice-numbers", headers=device_headers,
+                       json=too_many).status_code == 422
+
+
+@pytest.mark.asyncio
+@respx.mock
+def test_sale_without_invoice_number_gets_one(client, test_db, device_headers, test_terminal, test_product,
+                                              test_global_config):
+    respx.post(f"{settings.MRA_EIS_URL}/sales/submit-sales-transaction").mock(
+        return_value=Response(200, json=get_mock_data(filename="sales_response.json")))
+
+    reserved = client.post("/api/v1/sales/invoice-numbers", headers=device_headers, json={"count": 2})
+    response = client.post("/api/v1/sales", headers=device_headers, json={
+        "payment_method": PaymentMethod.CASH,
+        "invoice_line_items": [{"product_code": test_product.code, "quantity": 1}]
+    })
+
+    assert response.status_code == status.HTTP_200_OK
+    invoice_number = response.json()["invoice"]["invoiceHeader"]["invoiceNumber"]
+    assert invoice_number == generate_invoice_number(2345, 1, datetime.now(), 3)
+    assert invoice_number not in reserved.json()["invoice_numbers"]
+    test_db.refresh(test_terminal)
+    assert test_terminal.transaction_count == 3
+
+
+@pytest.mark.asyncio
+@respx.mock
+def test_sale_totals_are_exact(client, test_db, device_headers, test_terminal, test_product, test_global_config):
+    respx.post(f"{settings.MRA_EIS_URL}/sales/submit-sales-transaction").mock(
+        return_value=Response(200, json=get_mock_data(filename="sales_response.json")))
+
+    products = [Product(tenant_id=test_terminal.tenant_id, site_id=test_terminal.site_id, unit_price=price,
+                        quantity=10, code=get_random_number(12), unit_of_measure="kg", description="item",
+                        tax_rate_id=test_product.tax_rate_id, is_product=True)
+                for price in (Decimal("0.10"), Decimal("0.20"))]
+    test_db.add_all(products)
+    test_db.commit()
+    test_db.refresh(products[0])
+    assert products[0].unit_price == Decimal("0.10")
+
+    response = client.post("/api/v1/sales", headers=device_headers, json={
+        "invoice_number": "INV-2025-09-22-0001",
+        "payment_method": PaymentMethod.CASH,
+        "invoice_line_items": [{"product_code": product.code, "quantity": 1} for product in products]
+    })
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["invoice"]["invoiceSummary"]["invoiceTotal"] == 0.3
+
+
+@pytest.mark.asyncio
+@respx.mock
+def test_submit_a_batch_of_sales(client, test_db, device_headers, test_terminal, test_product, test_global_config):
+    def mra_response(request):
+        invoice_number = json.loads(request.content)["invoiceHeader"]["invoiceNumber"]
+        if invoice_number == "BATCH-2":
+            return Response(200, json=get_mock_data(filename="sales_response_tin_not_found.json"))
+        if invoice_number == "BATCH-3":
+            raise ConnectTimeout("Connection timed out")
+        return Response(200, json=get_mock_data(filename="sales_response.json"))
+
+    mra = respx.post(f"{settings.MRA_EIS_URL}/sales/submit-sales-transaction").mock(side_effect=mra_response)
+    statements = []
+
+    def record_statement(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    def sale(invoice_number: str | None, product_code: str = test_product.code) -> dict:
+        return {
+            "invoice_number": invoice_number,
+            "payment_method": PaymentMethod.CASH,
+            "invoice_line_items": [{"product_code": product_code, "quantity": 1}]
+        }
+
+    event.listen(async_engine_test.sync_engine, "before_cursor_execute", record_statement)
+    try:
+        response = client.post("/api/v1/sales/batch", headers=device_headers, json={"transactions": [
+            sale("BATCH-1"), sale("BATCH-2"), sale("BATCH-3"), sale("BATCH-4", "unknown"), sale(None),
+        ]})
+    finally:
+        event.remove(async_engine_test.sync_engine, "before_cursor_execute", record_statement)
+
+    assert response.status_code == status.HTTP_200_OK
+    results = response.json()["results"]
+    assert [result["status_code"] for result in results] == [200, 400, 200, 400, 200]
+    assert results[1]["detail"] == "TIN not found"
+    assert results[2]["result"]["remark"] == "Transaction saved offline"
+    assert results[3]["detail"] == "Product not found"
+    assert results[4]["invoice_number"] == results[4]["result"]["invoice"]["invoiceHeader"]["invoiceNumber"]
+    assert mra.call_count == 4
+
+    assert len([statement for statement in statements if "FROM products" in statement]) == 1
+    assert len([statement for statement in statements if "FROM global_config" in statement]) == 1
+    assert test_db.query(OfflineTransaction).filter(OfflineTransaction.transaction_id == "BATCH-3").count() == 1
+    test_db.refresh(test_terminal)
+    assert test_terminal.transaction_count == 3
+
+    retry = client.post("/api/v1/sales/batch", headers=device_headers, json={"transactions": [sale("BATCH-1")]})
+    assert retry.json()["results"][0]["result"] == results[0]["result"]
+    assert mra.call_count == 4
+
+
+
+@pytest.mark.asyncio
+@respx.mock
+def test_unexpected_error_fails_only_its_sale(client, test_db, device_headers, test_terminal, test_product,
+                                              test_global_config):
+    def mra_response(request):
+        if json.loads(request.content)["invoiceHeader"]["invoiceNumber"] == "BATCH-2":
+            return Response(200, json={"statusCode": 1, "remark": "Success", "data": {}})
+        return Response(200, json=get_mock_data(filename="sales_response.json"))
+
+    respx.post(f"{settings.MRA_EIS_URL}/sales/submit-sales-transaction").mock(side_effect=mra_response)
+
+    response = client.post("/api/v1/sales/batch", headers=device_headers, json={"transactions": [{
+        "invoice_number": invoice_number,
+        "payment_method": PaymentMethod.CASH,
+        "invoice_line_items": [{"product_code": test_product.code, "quantity": 1}]
+    } for invoice_number in ("BATCH-1", "BATCH-2")]})
+
+    assert response.status_code == status.HTTP_200_OK
+    results = response.json()["results"]
+    assert [result["status_code"] for result in results] == [200, 500]
+    assert results[0]["result"]["validation_url"] is not None
+    assert results[1]["detail"] == "Error submitting sale"
+
+def offline_invoice(terminal: Terminal, invoice_number: str) -> dict:
+    return sign_offline_transaction({
+        "invoiceHeader": {
+            "invoiceNumber": invoice_number,
+            "invoiceDateTime": datetime.now().strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
+            "sellerTIN": "31699145",
+            "buyerTIN": None,
+            "buyerName": None,
+            "buyerAuthorizationCode": None,
+            "siteId": terminal.site_id,
+            "globalConfigVersion": 1,
+            "taxpayerConfigVersion": 1,
+            "terminalConfigVersion": 1,
+            "isReliefSupply": False,
+            "vat5CertificateDetails": None,
+            "paymentMethod": "cash"
+        },
+        "invoiceLineItems": [],
+        "invoiceSummary": {"taxBreakDown": [], "totalVAT": 0, "offlineSignature": None, "invoiceTotal": 0}
+    }, terminal)
+
+
+def test_upload_offline_sales(client, test_db, device_headers, test_terminal):
+    forged = offline_invoice(test_terminal, "OFF-5")
+    forged["invoiceSummary"]["offlineSignature"] = "forged"
+    lines = [
+        json.dumps(offline_invoice(test_terminal, "OFF-1")),
+        json.dumps(offline_invoice(test_terminal, "OFF-2")),
+        "{not json",
+        json.dumps(offline_invoice(test_terminal, "OFF-3")),
+        "",
+        json.dumps(forged),
+        json.dumps(offline_invoice(test_terminal, "OFF-1")),
+    ]
+
+    def body():
+        # Split mid-line, the way a slow upload arrives
+        data = "\n".join(lines).encode()
+        for start in range(0, len(data), 100):
+            yield data[start:start + 100]
+
+    response = client.post("/api/v1/sales/offline", headers=device_headers, content=body())
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.headers["content-type"] == "application/x-ndjson"
+    acks = [json.loads(line) for line in response.text.splitlines()]
+    assert [(ack["line"], ack["status"]) for ack in acks[:-1]] == [
+        (1, "accepted"), (2, "accepted"), (3, "rejected"), (4, "accepted"), (5, "rejected"), (6, "duplicate")]
+    assert acks[4]["detail"] == "Offline signature does not match the invoice"
+    assert acks[-1] == {"summary": {"accepted": 3, "duplicates": 1, "rejected": 2}, "complete": True}
+
+    stored = (test_db.query(OfflineTransaction)
+              .filter(OfflineTransaction.terminal_id == test_terminal.id)
+              .order_by(OfflineTransaction.created_at).all())
+    assert [txn.transaction_id for txn in stored] == ["OFF-1", "OFF-2", "OFF-3"]
+
+    retry = client.post("/api/v1/sales/offline", headers=device_headers,
+                        content=json.dumps(offline_invoice(test_terminal, "OFF-2")))
+    assert json.loads(retry.text.splitlines()[0])["status"] == "duplicate"
+
+
+async def test_offline_upload_stops_at_an_overlong_line(test_db, test_terminal):
+    terminal = TerminalSnapshot.from_model(test_terminal)
+
+    async def body():
+        for number in range(1, 4):
+            yield json.dumps(offline_invoice(test_terminal, f"OFF-{number}")).encode() + b"\n"
+        yield b"x" * 5000
+
+    async with AsyncTestingSessionLocal() as db:
+        upload = OfflineUpload(db, terminal, schema=Invoice, chunk_size=2, max_line_bytes=4096)
+        acks = [ack async for ack in upload.ingest(body())]
+
+    assert [ack.get("status") for ack in acks[:-1]] == ["accepted", "accepted", "accepted", "rejected"]
+    assert acks[3]["detail"] == "Line is longer than 4096 bytes"
+    assert acks[-1] == {"summary": {"accepted": 3, "duplicates": 0, "rejected": 1}, "complete": False}
+
+
+async def test_overlapping_offline_uploads_store_each_invoice_once(test_db, test_terminal):
+    terminal = TerminalSnapshot.from_model(test_terminal)
+    invoices = [offline_invoice(test_terminal, f"OFF-{number}") for number in range(1, 7)]
+    for invoice in invoices:
+        invoice["invoiceSummary"]["invoiceTotal"] = 10
+
+    async def body():
+        for invoice in invoices:
+            yield json.dumps(invoice).encode() + b"\n"
+            await asyncio.sleep(0)
+
+    async def upload():
+        async with AsyncTestingSessionLocal() as db:
+            upload = OfflineUpload(db, terminal, schema=Invoice, chunk_size=2)
+            return [ack async for ack in upload.ingest(body())]
+
+    first, second = await asyncio.gather(upload(), upload())
+
+    summaries = [first[-1]["summary"], second[-1]["summary"]]
+    assert sum(summary["accepted"] for summary in summaries) == 6
+    assert sum(summary["duplicates"] for summary in summaries) == 6
+    assert test_db.query(OfflineTransaction).filter(OfflineTransaction.terminal_id == test_terminal.id).count() == 6
+    test_db.refresh(test_terminal)
+    assert test_terminal.offline_pending_amount == Decimal("60.00")
+
+
+@pytest.mark.asyncio
+@respx.mock
+def test_outbox_sale_is_queued_and_delivered(client, test_db, device_headers, test_tenant, test_terminal,
+                                             test_product, test_global_config):
+    route = respx.post(f"{settings.MRA_EIS_URL}/sales/submit-sales-transaction").mock(
+        return_value=Response(200, json=get_mock_data(filename="sales_response.json")))
+    test_tenant.submission_mode = SubmissionMode.OUTBOX.value
+    test_db.commit()
+
+    response = client.post("/api/v1/sales", headers=device_headers, json={
+        "invoice_number": "INV-2025-09-22-0001",
+        "payment_method": PaymentMethod.MOBILE_MONEY,
+        "invoice_line_items": [{"product_code": test_product.code, "quantity": 1}]
+    })
+
+    assert response.status_code == 200
+    assert response.json()["remark"] == "Transaction queued for submission"
+    assert response.json()["validation_url"] == response.json()["invoice"]["invoiceSummary"]["offlineSignature"]
+    assert route.call_count == 0
+    test_db.refresh(test_terminal)
+    assert test_terminal.transaction_count == 1
+    queued = test_db.query(OfflineTransaction).filter_by(transaction_id="INV-2025-09-22-0001").one()
+    assert queued.status == DeliveryStatus.PENDING
+
+    report = asyncio.run(OutboxDispatcher(session_factory=AsyncTestingSessionLocal).dispatch_once())
+
+    assert report.submitted == 1
+    assert route.call_count == 1
+    test_db.refresh(queued)
+    assert queued.status == DeliveryStatus.SUBMITTED
+    assert queued.submitted_at is not None
+
+
+def test_change_tenant_submission_mode(client, test_db, test_tenant, auth_header_global_admin):
+    response = client.put(f"/api/v1/tenants/{test_tenant.id}/submission-mode", headers=auth_header_global_admin,
+                          json={"submission_mode": "outbox"})
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["submission_mode"] == "outbox"
+    test_db.refresh(test_tenant)
+    assert test_tenant.submission_mode == SubmissionMode.OUTBOX
+
+
+@pytest.mark.asyncio
+@respx.mock
+def test_offline_backlog_is_kept_as_a_running_total(client, test_db, device_headers, test_terminal, test_product,
+                                                    test_global_config):
+    route = respx.post(f"{settings.MRA_EIS_URL}/sales/submit-sales-transaction").mock(
+        side_effect=ConnectTimeout("Connection timed out"))
+
+    totals = []
+    for i in range(2):
+        response = client.post("/api/v1/sales", headers=device_headers, json={
+            "invoice_number": f"INV-2025-09-22-000{i}",
+            "payment_method": PaymentMethod.MOBILE_MONEY,
+            "invoice_line_items": [{"product_code": test_product.code, "quantity": i + 1}]
+        })
+        assert response.json()["remark"] == "Transaction saved offline"
+        totals.append(Decimal(str(response.json()["invoice"]["invoiceSummary"]["invoiceTotal"])))
+
+    test_db.refresh(test_terminal)
+    oldest = test_db.query(OfflineTransaction).order_by(OfflineTransaction.created_at).first()
+    assert test_terminal.offline_pending_amount == sum(totals)
+    assert test_terminal.offline_oldest_pending_at == oldest.created_at
+
+    # One is delivered and the other dead-lettered, neither is left pending
+    route.mock(side_effect=[Response(200, json=get_mock_data(filename="sales_response.json")),
+                            Response(200, json=get_mock_data(filename="sales_response_tin_not_found.json"))])
+    report = client.post("/api/v1/sales/sync").json()["report"]
+    assert (report["submitted"], report["dead_lettered"]) == (1, 1)
+
+    test_db.refresh(test_terminal)
+    assert test_terminal.offline_pending_amount == 0
+    assert test_terminal.offline_oldest_pending_at is None
+
+
+@pytest.mark.asyncio
+@respx.mock
+@pytest.mark.parametrize("limits", [
+    {"offline_limit_amount": Decimal("1000.00"), "offline_pending_amount": Decimal("999.00")},
+    {"offline_limit_hours": 24, "offline_oldest_pending_at": datetime.now() - timedelta(hours=25)},
+])
+def test_offline_sale_past_the_offline_limit_is_refused(client, test_db, device_headers, test_terminal, test_product,
+                                                        test_global_config, limits):
+    respx.post(f"{settings.MRA_EIS_URL}/sales/submit-sales-transaction").mock(
+        side_effect=ConnectTimeout("Connection timed out"))
+    for column, value in limits.items():
+        setattr(test_terminal, column, value)
+    test_db.commit()
+
+    response = client.post("/api/v1/sales", headers=device_headers, json={
+        "invoice_number": "INV-2025-09-22-0001",
+        "payment_method": PaymentMethod.MOBILE_MONEY,
+        "invoice_line_items": [{"product_code": test_product.code, "quantity": 1}]
+    })
+
+    assert response.status_code == status.HTTP_400_BAD_REQUEST
+    assert "offline limit" in response.json()["detail"]
+    assert test_db.query(OfflineTransaction).count() == 0
+
+
+@pytest.mark.asyncio
+def test_outbox_sale_past_the_offline_limit_is_queued(client, test_db, device_headers, test_tenant, test_terminal,
+                                                      test_product, test_global_config):
+    test_tenant.submission_mode = SubmissionMode.OUTBOX.value
+    test_terminal.offline_limit_amount = Decimal("1000.00")
+    test_terminal.offline_pending_amount = Decimal("999.00")
+    test_db.commit()
+
+    response = client.post("/api/v1/sales", headers=device_headers, json={
+        "invoice_number": "INV-2025-09-22-0001",
+        "payment_method": PaymentMethod.MOBILE_MONEY,
+        "invoice_line_items": [{"product_code": test_product.code, "quantity": 1}]
+    })
+
+    assert response.status_code == status.HTTP_200_OK
+    assert response.json()["remark"] == "Transaction queued for submission"
+    txn = test_db.query(OfflineTransaction).one()
+    test_db.refresh(test_terminal)
+    assert test_terminal.offline_pending_amount == Decimal("999.00") + txn.amount
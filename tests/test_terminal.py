@@ -1,9 +1,20 @@
+import asyncio
+
 import pytest
 import respx
 from httpx import Response
 
+from core.services.terminal_context import resolve_terminal, invalidate_terminal
 from core.settings import settings
-from tests.conftest import get_mock_data
+from tests.conftest import get_mock_data, AsyncTestingSessionLocal
+
+
+def resolve(device_id: str):
+    async def _resolve():
+        async with AsyncTestingSessionLocal() as db:
+            return await resolve_terminal(db, device_id)
+
+    return asyncio.run(_resolve())
 
 
 @pytest.mark.asyncio
@@ -47,3 +58,32 @@ def test_list_terminals(client, device_headers, test_db, test_terminal):
     response = client.get("/api/v1/terminals", headers=device_headers)
     assert response.status_code == 200
     assert response.json()[0]["id"] == str(test_terminal.id)
+
+
+def test_resolve_terminal_is_cached(test_db, test_terminal):
+    snapshot = resolve(test_terminal.device_id)
+    assert snapshot.id == test_terminal.id
+    assert snapshot.tenant.tin == test_terminal.tenant.tin
+
+    test_terminal.site_id = "moved"
+    test_db.commit()
+    assert resolve(test_terminal.device_id) is snapshot
+
+    invalidate_terminal(test_terminal.device_id)
+    assert resolve(test_terminal.device_id).site_id == "moved"
+
+
+@pytest.mark.asyncio
+@respx.mock
+def test_unblocking_refreshes_cached_terminal(client, device_headers, test_db, test_terminal):
+    test_terminal.is_blocked = True
+    test_terminal.blocking_reason = "Violation of terms and conditions"
+    test_db.commit()
+    assert resolve(test_terminal.device_id).is_blocked
+
+    respx.post(f"{settings.MRA_EIS_URL}/utilities/check-terminal-unblock-status").mock(
+        return_value=Response(200, json=get_mock_data(filename="unblock_status_unblocked_response.json")))
+
+    response = client.get("/api/v1/terminals/unblock-status", headers=device_headers)
+    assert response.status_code == 200
+    assert not resolve(test_terminal.device_id).is_blocked
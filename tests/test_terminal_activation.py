@@ -9,6 +9,7 @@ from httpx import Response
 from core import ApiLog
 from core.models import Terminal, Tenant
 from core.settings import settings
+from core.utils.api_logger import api_log_sink
 from core.utils.helpers import create_fake_mac_address
 from tests.conftest import test_db
 
@@ -39,6 +40,7 @@ def test_activate_terminal_mocked(client, auth_header, test_db):
     assert db_tenants.vat_registered == False
     assert db_tenants.config_version == 1
     assert db_tenants.taxpayer_id == 266
+    api_log_sink.flush()
     assert test_db.query(ApiLog).count() == 1
 
     terminal = test_db.query(Terminal).filter(
@@ -98,6 +100,7 @@ def test_confirm_activation(client, auth_header, test_terminal, test_db):
     )
     assert response.status_code == 200
     assert test_terminal.confirmed_at is not None
+    api_log_sink.flush()
     assert test_db.query(ApiLog).count() == 1
 
 